@@ -1,17 +1,48 @@
 #!/bin/bash
 set -e
 
+# Uso: ./scripts/run_migrations.sh [core|diagnosis|surgery]
+# Se ejecuta desde el directorio del servicio (el que contiene manage.py); sin
+# argumento usa la configuración de core.
+
 # Variables de entorno
 PROJECT_ID="arquisoft-453601"
 REGION="us-central1"
 INSTANCE_NAME="django-db-instance"
 
+SERVICE=${1:-core}
+case "$SERVICE" in
+    core)
+        SETTINGS=medical_system.settings_prod
+        # Publica un evento por cada paciente que aún no tiene ninguno en el outbox
+        BACKFILLS=("patient_outbox --snapshot --missing-only")
+        ;;
+    diagnosis)
+        SETTINGS=diagnosis_system.settings
+        # Llena la columna de búsqueda de los diagnósticos que no la tienen
+        BACKFILLS=("rebuild_search_vectors --missing-only")
+        ;;
+    surgery)
+        SETTINGS=surgery_system.settings
+        # Construye el rollup de estadísticas la primera vez; después lo mantienen los guardados
+        BACKFILLS=("rebuild_surgery_rollup --if-empty")
+        ;;
+    *)
+        echo "Servicio desconocido: $SERVICE" >&2
+        exit 1
+        ;;
+esac
+
 # Realizar las migraciones
 echo "Ejecutando makemigrations..."
-DJANGO_SETTINGS_MODULE=medical_system.settings_prod python manage.py makemigrations
+DJANGO_SETTINGS_MODULE=$SETTINGS python manage.py makemigrations
 
 echo "Ejecutando migrate..."
 # Ejecutar migraciones
-DJANGO_SETTINGS_MODULE=medical_system.settings_prod python manage.py migrate
-
+DJANGO_SETTINGS_MODULE=$SETTINGS python manage.py migrate
 
+# Backfills idempotentes: seguros de repetir en cada despliegue
+for BACKFILL in "${BACKFILLS[@]}"; do
+    echo "Ejecutando $BACKFILL..."
+    DJANGO_SETTINGS_MODULE=$SETTINGS python manage.py $BACKFILL
+done
@@ -4,6 +4,7 @@ from .forms import ConsultaMedicaForm, PrescripcionForm
 from .logic.consulta_logic import get_consulta_by_id, get_consultas, delete_consulta
 from .models import ConsultaMedica, Prescripcion
 from django.contrib.auth.decorators import login_required, permission_required
+from core.permission_snapshot import get_permission_snapshot
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.views.generic import UpdateView, DetailView
 from django.urls import reverse_lazy
@@ -12,7 +13,7 @@ from django.urls import reverse_lazy
 @permission_required('consultas.view_consultamedica', raise_exception=True)
 def consulta_list(request):
     consultas = get_consultas()
-    puede_eliminar = request.user.is_superuser or request.user.groups.filter(name="admin").exists()
+    puede_eliminar = request.user.is_superuser or get_permission_snapshot(request.user).in_group("admin")
     return render(request, 'consultas/consultas.html', {
         'consulta_list': consultas,
         'puede_eliminar': puede_eliminar
@@ -22,7 +23,7 @@ def consulta_list(request):
 @permission_required('consultas.add_consultamedica', raise_exception=True)
 def consulta_create(request):
      # Verificar permisos: cualquiera puede añadir una consulta menos los médicos
-    if not (request.user.is_superuser or request.user.groups.filter(name__in=["admin", "Medico Junta Medica", "Medico", "Enfermero"]).exists()):
+    if not (request.user.is_superuser or get_permission_snapshot(request.user).in_group("admin", "Medico Junta Medica", "Medico", "Enfermero")):
         messages.error(request, "No tienes permisos para añadir una consulta.")
         return redirect('consultaList')
     
@@ -56,7 +57,7 @@ def consulta_detail(request, consulta_id):
 @permission_required('consultas.change_consultamedica', raise_exception=True)
 def add_prescripcion(request, consulta_id):
     
-    if not (request.user.is_superuser or request.user.groups.filter(name__in=["admin", "Medico Junta Medica", "Medico", "Enfermero"]).exists()):
+    if not (request.user.is_superuser or get_permission_snapshot(request.user).in_group("admin", "Medico Junta Medica", "Medico", "Enfermero")):
         messages.error(request, "No tienes permisos para añadir una prescripción.")
         return redirect('consultaDetail', consulta_id=consulta_id)
     
@@ -109,7 +110,7 @@ def consulta_edit(request, consulta_id):
     consulta = get_object_or_404(ConsultaMedica, id=consulta_id)
 
     # Verificar permisos dentro de la vista
-    if not (request.user.is_superuser or request.user.groups.filter(name__in=["admin", "Medico Junta Medica", "Medico", "Enfermero"]).exists()):
+    if not (request.user.is_superuser or get_permission_snapshot(request.user).in_group("admin", "Medico Junta Medica", "Medico", "Enfermero")):
         messages.error(request, "No tienes permisos para modificar esta consulta.")
         return redirect('consultaDetail', consulta_id=consulta_id)
 
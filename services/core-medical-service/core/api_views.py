@@ -8,13 +8,14 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
 from django.conf import settings
-import requests
-import asyncio
-import aiohttp
 import logging
 
 from pacientes2.models import Paciente2
+from pacientes2.logic.informacion_critica_logic import actualizar_secciones_remotas
 from consultas.models import ConsultaMedica, Prescripcion
+from .dossier_cache import dossier_cache, REMOTE_SECTIONS
+from .http_pool import http_pool
+from .microservice_client import microservice_client
 from .serializers import (
     Paciente2Serializer,
     Paciente2BasicSerializer,
@@ -66,20 +67,6 @@ def get_patient_basic_info(request, paciente_id):
         )
 
 
-async def fetch_service_data(session, url, paciente_id):
-    """Async helper to fetch data from microservices"""
-    try:
-        async with session.get(f"{url}/api/patient/{paciente_id}/") as response:
-            if response.status == 200:
-                return await response.json()
-            else:
-                logger.warning(f"Service {url} returned status {response.status}")
-                return None
-    except Exception as e:
-        logger.error(f"Error fetching from {url}: {str(e)}")
-        return None
-
-
 @api_view(['GET'])
 def get_historia_clinica_completa(request, paciente_id):
     """
@@ -88,63 +75,60 @@ def get_historia_clinica_completa(request, paciente_id):
     """
     try:
         # Get basic patient info
-        paciente = get_object_or_404(Paciente2, id=paciente_id)
-        paciente_data = Paciente2Serializer(paciente).data
+        paciente_data = dossier_cache.get_or_load(
+            paciente_id, 'api_paciente',
+            lambda: Paciente2Serializer(get_object_or_404(Paciente2, id=paciente_id)).data
+        )
 
         # Get consultations from local database
-        consultas = ConsultaMedica.objects.filter(paciente_id=paciente_id)
-        consultas_data = ConsultaSerializer(consultas, many=True).data
+        consultas_data = dossier_cache.get_or_load(
+            paciente_id, 'api_consultas',
+            lambda: ConsultaSerializer(ConsultaMedica.objects.filter(paciente_id=paciente_id), many=True).data
+        )
 
         # Get prescriptions
-        prescripciones = Prescripcion.objects.filter(consulta__paciente_id=paciente_id)
-        prescripciones_data = PrescripcionSerializer(prescripciones, many=True).data
-
-        # Prepare async calls to other microservices
-        async def fetch_all_services():
-            async with aiohttp.ClientSession() as session:
-                tasks = []
-
-                # Fetch exams
-                if settings.EXAMS_SERVICE_URL:
-                    tasks.append(('examenes', fetch_service_data(
-                        session, settings.EXAMS_SERVICE_URL, paciente_id
-                    )))
-
-                # Fetch diagnoses
-                if settings.DIAGNOSIS_SERVICE_URL:
-                    tasks.append(('diagnosticos', fetch_service_data(
-                        session, settings.DIAGNOSIS_SERVICE_URL, paciente_id
-                    )))
-
-                # Fetch surgeries
-                if settings.SURGERY_SERVICE_URL:
-                    tasks.append(('cirugias', fetch_service_data(
-                        session, settings.SURGERY_SERVICE_URL, paciente_id
-                    )))
-
-                # Execute all requests concurrently
-                results = await asyncio.gather(*[task[1] for task in tasks], return_exceptions=True)
-
-                # Combine results
-                service_data = {}
-                for i, (service_name, _) in enumerate(tasks):
-                    result = results[i]
-                    if isinstance(result, Exception):
-                        logger.error(f"Error fetching {service_name}: {str(result)}")
-                        service_data[service_name] = []
-                    else:
-                        service_data[service_name] = result or []
-
-                return service_data
-
-        # Execute async calls
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        service_data = loop.run_until_complete(fetch_all_services())
+        prescripciones_data = dossier_cache.get_or_load(
+            paciente_id, 'api_prescripciones',
+            lambda: PrescripcionSerializer(
+                Prescripcion.objects.filter(consulta__paciente_id=paciente_id), many=True
+            ).data
+        )
+
+        # Only sections missing from the dossier cache go to the other microservices
+        generation = dossier_cache.generation(paciente_id)
+        service_data = {
+            name.replace('api_', '', 1): value
+            for name, value in dossier_cache.get_many(
+                paciente_id, ['api_examenes', 'api_diagnosticos', 'api_cirugias'], generation
+            ).items()
+        }
+
+        # Fetch from the other microservices concurrently over the worker's pooled connections,
+        # authenticated like every other downstream call
+        headers = microservice_client._get_auth_headers(request)
+        calls = {}
+        for service_name, service_url in (
+            ('examenes', settings.EXAMS_SERVICE_URL),
+            ('diagnosticos', settings.DIAGNOSIS_SERVICE_URL),
+            ('cirugias', settings.SURGERY_SERVICE_URL),
+        ):
+            if service_url and service_name not in service_data:
+                calls[service_name] = {
+                    'url': f"{service_url.rstrip('/')}/api/patient/{paciente_id}/", 'headers': headers,
+                }
+
+        results, missed = http_pool.fetch_all(
+            calls, deadline=getattr(settings, 'MICROSERVICE_FANOUT_DEADLINE', 3.0)
+        )
+        for service_name in missed:
+            logger.error(f"Error fetching {service_name}: deadline exceeded")
+        # Sections that missed the deadline or failed are returned empty and listed as partial
+        partial = sorted(set(calls) - {name for name, result in results.items() if result is not None})
+        for service_name in calls:
+            result = results.get(service_name)
+            service_data[service_name] = result or []
+            if result is not None:
+                dossier_cache.set(paciente_id, f'api_{service_name}', result, generation)
 
         # Combine all data
         historia_clinica = {
@@ -153,7 +137,8 @@ def get_historia_clinica_completa(request, paciente_id):
             'prescripciones': prescripciones_data,
             'examenes': service_data.get('examenes', []),
             'diagnosticos': service_data.get('diagnosticos', []),
-            'cirugias': service_data.get('cirugias', [])
+            'cirugias': service_data.get('cirugias', []),
+            'partial': partial,
         }
 
         return Response(historia_clinica)
@@ -164,3 +149,31 @@ def get_historia_clinica_completa(request, paciente_id):
             {'error': 'Error retrieving clinical history'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+@api_view(['POST'])
+def invalidate_patient_dossier(request, paciente_id):
+    """
+    Invalidate cached dossier sections for a patient and refresh them in
+    the critical-info projection. Downstream services call this after
+    changing a patient's records, optionally naming the sections they own
+    (examenes, diagnosticos, cirugias).
+    """
+    published = request.data.get('sections') or list(REMOTE_SECTIONS)
+    unknown = [name for name in published if name not in REMOTE_SECTIONS]
+    if unknown:
+        return Response(
+            {'error': f"Unknown sections: {', '.join(unknown)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    sections = [section for name in published for section in REMOTE_SECTIONS[name]]
+    dossier_cache.invalidate(paciente_id, sections)
+    actualizar_secciones_remotas(paciente_id, request, published)
+    return Response({'paciente_id': paciente_id, 'invalidated': sections})
+
+
+@api_view(['GET'])
+def dossier_cache_metrics(request):
+    """Hit and miss counters per dossier section for this worker"""
+    return Response(dossier_cache.metrics())
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class VariablesConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        # Connect dossier cache invalidation handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,157 @@
+"""
+Circuit breakers and retry budgets for calls to the other microservices.
+
+A CircuitBreaker tracks the failure rate of one service over a sliding
+window and stops sending it traffic while it is failing. A RetryBudget
+caps retries to a fraction of recent requests; its counters live in a
+Django cache. Only a cache shared by the workers (Redis, Memcached,
+database) makes it one budget for the whole deployment; with a per-process
+cache such as LocMem each worker has its own budget.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Per-service breaker with closed, open and half-open states"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_rate_threshold: float = 0.5, window_seconds: int = 30,
+                 minimum_calls: int = 5, open_seconds: int = 15, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.window_seconds = window_seconds
+        self.minimum_calls = minimum_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._outcomes = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+
+    def _failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        failures = sum(1 for _, success in self._outcomes if not success)
+        return failures / len(self._outcomes)
+
+    def _transition(self, state: str) -> None:
+        if state != self._state:
+            logger.warning(f"Circuit for {self.name} changed from {self._state} to {state}")
+        self._state = state
+        self._half_open_calls = 0
+        if state == self.OPEN:
+            self._opened_at = time.monotonic()
+        elif state == self.CLOSED:
+            self._outcomes.clear()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._transition(self.HALF_OPEN)
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Whether a call may go out now; half-open admits a few probe calls"""
+        state = self.state
+        with self._lock:
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._transition(self.CLOSED)
+                return
+            now = time.monotonic()
+            self._outcomes.append((now, True))
+            self._trim(now)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._transition(self.OPEN)
+                return
+            now = time.monotonic()
+            self._outcomes.append((now, False))
+            self._trim(now)
+            if (self._state == self.CLOSED and len(self._outcomes) >= self.minimum_calls
+                    and self._failure_rate() >= self.failure_rate_threshold):
+                self._transition(self.OPEN)
+
+    def snapshot(self) -> Dict:
+        """Current state and window statistics, for status pages"""
+        state = self.state
+        with self._lock:
+            self._trim(time.monotonic())
+            return {
+                'state': state,
+                'failure_rate': round(self._failure_rate(), 3),
+                'calls_in_window': len(self._outcomes),
+                'retry_after': max(0, round(self.open_seconds - (time.monotonic() - self._opened_at)))
+                if state == self.OPEN else 0,
+            }
+
+
+class RetryBudget:
+    """Allow retries up to ratio * requests (plus a floor) per time window, across workers if the cache is shared"""
+
+    def __init__(self, name: str, ratio: float = 0.2, min_retries: int = 3,
+                 window_seconds: int = 10, cache_alias: str = 'default'):
+        self.name = name
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self.cache_alias = cache_alias
+
+    @property
+    def shared(self) -> bool:
+        """Whether every worker reads and writes the same counters"""
+        return not isinstance(caches[self.cache_alias], (LocMemCache, DummyCache))
+
+    def _key(self, counter: str) -> str:
+        window = int(time.time() // self.window_seconds)
+        return f"retry_budget:{self.name}:{counter}:{window}"
+
+    def _incr(self, counter: str) -> int:
+        cache = caches[self.cache_alias]
+        key = self._key(counter)
+        cache.add(key, 0, self.window_seconds * 2)
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # Key expired between add and incr
+            cache.set(key, 1, self.window_seconds * 2)
+            return 1
+
+    def record_request(self) -> None:
+        self._incr('requests')
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget; False once the window's budget is used up"""
+        requests_seen = caches[self.cache_alias].get(self._key('requests'), 0)
+        retries = self._incr('retries')
+        return retries <= self.min_retries + self.ratio * requests_seen
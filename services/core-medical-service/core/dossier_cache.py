@@ -0,0 +1,181 @@
+"""
+Read-through cache for patient dossiers (clinical history sections).
+
+Sections are cached per paciente_id in a local in-process LRU tier and,
+when DOSSIER_CACHE['shared_cache'] names a Django cache alias, in a shared
+tier visible to every worker. Entries expire after a per-section TTL and
+are invalidated explicitly when the underlying records change.
+
+Invalidation has to reach every worker's local tier. With a shared tier,
+each patient has a generation stamp there: invalidating replaces it, and
+both tiers key entries by generation, so every worker's next read misses.
+Without one, local entries live at most local_ttl seconds, which bounds
+how long another worker can serve a section after it was invalidated.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+# Sections used by pacientes2.logic.get_historia_clinica
+HISTORIA_SECTIONS = ('paciente', 'consultas', 'examenes', 'diagnosticos', 'cirugias')
+# Sections used by core.api_views.get_historia_clinica_completa
+API_SECTIONS = ('api_paciente', 'api_consultas', 'api_prescripciones',
+                'api_examenes', 'api_diagnosticos', 'api_cirugias')
+ALL_SECTIONS = HISTORIA_SECTIONS + API_SECTIONS
+
+# Sections owned by downstream services, keyed by the name they publish
+REMOTE_SECTIONS = {
+    'examenes': ('examenes', 'api_examenes'),
+    'diagnosticos': ('diagnosticos', 'api_diagnosticos'),
+    'cirugias': ('cirugias', 'api_cirugias'),
+}
+
+_MISSING = object()
+
+
+class DossierCache:
+    """Two-tier (local LRU + optional shared) cache keyed by paciente_id and section"""
+
+    def __init__(self):
+        config = getattr(settings, 'DOSSIER_CACHE', {})
+        self.max_entries = config.get('local_max_entries', 1024)
+        self.ttls = config.get('ttl', {})
+        self.default_ttl = config.get('default_ttl', 60)
+        self.shared_alias = config.get('shared_cache')
+        self.local_ttl = config.get('local_ttl', 5)
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = defaultdict(lambda: {'local_hits': 0, 'shared_hits': 0, 'misses': 0})
+
+    def _key(self, paciente_id, section: str, generation: str) -> str:
+        return f"dossier:{paciente_id}:{generation}:{section}"
+
+    def _generation_key(self, paciente_id) -> str:
+        return f"dossier:{paciente_id}:generation"
+
+    def generation(self, paciente_id) -> str:
+        """Current generation stamp of a patient's dossier, shared by all workers"""
+        shared = self.shared
+        if shared is None:
+            return '0'
+        key = self._generation_key(paciente_id)
+        generation = shared.get(key)
+        if generation is None:
+            # First use or evicted: create one, or read the one another worker created
+            shared.add(key, uuid.uuid4().hex, None)
+            generation = shared.get(key)
+        return generation
+
+    def _ttl(self, section: str) -> int:
+        """TTL for a section; api_* sections fall back to their historia counterpart"""
+        return self.ttls.get(section, self.ttls.get(section.replace('api_', '', 1), self.default_ttl))
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def _local_ttl(self, section: str) -> int:
+        """How long a local entry lives: the section TTL only when invalidations are broadcast"""
+        ttl = self._ttl(section)
+        return ttl if self.shared is not None else min(ttl, self.local_ttl)
+
+    def get(self, paciente_id, section: str, generation: Optional[str] = None) -> Any:
+        """Return the cached section or _MISSING, recording hit/miss metrics"""
+        if generation is None:
+            generation = self.generation(paciente_id)
+        key = self._key(paciente_id, section, generation)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._local.move_to_end(key)
+                    self._metrics[section]['local_hits'] += 1
+                    return value
+                del self._local[key]
+
+        if self.shared is not None:
+            value = self.shared.get(key, _MISSING)
+            if value is not _MISSING:
+                self._set_local(key, value, self._local_ttl(section))
+                with self._lock:
+                    self._metrics[section]['shared_hits'] += 1
+                return value
+
+        with self._lock:
+            self._metrics[section]['misses'] += 1
+        return _MISSING
+
+    def _set_local(self, key: str, value: Any, ttl: int) -> None:
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def set(self, paciente_id, section: str, value: Any, generation: Optional[str] = None) -> None:
+        """
+        Store a section. Pass the generation read before loading the value
+        so a load that raced an invalidation is stored where no one reads it.
+        """
+        if generation is None:
+            generation = self.generation(paciente_id)
+        key = self._key(paciente_id, section, generation)
+        self._set_local(key, value, self._local_ttl(section))
+        if self.shared is not None:
+            self.shared.set(key, value, self._ttl(section))
+
+    def get_or_load(self, paciente_id, section: str, loader) -> Any:
+        """Read-through lookup: call loader() and cache its result on a miss"""
+        generation = self.generation(paciente_id)
+        value = self.get(paciente_id, section, generation)
+        if value is _MISSING:
+            value = loader()
+            self.set(paciente_id, section, value, generation)
+        return value
+
+    def get_many(self, paciente_id, sections: Iterable[str], generation: Optional[str] = None) -> Dict[str, Any]:
+        """Return the cached subset of sections (misses are omitted)"""
+        if generation is None:
+            generation = self.generation(paciente_id)
+        found = {}
+        for section in sections:
+            value = self.get(paciente_id, section, generation)
+            if value is not _MISSING:
+                found[section] = value
+        return found
+
+    def invalidate(self, paciente_id, sections: Optional[Iterable[str]] = None) -> None:
+        """
+        Drop the given sections (all of them by default) for a patient. With
+        a shared tier this starts a new generation, which drops every section
+        in every worker; sections not named are reloaded on their next read.
+        """
+        generation = self.generation(paciente_id)
+        keys = [self._key(paciente_id, section, generation) for section in (sections or ALL_SECTIONS)]
+        with self._lock:
+            for key in keys:
+                self._local.pop(key, None)
+        if self.shared is not None:
+            self.shared.set(self._generation_key(paciente_id), uuid.uuid4().hex, None)
+            self.shared.delete_many(keys)
+        logger.debug(f"Invalidated dossier sections for patient {paciente_id}: {sections or 'all'}")
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        """Hit and miss counters per section for this worker"""
+        with self._lock:
+            return {section: dict(counts) for section, counts in self._metrics.items()}
+
+
+# Per-process cache instance
+dossier_cache = DossierCache()
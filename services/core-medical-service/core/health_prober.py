@@ -0,0 +1,121 @@
+"""
+Background health prober for the other microservices.
+
+A daemon thread polls each service's /health/ready endpoint on an interval
+and keeps the latest status, latency and a bounded status history. Views
+read that snapshot instead of probing services on the request path. With
+a shared cache alias configured, one worker probes per interval and every
+worker reads the same snapshot from the cache.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .microservice_client import microservice_client
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'health_prober:snapshot'
+LOCK_KEY = 'health_prober:lock'
+
+
+class HealthProber:
+    """Polls /health/ready for each service and serves the latest results in O(1)"""
+
+    def __init__(self):
+        config = getattr(settings, 'HEALTH_PROBER', {})
+        self.interval = config.get('interval', 15)
+        self.history_size = config.get('history_size', 240)
+        self.shared_cache = config.get('shared_cache')
+        self._lock = threading.Lock()
+        self._pid = None
+        self._history = {}
+        self._snapshot = {}
+
+    def _service_urls(self) -> Dict[str, str]:
+        return {
+            'exams': settings.EXAMS_SERVICE_URL,
+            'diagnosis': settings.DIAGNOSIS_SERVICE_URL,
+            'surgery': settings.SURGERY_SERVICE_URL,
+        }
+
+    def ensure_started(self) -> None:
+        """Start the polling thread once per process (gunicorn forks workers)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._history = {service: deque(maxlen=self.history_size) for service in self._service_urls()}
+        threading.Thread(target=self._run, name='health-prober', daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if self.shared_cache is None or caches[self.shared_cache].add(LOCK_KEY, os.getpid(), self.interval):
+                    self.probe_all()
+            except Exception as e:
+                logger.error(f"Health prober iteration failed: {e}")
+            time.sleep(self.interval)
+
+    def probe_all(self) -> Dict[str, Dict]:
+        """Probe every service once and publish the new snapshot"""
+        if self.shared_cache is not None:
+            # Continue the history other workers have been building
+            previous = caches[self.shared_cache].get(SNAPSHOT_KEY) or {}
+            for service, state in previous.items():
+                if service in self._history and state.get('history'):
+                    self._history[service] = deque(
+                        (tuple(entry) for entry in state['history']), maxlen=self.history_size
+                    )
+
+        snapshot = {}
+        for service, url in self._service_urls().items():
+            start = time.perf_counter()
+            healthy = microservice_client.check_service_health(url)
+            latency_ms = round((time.perf_counter() - start) * 1000, 1)
+            checked_at = datetime.now(timezone.utc).isoformat()
+
+            history = self._history[service]
+            history.append((checked_at, healthy, latency_ms))
+            snapshot[service] = {
+                'healthy': healthy,
+                'latency_ms': latency_ms,
+                'checked_at': checked_at,
+                'availability': round(sum(1 for _, ok, _ in history if ok) / len(history), 4),
+                'history': list(history),
+            }
+
+        with self._lock:
+            self._snapshot = snapshot
+        if self.shared_cache is not None:
+            caches[self.shared_cache].set(SNAPSHOT_KEY, snapshot, self.interval * 4)
+        return snapshot
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Latest probe results per service; never probes on the caller's thread"""
+        self.ensure_started()
+        if self.shared_cache is not None:
+            return caches[self.shared_cache].get(SNAPSHOT_KEY) or {}
+        with self._lock:
+            return self._snapshot
+
+    def is_healthy(self, service: str) -> Optional[bool]:
+        """Last known health of a service, or None before its first probe"""
+        return self.snapshot().get(service, {}).get('healthy')
+
+    def get_services_status(self) -> Dict[str, Optional[bool]]:
+        """Last known health of all services, shaped like MicroserviceClient.get_services_status"""
+        snapshot = self.snapshot()
+        return {service: snapshot.get(service, {}).get('healthy') for service in self._service_urls()}
+
+
+# Per-process prober instance
+health_prober = HealthProber()
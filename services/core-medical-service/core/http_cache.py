@@ -0,0 +1,73 @@
+"""
+Client-side HTTP cache for GETs to the other microservices.
+
+Responses that carry an ETag or Last-Modified validator are stored in a
+Django cache alias. Later GETs for the same URL send If-None-Match /
+If-Modified-Since, and a 304 reuses the stored body, so unchanged data
+costs a small round trip without a body transfer or JSON parse. Entries
+are always revalidated; the TTL only bounds how long they are kept.
+"""
+
+import hashlib
+import logging
+from typing import Any, Dict, Mapping, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPCache:
+    """Stores validated JSON responses and builds conditional request headers"""
+
+    def __init__(self):
+        config = getattr(settings, 'MICROSERVICE_HTTP_CACHE', {})
+        self.enabled = config.get('enabled', True)
+        self.cache_alias = config.get('cache_alias', 'default')
+        self.ttl = config.get('ttl', 600)
+        self.stats = {'revalidated': 0, 'stored': 0, 'misses': 0}
+
+    def _key(self, url: str, params: Optional[Mapping]) -> str:
+        raw = f"{url}?{sorted((params or {}).items())}"
+        return f"http_cache:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+    def lookup(self, url: str, params: Optional[Mapping] = None) -> Optional[Dict]:
+        """Stored entry for a GET, or None"""
+        if not self.enabled:
+            return None
+        entry = caches[self.cache_alias].get(self._key(url, params))
+        if entry is None:
+            self.stats['misses'] += 1
+        return entry
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+        """Validator headers to revalidate a stored entry"""
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def revalidated(self, entry: Dict) -> Any:
+        """Body of an entry the service confirmed with 304"""
+        self.stats['revalidated'] += 1
+        return entry['body']
+
+    def store(self, url: str, params: Optional[Mapping], headers: Mapping[str, str], body: Any) -> None:
+        """Keep a 200 response if it carries a validator"""
+        if not self.enabled:
+            return
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        entry = {'etag': etag, 'last_modified': last_modified, 'body': body}
+        caches[self.cache_alias].set(self._key(url, params), entry, self.ttl)
+        self.stats['stored'] += 1
+
+
+# Per-process cache front-end; entries live in the configured cache alias
+http_cache = HTTPCache()
@@ -0,0 +1,166 @@
+"""
+Persistent async HTTP pool for calls to the other microservices.
+
+Each worker process owns one background event loop and one aiohttp
+ClientSession per downstream service, so keep-alive connections and DNS
+lookups are reused across requests instead of being rebuilt every time.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+from django.conf import settings
+
+from .http_cache import http_cache
+from .single_flight import credential_key
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHTTPPool:
+    """Worker-owned event loop with keep-alive connection pools per service"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._sessions = {}
+        self._inflight = {}
+        self.stats = {'connections_created': 0, 'connections_reused': 0, 'coalesced': 0}
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the background loop once per process (gunicorn forks workers)"""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._sessions = {}
+                self._inflight = {}
+                self._pid = os.getpid()
+                threading.Thread(
+                    target=self._loop.run_forever,
+                    name='async-http-pool',
+                    daemon=True,
+                ).start()
+            return self._loop
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """Count new versus reused connections for the pool stats"""
+        async def on_create(session, context, params):
+            self.stats['connections_created'] += 1
+
+        async def on_reuse(session, context, params):
+            self.stats['connections_reused'] += 1
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(on_create)
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        return trace_config
+
+    def _session_for(self, url: str) -> aiohttp.ClientSession:
+        """Return the pooled session for the service that owns url (loop thread only)"""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        session = self._sessions.get(key)
+        if session is None or session.closed:
+            config = getattr(settings, 'MICROSERVICE_HTTP_POOL', {})
+            connector = aiohttp.TCPConnector(
+                limit=config.get('limit', 100),
+                limit_per_host=config.get('limit_per_host', 20),
+                ttl_dns_cache=config.get('dns_cache_ttl', 300),
+                keepalive_timeout=config.get('keepalive_timeout', 30),
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                trace_configs=[self._trace_config()],
+            )
+            self._sessions[key] = session
+        return session
+
+    @property
+    def reuse_rate(self) -> float:
+        """Fraction of requests served over an already open connection"""
+        total = self.stats['connections_created'] + self.stats['connections_reused']
+        return self.stats['connections_reused'] / total if total else 0.0
+
+    async def get_json(self, url: str, params: Optional[Dict] = None,
+                       headers: Optional[Dict] = None, timeout: Optional[float] = None) -> Optional[Any]:
+        """
+        GET url and decode its JSON body. Returns None on errors or non-200 responses.
+        Identical GETs with the same credentials already in flight share that request
+        instead of issuing another, and a stored response is revalidated instead of
+        downloaded again.
+        """
+        key = (url, tuple(sorted((params or {}).items())), credential_key(headers))
+        inflight = self._inflight.get(key)
+        if inflight is None:
+            inflight = asyncio.ensure_future(self._get_json(url, params, headers, timeout))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats['coalesced'] += 1
+        # Shield so a caller hitting its deadline does not cancel the shared request
+        return await asyncio.shield(inflight)
+
+    async def _get_json(self, url: str, params: Optional[Dict],
+                        headers: Optional[Dict], timeout: Optional[float]) -> Optional[Any]:
+        session = self._session_for(url)
+        cached = http_cache.lookup(url, params)
+        if cached is not None:
+            headers = {**(headers or {}), **http_cache.conditional_headers(cached)}
+        try:
+            async with session.get(
+                url,
+                params=params,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=timeout),
+            ) as response:
+                if response.status == 304 and cached is not None:
+                    return http_cache.revalidated(cached)
+                if response.status == 200:
+                    body = await response.json()
+                    http_cache.store(url, params, response.headers, body)
+                    return body
+                logger.warning(f"Service {url} returned status {response.status}")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            # ValueError covers a 200 whose body is not valid JSON
+            logger.error(f"Error fetching from {url}: {str(e)}")
+        return None
+
+    def run(self, coro, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the pool's loop and wait for its result from sync code"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        return future.result(timeout)
+
+    def fetch_all(self, calls: Dict[str, Dict], deadline: float) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Issue several GETs concurrently. Each entry of calls maps a name to
+        get_json keyword arguments. Returns the decoded results by name and
+        the names still pending when the deadline expired; if the pool's loop
+        does not answer in time, every call is reported as missed.
+        """
+        async def _fetch_all():
+            tasks = {name: asyncio.ensure_future(self.get_json(**kwargs)) for name, kwargs in calls.items()}
+            if not tasks:
+                return {}, []
+            done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+            for task in pending:
+                task.cancel()
+            results = {name: task.result() for name, task in tasks.items() if task in done}
+            missed = [name for name, task in tasks.items() if task in pending]
+            return results, missed
+
+        try:
+            return self.run(_fetch_all(), timeout=deadline + 1)
+        except concurrent.futures.TimeoutError:
+            logger.error(f"Async HTTP pool did not answer within {deadline + 1}s")
+            return {}, list(calls)
+
+
+# Per-process pool instance
+http_pool = AsyncHTTPPool()
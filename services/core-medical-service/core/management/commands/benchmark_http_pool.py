@@ -0,0 +1,65 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+from django.core.management.base import BaseCommand
+
+from core.http_pool import AsyncHTTPPool
+
+
+class StubServiceHandler(BaseHTTPRequestHandler):
+    """Keep-alive stub that answers every GET like a downstream list endpoint"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = json.dumps({'count': 0, 'results': []}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request aiohttp sessions against the pooled client on a local stub service'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per scenario')
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubServiceHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/api/patient/1/"
+
+        async def fresh_session_get():
+            async with aiohttp.ClientSession() as session:
+                async with session.get(url) as response:
+                    return await response.json()
+
+        loop = asyncio.new_event_loop()
+        start = time.perf_counter()
+        for _ in range(total):
+            loop.run_until_complete(fresh_session_get())
+        fresh_ms = (time.perf_counter() - start) * 1000 / total
+        loop.close()
+
+        pool = AsyncHTTPPool()
+        start = time.perf_counter()
+        for _ in range(total):
+            pool.run(pool.get_json(url))
+        pooled_ms = (time.perf_counter() - start) * 1000 / total
+        server.shutdown()
+
+        self.stdout.write(f"Per-request session: {fresh_ms:.3f} ms/request")
+        self.stdout.write(f"Pooled session:      {pooled_ms:.3f} ms/request")
+        self.stdout.write(f"Connection reuse:    {pool.reuse_rate:.1%} "
+                          f"({pool.stats['connections_created']} opened, "
+                          f"{pool.stats['connections_reused']} reused)")
+        self.stdout.write(self.style.SUCCESS(f"Latency gain: {fresh_ms - pooled_ms:.3f} ms/request"))
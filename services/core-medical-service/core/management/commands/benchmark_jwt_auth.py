@@ -0,0 +1,49 @@
+import time
+
+import jwt
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from core.authentication import (
+    JWT_ALGORITHM, JWT_SECRET_KEY, JWTAuthentication, generate_jwt_token,
+)
+
+
+def legacy_authenticate(token):
+    """What every API request used to do: decode the token and load the User row"""
+    payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+    return User.objects.get(id=payload['user_id'])
+
+
+class Command(BaseCommand):
+    help = 'Measure JWT authentication cost per request, legacy decode + lookup versus cached claims'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Authentications per scenario')
+
+    def measure(self, fn, total):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            for _ in range(total):
+                fn()
+            elapsed = time.perf_counter() - start
+        return elapsed * 1_000_000 / total, len(queries) / total
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        with transaction.atomic():
+            user = User.objects.create_user('benchmark_jwt', password='unused')
+            token = generate_jwt_token(user)
+            request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+            authenticator = JWTAuthentication()
+
+            legacy_us, legacy_queries = self.measure(lambda: legacy_authenticate(token), total)
+            cached_us, cached_queries = self.measure(lambda: authenticator.authenticate(request), total)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Legacy decode + User lookup: {legacy_us:.1f} us/request, {legacy_queries:.2f} queries/request")
+        self.stdout.write(f"Cached claims principal:     {cached_us:.1f} us/request, {cached_queries:.2f} queries/request")
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {legacy_us / max(cached_us, 0.001):.1f}x"))
@@ -0,0 +1,77 @@
+import io
+import re
+import time
+from contextlib import redirect_stdout
+
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.auth.views import redirect_to_login
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from core.middleware import LoginRequiredMiddleware
+
+LEGACY_EXEMPT_PATHS = [
+    '/accounts/login/', '/admin/login/', '/health/ready', '/health/live',
+    '/auth/login/', '/auth/validate/', '/auth/refresh/', '/api/',
+]
+LEGACY_EXEMPT_PATTERNS = [
+    re.compile(r'^/accounts/password_reset/'),
+    re.compile(r'^/accounts/reset/'),
+    re.compile(r'^/admin/'),
+]
+
+
+def legacy_process_request(request):
+    """What the middleware used to do for every request"""
+    if request.user.is_authenticated:
+        return None
+    current_path = request.path_info
+    print(f"LoginRequiredMiddleware: Checking path '{current_path}'")
+    if current_path in LEGACY_EXEMPT_PATHS:
+        print(f"LoginRequiredMiddleware: Path '{current_path}' exempt (direct match)")
+        return None
+    for pattern in LEGACY_EXEMPT_PATTERNS:
+        if pattern.match(current_path):
+            print(f"LoginRequiredMiddleware: Path '{current_path}' exempt (pattern match)")
+            return None
+    if 'login' in current_path:
+        print(f"LoginRequiredMiddleware: Path '{current_path}' might be login related, exempting")
+        return None
+    print(f"LoginRequiredMiddleware: Redirecting to login from '{current_path}'")
+    return redirect_to_login(next=request.get_full_path(), login_url='/accounts/login/')
+
+
+class Command(BaseCommand):
+    help = 'Measure LoginRequiredMiddleware overhead per request, legacy prints and scans versus the compiled matcher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Requests per scenario')
+
+    def measure(self, fn, request, total):
+        # Legacy prints go to an in-memory buffer, a lower bound on real stdout cost
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for _ in range(total):
+                fn(request)
+            elapsed = time.perf_counter() - start
+        return elapsed * 1_000_000 / total
+
+    def handle(self, *args, **options):
+        total = options['requests']
+        factory = RequestFactory()
+        middleware = LoginRequiredMiddleware(lambda request: None)
+        scenarios = [
+            ('exempt health check', '/health/ready'),
+            ('exempt admin prefix', '/admin/pacientes2/'),
+            ('anonymous redirect', '/pacientes2/'),
+        ]
+
+        for label, path in scenarios:
+            request = factory.get(path)
+            request.user = AnonymousUser()
+            legacy_us = self.measure(legacy_process_request, request, total)
+            compiled_us = self.measure(middleware.process_request, request, total)
+            self.stdout.write(
+                f"{label:<22} legacy {legacy_us:7.2f} us/request, compiled {compiled_us:7.2f} us/request "
+                f"({legacy_us / max(compiled_us, 0.001):.1f}x)"
+            )
@@ -0,0 +1,83 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from core import permissions
+from core.permission_snapshot import PermissionSnapshotMiddleware, get_permission_snapshot
+from medical_system.context_processors import permisos_usuario
+
+ALL_GROUPS = ['Administrador', 'Medico', 'Medico_de_Junta', 'Enfermero', 'Tecnico']
+CHECKS = [
+    (ALL_GROUPS, 'can_view_all_examenes'),
+    (ALL_GROUPS, 'can_view_all_diagnosticos'),
+    (ALL_GROUPS[:3], 'can_view_all_cirugias'),
+    (ALL_GROUPS[:4], 'can_view_all_consultas'),
+    (ALL_GROUPS, 'can_add_examenes'),
+    (ALL_GROUPS[:4], 'can_add_diagnosticos'),
+    (ALL_GROUPS[:3], 'can_add_cirugias'),
+    (ALL_GROUPS[:4], 'can_add_consultas'),
+]
+
+
+def legacy_page_checks(user):
+    """The queries one page used to run: permissions context, context processor and view checks"""
+    backend = ModelBackend()
+    for groups, perm in CHECKS:
+        user.groups.filter(name__in=groups).exists() or backend.has_perm(user, perm)
+    list(user.groups.values_list('name', flat=True))
+    user.groups.filter(name__in=['Tecnico', 'Enfermero']).exists()
+    user.groups.filter(name__in=['Tecnico']).exists()
+    user.groups.filter(name__in=['Tecnico']).exists()
+    user.groups.filter(name__in=['Enfermero']).exists()
+
+
+def snapshot_page_checks(request):
+    """The same page work reading the request's permission snapshot"""
+    permissions.get_user_permissions_context(request.user)
+    permisos_usuario(request)
+    snapshot = get_permission_snapshot(request.user)
+    snapshot.in_group('Tecnico')
+    snapshot.in_group('Enfermero')
+    request.user.has_perm('pacientes2.view_paciente2')
+
+
+class Command(BaseCommand):
+    help = 'Count permission queries for one page render, before and with the permission snapshot'
+
+    def count(self, fn, *args):
+        with CaptureQueriesContext(connection) as queries:
+            fn(*args)
+        return len(queries)
+
+    def handle(self, *args, **options):
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        with transaction.atomic():
+            group, _ = Group.objects.get_or_create(name='Medico')
+            user = User.objects.create_user('benchmark_permissions', password='unused')
+            user.groups.add(group)
+            session = session_store()
+
+            def page(fresh_user):
+                request = RequestFactory().get('/')
+                request.user = fresh_user
+                request.session = session
+                return self.count(PermissionSnapshotMiddleware(snapshot_page_checks), request)
+
+            legacy = self.count(legacy_page_checks, User.objects.get(pk=user.pk))
+            cold = page(User.objects.get(pk=user.pk))
+            warm = page(User.objects.get(pk=user.pk))
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"Legacy checks:          {legacy} queries/request")
+        self.stdout.write(f"Snapshot, cold session: {cold} queries/request")
+        self.stdout.write(f"Snapshot, warm session: {warm} queries/request")
+        if cold <= 1 and warm == 0:
+            self.stdout.write(self.style.SUCCESS("Permission queries are at most one per request"))
+        else:
+            self.stdout.write(self.style.ERROR("Permission snapshot issued more queries than expected"))
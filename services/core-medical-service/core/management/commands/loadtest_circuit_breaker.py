@@ -0,0 +1,70 @@
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from core.circuit_breaker import CircuitBreaker
+from core.management.commands.benchmark_http_pool import StubServiceHandler
+from core.microservice_client import MicroserviceClient
+
+
+class Command(BaseCommand):
+    help = 'Measure core throughput while the exams service is blackholed, with and without circuit breakers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent callers')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per scenario')
+        parser.add_argument('--timeout', type=float, default=1.0, help='Per-call timeout in seconds')
+
+    def run_scenario(self, client, workers, duration, timeout):
+        """Each caller alternates a healthy (diagnosis) and a blackholed (exams) call"""
+        completed = []
+        deadline = time.monotonic() + duration
+
+        def caller():
+            count = 0
+            while time.monotonic() < deadline:
+                client.get_patient_diagnoses(1, timeout=timeout)
+                client.get_patient_exams(1, timeout=timeout)
+                count += 2
+            completed.append(count)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in range(workers):
+                executor.submit(caller)
+        return sum(completed) / duration
+
+    def handle(self, *args, **options):
+        healthy = ThreadingHTTPServer(('127.0.0.1', 0), StubServiceHandler)
+        threading.Thread(target=healthy.serve_forever, daemon=True).start()
+
+        # Accepts TCP connections in the backlog but never answers
+        blackhole = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        blackhole.bind(('127.0.0.1', 0))
+        blackhole.listen(1024)
+
+        with override_settings(
+            EXAMS_SERVICE_URL=f"http://127.0.0.1:{blackhole.getsockname()[1]}",
+            DIAGNOSIS_SERVICE_URL=f"http://127.0.0.1:{healthy.server_port}",
+        ):
+            baseline = MicroserviceClient()
+            for service in baseline.breakers:
+                # A breaker that never trips behaves like the old retry-everything client
+                baseline.breakers[service] = CircuitBreaker(service, minimum_calls=10 ** 9)
+            without_breaker = self.run_scenario(baseline, options['workers'], options['duration'], options['timeout'])
+
+            protected = MicroserviceClient()
+            with_breaker = self.run_scenario(protected, options['workers'], options['duration'], options['timeout'])
+            exams_state = protected.breakers['exams'].snapshot()
+
+        healthy.shutdown()
+        blackhole.close()
+
+        self.stdout.write(f"Without circuit breaker: {without_breaker:.1f} calls/s")
+        self.stdout.write(f"With circuit breaker:    {with_breaker:.1f} calls/s")
+        self.stdout.write(f"Exams circuit after run: {exams_state['state']}")
+        self.stdout.write(self.style.SUCCESS(f"Throughput ratio: {with_breaker / max(without_breaker, 0.001):.1f}x"))
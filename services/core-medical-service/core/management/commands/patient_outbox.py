@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from pacientes2.models import EventoPaciente, Paciente2
+
+
+class Command(BaseCommand):
+    help = 'Maintain the patient change outbox read by the other microservices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot', action='store_true',
+                            help='Publish the current name of every patient, so new consumers can catch up')
+        parser.add_argument('--missing-only', action='store_true',
+                            help='With --snapshot, only patients that have no event yet (safe to run on every deploy)')
+        parser.add_argument('--purge-days', type=int,
+                            help='Delete events older than this many days')
+
+    def publish(self, events):
+        with transaction.atomic():
+            EventoPaciente.reservar_orden()
+            EventoPaciente.objects.bulk_create(events)
+
+    def handle(self, *args, **options):
+        if options['snapshot']:
+            # One short transaction per chunk: each holds the outbox lock until it commits
+            pacientes = Paciente2.objects.only('id', 'nombre')
+            if options['missing_only']:
+                pacientes = pacientes.exclude(id__in=EventoPaciente.objects.values('paciente_id'))
+            published, chunk = 0, []
+            for paciente in pacientes.iterator():
+                chunk.append(EventoPaciente(paciente_id=paciente.pk, datos=EventoPaciente.datos_de(paciente)))
+                if len(chunk) == 1000:
+                    self.publish(chunk)
+                    published, chunk = published + len(chunk), []
+            if chunk:
+                self.publish(chunk)
+                published += len(chunk)
+            self.stdout.write(self.style.SUCCESS(f"Published {published} patient snapshot events"))
+
+        if options['purge_days'] is not None:
+            cutoff = timezone.now() - timedelta(days=options['purge_days'])
+            deleted, _ = EventoPaciente.objects.filter(creado__lt=cutoff).delete()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} events older than {options['purge_days']} days"))
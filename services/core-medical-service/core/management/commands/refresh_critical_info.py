@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pacientes2.logic.informacion_critica_logic import actualizar_secciones_remotas, limite_antiguedad
+from pacientes2.models import InformacionCritica, Paciente2
+
+
+class Command(BaseCommand):
+    help = 'Build or refresh the critical-info projection from the other microservices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pending-only', action='store_true',
+                            help='Only retry projections with sections whose last refresh failed')
+        parser.add_argument('--stale', action='store_true',
+                            help='Also refresh projections older than CRITICAL_INFO max_age_seconds')
+        parser.add_argument('--patient', type=int, action='append', dest='patients',
+                            help='Refresh only this patient ID (repeatable)')
+        parser.add_argument('--interval', type=float,
+                            help='Keep running, refreshing again every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            self.refresh(options)
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
+
+    def refresh(self, options):
+        # Patient ID -> sections to refresh (None for all of them)
+        if options['pending_only'] or options['stale']:
+            targets = {}
+            if options['pending_only']:
+                targets.update(
+                    InformacionCritica.objects.exclude(secciones_pendientes=[])
+                    .values_list('paciente_id', 'secciones_pendientes')
+                )
+            if options['stale']:
+                targets.update(dict.fromkeys(
+                    InformacionCritica.objects.filter(actualizado__lt=limite_antiguedad())
+                    .values_list('paciente_id', flat=True)
+                ))
+        elif options['patients']:
+            targets = dict.fromkeys(options['patients'])
+        else:
+            targets = dict.fromkeys(Paciente2.objects.values_list('id', flat=True))
+
+        refreshed = pending = 0
+        for patient_id, sections in targets.items():
+            projection = actualizar_secciones_remotas(patient_id, secciones=sections)
+            if projection is None:
+                self.stdout.write(self.style.WARNING(f"Patient {patient_id} not found"))
+                continue
+            refreshed += 1
+            if projection.secciones_pendientes:
+                pending += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed {refreshed} projections; {pending} still have pending sections"
+        ))
@@ -5,10 +5,17 @@ This module handles API calls to exams, diagnosis, and surgery microservices.
 
 import requests
 import logging
+import time
 from django.conf import settings
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any
+from urllib.parse import parse_qs, urlsplit
 from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+
+from .authentication import service_tokens
+from .circuit_breaker import CircuitBreaker, RetryBudget
+from .http_cache import http_cache
+from .http_pool import http_pool
+from .single_flight import SingleFlight, credential_key
 
 logger = logging.getLogger(__name__)
 
@@ -16,51 +23,178 @@ logger = logging.getLogger(__name__)
 class MicroserviceClient:
     """Client for communicating with other microservices"""
 
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+    IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+    SECTION_SERVICES = {'examenes': 'exams', 'diagnosticos': 'diagnosis', 'cirugias': 'surgery'}
+    # Must not exceed the services' BATCH_MAX_PATIENTS
+    BATCH_SIZE = 500
+    # Recent surgeries and abnormal exams kept in the critical-info projection
+    CRITICAL_RECENT_LIMIT = 5
+
     def __init__(self):
         self.session = requests.Session()
-        # Configure retry strategy
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
+        # Retries are driven by _make_request so they respect circuit breakers and the retry budget
+        pool_config = getattr(settings, 'MICROSERVICE_HTTP_POOL', {})
+        adapter = HTTPAdapter(
+            max_retries=0,
+            pool_connections=pool_config.get('limit', 100),
+            pool_maxsize=pool_config.get('limit_per_host', 20),
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
 
         # Set default timeout
         self.timeout = 10
 
+        # Worker-owned async pool for concurrent cross-service fan-out
+        self.async_pool = http_pool
+
+        # Circuit breaker per service and a retry budget, shared across workers only
+        # when MICROSERVICE_RESILIENCE['shared_cache'] names a shared cache
+        resilience = getattr(settings, 'MICROSERVICE_RESILIENCE', {})
+        self.max_retries = resilience.get('max_retries', 3)
+        self.backoff_factor = resilience.get('backoff_factor', 0.5)
+        self.breakers = {
+            service: CircuitBreaker(service, **resilience.get('circuit_breaker', {}))
+            for service in ('exams', 'diagnosis', 'surgery')
+        }
+        self.retry_budgets = {
+            service: RetryBudget(
+                service,
+                cache_alias=resilience.get('shared_cache') or 'default',
+                **resilience.get('retry_budget', {})
+            )
+            for service in self.breakers
+        }
+        if not all(budget.shared for budget in self.retry_budgets.values()):
+            logger.warning(
+                "Retry budgets use a per-process cache; each worker enforces its own budget. "
+                "Set MICROSERVICE_RESILIENCE_CACHE to a shared CACHES alias to cap retries across workers."
+            )
+
+        # Stored responses revalidated with ETag/Last-Modified
+        self.http_cache = http_cache
+
+        # Identical concurrent GETs share one in-flight request
+        coalescing = getattr(settings, 'MICROSERVICE_SINGLE_FLIGHT', {})
+        self.single_flight = SingleFlight(
+            shared_cache=coalescing.get('shared_cache'),
+            result_ttl=coalescing.get('result_ttl', 1),
+        ) if coalescing.get('enabled', True) else None
+
+    def _service_urls(self) -> Dict[str, str]:
+        return {
+            'exams': settings.EXAMS_SERVICE_URL,
+            'diagnosis': settings.DIAGNOSIS_SERVICE_URL,
+            'surgery': settings.SURGERY_SERVICE_URL,
+        }
+
+    def _service_for(self, url: str) -> Optional[str]:
+        """Name of the service that owns url, if any"""
+        for service, base_url in self._service_urls().items():
+            if base_url and url.startswith(base_url.rstrip('/')):
+                return service
+        return None
+
     def _make_request(self, method: str, url: str, **kwargs) -> Optional[Dict]:
-        """Make HTTP request with error handling"""
-        try:
-            kwargs.setdefault('timeout', self.timeout)
-            response = self.session.request(method, url, **kwargs)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            logger.error(f"Request failed to {url}: {str(e)}")
+        """
+        Make HTTP request with error handling.
+        Concurrent identical GETs made with the same credentials are
+        coalesced into a single downstream call.
+        """
+        if self.single_flight is None or method.upper() != 'GET':
+            return self._send_request(method, url, **kwargs)
+        params = sorted((kwargs.get('params') or {}).items())
+        key = f"{url}?{params}#{credential_key(kwargs.get('headers'))}"
+        return self.single_flight.do(key, lambda: self._send_request(method, url, **kwargs))
+
+    def _send_request(self, method: str, url: str, **kwargs) -> Optional[Dict]:
+        """
+        Send one HTTP request, retrying within the circuit breaker and budget.
+        Calls to a service whose circuit is open fail fast; failed idempotent
+        calls are retried with backoff while the circuit and retry budget allow.
+        GETs revalidate a stored response when the HTTP cache has one.
+        """
+        service = self._service_for(url)
+        breaker = self.breakers.get(service)
+        budget = self.retry_budgets.get(service)
+        if breaker and not breaker.allow_request():
+            logger.warning(f"Circuit open for {service}, failing fast: {url}")
             return None
 
+        kwargs.setdefault('timeout', self.timeout)
+        if service and 'Authorization' not in (kwargs.get('headers') or {}):
+            # Calls made without a request still authenticate as core itself
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), 'Authorization': f"Bearer {service_tokens.get()}"}
+        cached = None
+        if method.upper() == 'GET':
+            cached = self.http_cache.lookup(url, kwargs.get('params'))
+            if cached is not None:
+                kwargs['headers'] = {**(kwargs.get('headers') or {}), **self.http_cache.conditional_headers(cached)}
+        if budget:
+            budget.record_request()
+        retryable = method.upper() in self.IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                error = str(e)
+            else:
+                if response.status_code not in self.RETRY_STATUSES:
+                    # The service answered, so the call counts as healthy even on 4xx
+                    if breaker:
+                        breaker.record_success()
+                    if response.status_code == 304 and cached is not None:
+                        return self.http_cache.revalidated(cached)
+                    try:
+                        response.raise_for_status()
+                        body = response.json()
+                    except (requests.RequestException, ValueError) as e:
+                        logger.error(f"Request failed to {url}: {str(e)}")
+                        return None
+                    if method.upper() == 'GET':
+                        self.http_cache.store(url, kwargs.get('params'), response.headers, body)
+                    return body
+                error = f"status {response.status_code}"
+
+            if breaker:
+                breaker.record_failure()
+            can_retry = (
+                retryable and attempt < self.max_retries
+                and (breaker is None or breaker.allow_request())
+                and (budget is None or budget.try_spend())
+            )
+            if not can_retry:
+                logger.error(f"Request failed to {url}: {error}")
+                return None
+            time.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
+
     def _get_auth_headers(self, request) -> Dict[str, str]:
         """Get authentication headers for API requests"""
         headers = {'Content-Type': 'application/json'}
 
-        # Forward authentication if available
-        if hasattr(request, 'user') and request.user.is_authenticated:
-            # You could implement JWT token forwarding here
-            pass
+        # Act for the signed-in user when there is one, otherwise as core itself;
+        # tokens are cached until shortly before they expire
+        user = getattr(request, 'user', None)
+        # Service callers (tokens with no user_id) are relayed as core itself
+        if user is not None and user.is_authenticated and user.pk is not None:
+            token = service_tokens.get(user)
+        else:
+            token = service_tokens.get()
+        headers['Authorization'] = f"Bearer {token}"
 
         return headers
 
     # Exams Service API calls
-    def get_patient_exams(self, patient_id: int, request=None) -> List[Dict]:
+    def get_patient_exams(self, patient_id: int, request=None, timeout: Optional[float] = None) -> List[Dict]:
         """Get all exams for a patient"""
         url = f"{settings.EXAMS_SERVICE_URL.rstrip('/')}/public-api/examenes/"
         headers = self._get_auth_headers(request)
         params = {'patient_id': patient_id}
 
-        result = self._make_request('GET', url, headers=headers, params=params)
+        result = self._make_request('GET', url, headers=headers, params=params, timeout=timeout or self.timeout)
         return result.get('results', []) if result else []
 
     def get_exam_detail(self, exam_id: int, request=None) -> Optional[Dict]:
@@ -78,13 +212,13 @@ class MicroserviceClient:
         return self._make_request('POST', url, headers=headers, json=exam_data)
 
     # Diagnosis Service API calls
-    def get_patient_diagnoses(self, patient_id: int, request=None) -> List[Dict]:
+    def get_patient_diagnoses(self, patient_id: int, request=None, timeout: Optional[float] = None) -> List[Dict]:
         """Get all diagnoses for a patient"""
         url = f"{settings.DIAGNOSIS_SERVICE_URL.rstrip('/')}/public-api/diagnosticos/"
         headers = self._get_auth_headers(request)
         params = {'patient_id': patient_id}
 
-        result = self._make_request('GET', url, headers=headers, params=params)
+        result = self._make_request('GET', url, headers=headers, params=params, timeout=timeout or self.timeout)
         return result.get('results', []) if result else []
 
     def get_diagnosis_detail(self, diagnosis_id: int, request=None) -> Optional[Dict]:
@@ -102,13 +236,13 @@ class MicroserviceClient:
         return self._make_request('POST', url, headers=headers, json=diagnosis_data)
 
     # Surgery Service API calls
-    def get_patient_surgeries(self, patient_id: int, request=None) -> List[Dict]:
+    def get_patient_surgeries(self, patient_id: int, request=None, timeout: Optional[float] = None) -> List[Dict]:
         """Get all surgeries for a patient"""
         url = f"{settings.SURGERY_SERVICE_URL.rstrip('/')}/api/public/cirugias/"
         headers = self._get_auth_headers(request)
         params = {'patient_id': patient_id}
 
-        result = self._make_request('GET', url, headers=headers, params=params)
+        result = self._make_request('GET', url, headers=headers, params=params, timeout=timeout or self.timeout)
         return result.get('results', []) if result else []
 
     def get_surgery_detail(self, surgery_id: int, request=None) -> Optional[Dict]:
@@ -125,6 +259,208 @@ class MicroserviceClient:
 
         return self._make_request('POST', url, headers=headers, json=surgery_data)
 
+    # Cursor-paginated listings
+    @staticmethod
+    def _cursor_from(link: Optional[str]) -> Optional[str]:
+        """Extract the cursor parameter from a next/previous link"""
+        if not link:
+            return None
+        return parse_qs(urlsplit(link).query).get('cursor', [None])[0]
+
+    def get_page(self, url: str, cursor: Optional[str] = None, request=None,
+                 params: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Fetch one page of a cursor-paginated listing. Returns its results and
+        the next/previous cursors, or None if the service could not be reached.
+        """
+        query = dict(params or {})
+        if cursor:
+            query['cursor'] = cursor
+        data = self._make_request('GET', url, headers=self._get_auth_headers(request), params=query)
+        if data is None:
+            return None
+        return {
+            'results': data.get('results', []),
+            'next': self._cursor_from(data.get('next')),
+            'previous': self._cursor_from(data.get('previous')),
+        }
+
+    def iter_pages(self, url: str, request=None, params: Optional[Dict] = None) -> Iterator[Dict]:
+        """Yield every record of a listing, fetching each page only when the previous one is consumed"""
+        cursor = None
+        while True:
+            page = self.get_page(url, cursor, request, params)
+            if page is None:
+                return
+            yield from page['results']
+            cursor = page['next']
+            if not cursor:
+                return
+
+    def get_exams_page(self, cursor: Optional[str] = None, request=None) -> Optional[Dict]:
+        """One page of all exams, newest first"""
+        url = f"{settings.EXAMS_SERVICE_URL.rstrip('/')}/public-api/examenes/"
+        return self.get_page(url, cursor, request)
+
+    def get_diagnoses_page(self, cursor: Optional[str] = None, request=None) -> Optional[Dict]:
+        """One page of all diagnoses, newest first"""
+        url = f"{settings.DIAGNOSIS_SERVICE_URL.rstrip('/')}/public-api/diagnosticos/"
+        return self.get_page(url, cursor, request)
+
+    def get_surgeries_page(self, cursor: Optional[str] = None, request=None) -> Optional[Dict]:
+        """One page of all surgeries, newest first"""
+        url = f"{settings.SURGERY_SERVICE_URL.rstrip('/')}/api/public/cirugias/"
+        return self.get_page(url, cursor, request)
+
+    # Multi-patient batch reads
+    def _get_batch(self, url: str, patient_ids: List[int], request=None) -> Dict[int, List[Dict]]:
+        """POST patient IDs to a batch endpoint in chunks and merge the per-patient results"""
+        headers = self._get_auth_headers(request)
+        grouped = {}
+        for start in range(0, len(patient_ids), self.BATCH_SIZE):
+            chunk = list(patient_ids[start:start + self.BATCH_SIZE])
+            result = self._make_request('POST', url, headers=headers, json={'patient_ids': chunk})
+            for patient_id, items in (result or {}).get('results', {}).items():
+                grouped[int(patient_id)] = items
+        return grouped
+
+    def get_exams_for_patients(self, patient_ids: List[int], request=None) -> Dict[int, List[Dict]]:
+        """Get exams for several patients, grouped by patient ID (missing on failure)"""
+        url = f"{settings.EXAMS_SERVICE_URL.rstrip('/')}/public-api/examenes/batch"
+        return self._get_batch(url, patient_ids, request)
+
+    def get_diagnoses_for_patients(self, patient_ids: List[int], request=None) -> Dict[int, List[Dict]]:
+        """Get diagnoses for several patients, grouped by patient ID (missing on failure)"""
+        url = f"{settings.DIAGNOSIS_SERVICE_URL.rstrip('/')}/public-api/diagnosticos/batch/"
+        return self._get_batch(url, patient_ids, request)
+
+    def get_surgeries_for_patients(self, patient_ids: List[int], request=None) -> Dict[int, List[Dict]]:
+        """Get surgeries for several patients, grouped by patient ID (missing on failure)"""
+        url = f"{settings.SURGERY_SERVICE_URL.rstrip('/')}/api/public/cirugias/batch/"
+        return self._get_batch(url, patient_ids, request)
+
+    def get_record_counts(self, patient_ids: List[int], request=None,
+                          sections: Optional[List[str]] = None) -> Dict[str, Dict[int, int]]:
+        """
+        Count exams, diagnoses and surgeries for several patients, one GROUP BY
+        per service, with the calls issued concurrently. Sections that fail or
+        miss the fan-out deadline are left out of the result.
+        """
+        urls = {
+            'examenes': f"{settings.EXAMS_SERVICE_URL.rstrip('/')}/public-api/examenes/counts",
+            'diagnosticos': f"{settings.DIAGNOSIS_SERVICE_URL.rstrip('/')}/public-api/diagnosticos/counts/",
+            'cirugias': f"{settings.SURGERY_SERVICE_URL.rstrip('/')}/api/public/cirugias/counts/",
+        }
+        budgets = getattr(settings, 'MICROSERVICE_SERVICE_BUDGETS', {})
+        headers = self._get_auth_headers(request)
+        calls = {}
+        for section, url in urls.items():
+            service = self.SECTION_SERVICES[section]
+            if sections is not None and section not in sections:
+                continue
+            if not self.breakers[service].allow_request():
+                logger.warning(f"Circuit open for '{section}', skipping record counts")
+                continue
+            for start in range(0, len(patient_ids), self.BATCH_SIZE):
+                chunk = patient_ids[start:start + self.BATCH_SIZE]
+                calls[(section, start)] = {
+                    'url': url, 'headers': headers, 'timeout': budgets.get(service),
+                    'params': {'patient_ids': ','.join(str(patient_id) for patient_id in chunk)},
+                }
+
+        results, _ = self.async_pool.fetch_all(
+            calls, deadline=getattr(settings, 'MICROSERVICE_FANOUT_DEADLINE', 3.0)
+        )
+
+        counts, failed = {}, set()
+        for section, start in calls:
+            breaker = self.breakers[self.SECTION_SERVICES[section]]
+            result = results.get((section, start))
+            if result is None:
+                breaker.record_failure()
+                failed.add(section)
+                continue
+            breaker.record_success()
+            for patient_id, total in result.get('results', {}).items():
+                counts.setdefault(section, {})[int(patient_id)] = total
+        if failed:
+            logger.warning(f"Record counts unavailable for {', '.join(sorted(failed))}")
+        return {section: totals for section, totals in counts.items() if section not in failed}
+
+    # Concurrent fan-out
+    def get_patient_records(self, patient_id: int, request=None,
+                            sections: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Fetch exams, diagnoses and surgeries for a patient concurrently.
+
+        Each service call is bounded by its own budget and the whole fan-out
+        by MICROSERVICE_FANOUT_DEADLINE. Sections that fail or miss the
+        deadline are returned empty and listed under 'partial' instead of
+        blocking. Pass sections to fetch only a subset.
+        """
+        urls = {
+            'examenes': f"{settings.EXAMS_SERVICE_URL.rstrip('/')}/public-api/examenes/",
+            'diagnosticos': f"{settings.DIAGNOSIS_SERVICE_URL.rstrip('/')}/public-api/diagnosticos/",
+            'cirugias': f"{settings.SURGERY_SERVICE_URL.rstrip('/')}/api/public/cirugias/",
+        }
+        return self._fan_out(patient_id, urls, {'patient_id': patient_id}, request, sections)
+
+    def get_critical_records(self, patient_id: int, request=None,
+                             sections: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Fetch the records behind a patient's critical-info projection: latest
+        abnormal exams, treatments not yet ended (under 'diagnosticos') and
+        recent surgeries. Same deadline and 'partial' semantics as
+        get_patient_records.
+        """
+        urls = {
+            'examenes': f"{settings.EXAMS_SERVICE_URL.rstrip('/')}/public-api/examenes/abnormal",
+            'diagnosticos': f"{settings.DIAGNOSIS_SERVICE_URL.rstrip('/')}/public-api/tratamientos/active/",
+            'cirugias': f"{settings.SURGERY_SERVICE_URL.rstrip('/')}/api/public/cirugias/recent/",
+        }
+        params = {'patient_id': patient_id, 'limit': self.CRITICAL_RECENT_LIMIT}
+        return self._fan_out(patient_id, urls, params, request, sections)
+
+    def _fan_out(self, patient_id: int, urls: Dict[str, str], params: Dict, request=None,
+                 sections: Optional[List[str]] = None) -> Dict[str, Any]:
+        """GET one URL per section concurrently within the per-service budgets and fan-out deadline"""
+        budgets = getattr(settings, 'MICROSERVICE_SERVICE_BUDGETS', {})
+        headers = self._get_auth_headers(request)
+        calls = {
+            section: {
+                'url': url, 'params': params, 'headers': headers,
+                'timeout': budgets.get(self.SECTION_SERVICES[section]),
+            }
+            for section, url in urls.items()
+            if sections is None or section in sections
+        }
+
+        # Sections whose service circuit is open are reported partial without a call
+        records = {'partial': []}
+        for section in list(calls):
+            if not self.breakers[self.SECTION_SERVICES[section]].allow_request():
+                logger.warning(f"Circuit open for '{section}', skipping fan-out for patient {patient_id}")
+                records[section] = []
+                records['partial'].append(section)
+                del calls[section]
+
+        results, missed = self.async_pool.fetch_all(
+            calls, deadline=getattr(settings, 'MICROSERVICE_FANOUT_DEADLINE', 3.0)
+        )
+
+        for section in calls:
+            breaker = self.breakers[self.SECTION_SERVICES[section]]
+            result = results.get(section)
+            if result is None:
+                breaker.record_failure()
+                reason = 'missed deadline' if section in missed else 'failed'
+                logger.warning(f"Fan-out for patient {patient_id} {reason} for '{section}'")
+                records['partial'].append(section)
+            else:
+                breaker.record_success()
+            records[section] = result.get('results', []) if result else []
+        return records
+
     # Health checks
     def check_service_health(self, service_url: str) -> bool:
         """Check if a microservice is healthy"""
@@ -143,6 +479,10 @@ class MicroserviceClient:
             'surgery': self.check_service_health(settings.SURGERY_SERVICE_URL),
         }
 
+    def get_circuit_states(self) -> Dict[str, Dict]:
+        """Get circuit breaker state of all microservices"""
+        return {service: breaker.snapshot() for service, breaker in self.breakers.items()}
+
 
 # Global client instance
 microservice_client = MicroserviceClient()
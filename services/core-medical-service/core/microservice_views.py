@@ -9,12 +9,15 @@ from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
 from django.conf import settings
 from core.microservice_client import microservice_client
+from core.health_prober import health_prober
+from core.permission_snapshot import get_permission_snapshot
 from core.permissions import (
     require_examenes_access, require_diagnosticos_access, require_cirugias_access,
     can_add_examenes, can_add_diagnosticos, can_add_cirugias,
     get_user_permissions_context, require_add_permission
 )
 from pacientes2.models import Paciente2
+from pacientes2.logic.informacion_critica_logic import registrar_cambio_remoto
 import logging
 import json
 
@@ -25,19 +28,19 @@ logger = logging.getLogger(__name__)
 def examenes_list(request):
     """List all exams with microservice integration"""
     try:
-        # Get exams from microservice
-        url = f"{settings.EXAMS_SERVICE_URL.rstrip('/')}/public-api/examenes/"
-        exams = microservice_client._make_request('GET', url)
-        if exams is None:
+        page = microservice_client.get_exams_page(request.GET.get('cursor'), request)
+        if page is None:
             messages.error(request, "No se pudo conectar al servicio de exámenes")
-            exams = []
+            page = {'results': [], 'next': None, 'previous': None}
 
         # Get user permissions context
         permissions_context = get_user_permissions_context(request.user)
 
         return render(request, 'examenes/examenes_list.html', {
-            'examenes': exams.get('results', []) if exams else [],
-            'service_status': microservice_client.check_service_health(settings.EXAMS_SERVICE_URL),
+            'examenes': page['results'],
+            'next_cursor': page['next'],
+            'previous_cursor': page['previous'],
+            'service_status': health_prober.is_healthy('exams'),
             **permissions_context
         })
     except Exception as e:
@@ -96,17 +99,18 @@ def examenes_detail(request, exam_id):
 def diagnosticos_list(request):
     """List all diagnoses"""
     try:
-        url = f"{settings.DIAGNOSIS_SERVICE_URL.rstrip('/')}/public-api/diagnosticos/"
-        diagnoses = microservice_client._make_request('GET', url)
-        if diagnoses is None:
+        page = microservice_client.get_diagnoses_page(request.GET.get('cursor'), request)
+        if page is None:
             messages.error(request, "No se pudo conectar al servicio de diagnósticos")
-            diagnoses = []
+            page = {'results': [], 'next': None, 'previous': None}
 
         # Get user permissions context
         permissions_context = get_user_permissions_context(request.user)
 
         return render(request, 'diagnosticos/diagnosticos_list.html', {
-            'diagnosticos': diagnoses.get('results', []) if diagnoses else [],
+            'diagnosticos': page['results'],
+            'next_cursor': page['next'],
+            'previous_cursor': page['previous'],
             **permissions_context
         })
     except Exception as e:
@@ -143,17 +147,18 @@ def diagnosticos_patient(request, patient_id):
 def cirugias_list(request):
     """List all surgeries"""
     try:
-        url = f"{settings.SURGERY_SERVICE_URL.rstrip('/')}/api/public/cirugias/"
-        surgeries = microservice_client._make_request('GET', url)
-        if surgeries is None:
+        page = microservice_client.get_surgeries_page(request.GET.get('cursor'), request)
+        if page is None:
             messages.error(request, "No se pudo conectar al servicio de cirugías")
-            surgeries = []
+            page = {'results': [], 'next': None, 'previous': None}
 
         # Get user permissions context
         permissions_context = get_user_permissions_context(request.user)
 
         return render(request, 'cirugias/cirugias_list.html', {
-            'cirugias': surgeries.get('results', []) if surgeries else [],
+            'cirugias': page['results'],
+            'next_cursor': page['next'],
+            'previous_cursor': page['previous'],
             **permissions_context
         })
     except Exception as e:
@@ -189,12 +194,21 @@ def cirugias_patient(request, patient_id):
 @login_required
 def services_status(request):
     """Get microservices status"""
-    status = microservice_client.get_services_status()
+    status = health_prober.get_services_status()
+    circuits = microservice_client.get_circuit_states()
+    probes = {
+        service: {key: value for key, value in probe.items() if key != 'history'}
+        for service, probe in health_prober.snapshot().items()
+    }
 
     if request.headers.get('Accept') == 'application/json':
-        return JsonResponse(status)
+        return JsonResponse({**status, 'circuits': circuits, 'probes': probes})
 
-    return render(request, 'core/services_status.html', {'services': status})
+    return render(request, 'core/services_status.html', {
+        'services': status,
+        'circuits': circuits,
+        'probes': probes,
+    })
 
 
 # Views for adding new records
@@ -229,9 +243,12 @@ def examenes_add(request):
             
             # Send to microservice
             url = f"{settings.EXAMS_SERVICE_URL.rstrip('/')}/api/examenes/"
-            response = microservice_client._make_request('POST', url, json=exam_data)
+            response = microservice_client._make_request(
+                'POST', url, json=exam_data, headers=microservice_client._get_auth_headers(request)
+            )
             
             if response:
+                registrar_cambio_remoto(int(request.POST['paciente_id']), ['examenes'], request)
                 messages.success(request, "Examen creado exitosamente")
                 return redirect('examenes_redirect')
             else:
@@ -281,9 +298,12 @@ def diagnosticos_add(request):
             
             # Send to microservice
             url = f"{settings.DIAGNOSIS_SERVICE_URL.rstrip('/')}/api/diagnosticos/"
-            response = microservice_client._make_request('POST', url, json=diagnosis_data)
+            response = microservice_client._make_request(
+                'POST', url, json=diagnosis_data, headers=microservice_client._get_auth_headers(request)
+            )
             
             if response:
+                registrar_cambio_remoto(int(request.POST['paciente_id']), ['diagnosticos'], request)
                 messages.success(request, "Diagnóstico creado exitosamente")
                 return redirect('diagnosticos_redirect')
             else:
@@ -335,9 +355,12 @@ def cirugias_add(request):
             
             # Send to microservice
             url = f"{settings.SURGERY_SERVICE_URL.rstrip('/')}/api/cirugias/"
-            response = microservice_client._make_request('POST', url, json=surgery_data)
+            response = microservice_client._make_request(
+                'POST', url, json=surgery_data, headers=microservice_client._get_auth_headers(request)
+            )
             
             if response:
+                registrar_cambio_remoto(int(request.POST['paciente_id']), ['cirugias'], request)
                 messages.success(request, "Cirugía creada exitosamente")
                 return redirect('cirugias_redirect')
             else:
@@ -362,5 +385,5 @@ def cirugias_add(request):
 def permission_denied(request):
     """Permission denied page"""
     return render(request, 'core/permission_denied.html', {
-        'user_groups': list(request.user.groups.values_list('name', flat=True)) if request.user.is_authenticated else []
+        'user_groups': sorted(get_permission_snapshot(request.user).groups) if request.user.is_authenticated else []
     })
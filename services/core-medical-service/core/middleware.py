@@ -1,70 +1,65 @@
-from django.shortcuts import redirect
+import logging
+import random
+import re
+
 from django.conf import settings
 from django.contrib.auth.views import redirect_to_login
-from django.utils.deprecation import MiddlewareMixin
-import re
-import logging
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-class LoginRequiredMiddleware(MiddlewareMixin):
+
+def compile_exempt_matcher(exempt_paths, exempt_prefixes, exempt_patterns=()):
+    """
+    Build one regex matching any exempt path exactly, any exempt prefix or
+    any exempt pattern (a regex matched from the start of the path), so a
+    request is classified with a single match call.
+    """
+    alternatives = [re.escape(str(path)) + r'\Z' for path in exempt_paths]
+    alternatives += [re.escape(str(prefix)) for prefix in exempt_prefixes]
+    alternatives += [f'(?:{pattern})' for pattern in exempt_patterns]
+    if not alternatives:
+        return None
+    return re.compile('|'.join(alternatives))
+
+
+class LoginRequiredMiddleware:
     """
     Middleware that requires a user to be authenticated to view any page,
-    except for those listed in the explicit exempt paths.
+    except for the exempt paths, prefixes and patterns configured in
+    settings.LOGIN_REQUIRED (plus settings.LOGIN_EXEMPT_URLS).
     """
-    def __init__(self, get_response=None):
+    def __init__(self, get_response):
         self.get_response = get_response
-        # Compile a list of explicit exempt paths to check
-        self.exempt_paths = [
-            '/accounts/login/',       # The login page itself
-            '/admin/login/',          # Admin login page
-            '/health/ready',          # Health check endpoints
-            '/health/live',           # Health check endpoints
-            '/auth/login/',           # JWT login endpoint
-            '/auth/validate/',        # JWT validation endpoint
-            '/auth/refresh/',         # JWT refresh endpoint
-            '/api/',                  # API endpoints for microservices
-            # Add any other paths that should be accessible without login
-        ]
-        # Also compile patterns to match dynamic paths like password reset URLs
-        self.exempt_patterns = [
-            re.compile(r'^/accounts/password_reset/'),
-            re.compile(r'^/accounts/reset/'),
-            re.compile(r'^/admin/'),  # All admin URLs
-            # Add other patterns if needed
-        ]
-        logger.info(f"LoginRequiredMiddleware initialized with exempt paths: {self.exempt_paths}")
-        super().__init__(get_response)
+        config = getattr(settings, 'LOGIN_REQUIRED', {})
+        exempt_paths = list(config.get('exempt_paths', [])) + list(getattr(settings, 'LOGIN_EXEMPT_URLS', []))
+        exempt_prefixes = config.get('exempt_prefixes', [])
+        exempt_patterns = config.get('exempt_patterns', [])
+        self.login_url = config.get('login_url', '/accounts/login/')
+        self.log_sample_rate = config.get('log_sample_rate', 0.01)
+        matcher = compile_exempt_matcher(exempt_paths, exempt_prefixes, exempt_patterns)
+        self.is_exempt = matcher.match if matcher else (lambda path: None)
+        logger.info("LoginRequiredMiddleware initialized with %d exempt paths, %d prefixes and %d patterns",
+                    len(exempt_paths), len(exempt_prefixes), len(exempt_patterns))
 
-    def process_request(self, request):
-        # Skip middleware completely if user is authenticated
-        if request.user.is_authenticated:
-            return None
+    def _log_sampled(self, message, *args):
+        # Debug-level and sampled so the hot path never writes on every request
+        if logger.isEnabledFor(logging.DEBUG) and random.random() < self.log_sample_rate:
+            logger.debug(message, *args)
 
-        # Get the current path
-        current_path = request.path_info
+    def __call__(self, request):
+        response = self.process_request(request)
+        return response if response is not None else self.get_response(request)
 
-        # DEBUGGING - Print every request path for anonymous users
-        print(f"LoginRequiredMiddleware: Checking path '{current_path}'")
+    def process_request(self, request):
+        current_path = request.path_info
 
-        # 1. Check for direct path match
-        if current_path in self.exempt_paths:
-            print(f"LoginRequiredMiddleware: Path '{current_path}' exempt (direct match)")
+        # Exempt paths are classified before touching the session-backed user
+        if self.is_exempt(current_path):
             return None
 
-        # 2. Check for pattern match
-        for pattern in self.exempt_patterns:
-            if pattern.match(current_path):
-                print(f"LoginRequiredMiddleware: Path '{current_path}' exempt (pattern match)")
-                return None
-
-        # 3. Special case for login - extra check for any login path
-        # This is basically a "belt and suspenders" approach to guarantee login is always accessible
-        if 'login' in current_path:
-            print(f"LoginRequiredMiddleware: Path '{current_path}' might be login related, exempting")
+        if request.user.is_authenticated:
             return None
 
-        # If it's not exempt, redirect to login
-        print(f"LoginRequiredMiddleware: Redirecting to login from '{current_path}'")
-        return redirect_to_login(next=request.get_full_path(), login_url='/accounts/login/')
+        self._log_sampled("LoginRequiredMiddleware: redirecting anonymous request for '%s' to login", current_path)
+        return redirect_to_login(next=request.get_full_path(), login_url=self.login_url)
@@ -0,0 +1,212 @@
+"""
+Per-request permission snapshot for core.permissions.
+
+A user's group names and permissions are fetched with a single query and
+kept in the session under a version stamp, so a request normally makes no
+permission queries at all. Changing a user's groups or permissions, or a
+group's permissions, replaces the stamp and the next request rebuilds the
+snapshot.
+
+Stamps must live in a cache every worker shares (Redis, Memcached,
+database). Without one a revocation would only reach the worker that
+handled it, so the snapshot is not reused across requests at all: each
+request that checks permissions loads it once.
+"""
+
+import logging
+import time
+import uuid
+from typing import Iterable
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import CharField, Value
+from django.utils.functional import SimpleLazyObject
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = '_permission_snapshot'
+GLOBAL_VERSION_KEY = 'permission_snapshot:version:global'
+
+SNAPSHOT_BACKEND = 'core.permission_snapshot.SnapshotModelBackend'
+# Backends that sessions created before SnapshotModelBackend may name
+LEGACY_BACKENDS = ('django.contrib.auth.backends.ModelBackend',)
+
+
+def _config():
+    return getattr(settings, 'PERMISSION_SNAPSHOT', {})
+
+
+def _shared_cache():
+    """The cache holding version stamps, or None if no shared alias is configured"""
+    alias = _config().get('cache_alias')
+    if not alias:
+        return None
+    cache = caches[alias]
+    if isinstance(cache, (LocMemCache, DummyCache)):
+        # Per process: version bumps would not reach the other workers
+        return None
+    return cache
+
+
+def _user_version_key(user_id) -> str:
+    return f"permission_snapshot:version:user:{user_id}"
+
+
+class PermissionSnapshot:
+    """Immutable view of one user's groups and permissions"""
+
+    __slots__ = ('groups', 'perms', 'is_active', 'is_superuser', 'is_staff')
+
+    def __init__(self, groups: Iterable[str], perms: Iterable[str],
+                 is_active: bool, is_superuser: bool, is_staff: bool):
+        self.groups = frozenset(groups)
+        self.perms = frozenset(perms)
+        self.is_active = is_active
+        self.is_superuser = is_superuser
+        self.is_staff = is_staff
+
+    def in_group(self, *names: str) -> bool:
+        """Whether the user belongs to any of the named groups"""
+        return not self.groups.isdisjoint(names)
+
+    def has_perm(self, perm: str) -> bool:
+        """Same answer as ModelBackend's user.has_perm for 'app_label.codename'"""
+        if not self.is_active:
+            return False
+        return self.is_superuser or perm in self.perms
+
+    @classmethod
+    def fetch(cls, user) -> 'PermissionSnapshot':
+        """Load groups, group permissions and direct permissions in one query"""
+        # Annotations are selected after fields whatever the values_list
+        # order, so group_name goes last on both sides of the union
+        group_rows = Group.objects.filter(user__id=user.pk).values_list(
+            'permissions__content_type__app_label', 'permissions__codename', 'name'
+        )
+        user_rows = Permission.objects.filter(user__id=user.pk).annotate(
+            group_name=Value(None, output_field=CharField())
+        ).values_list('content_type__app_label', 'codename', 'group_name')
+
+        groups, perms = set(), set()
+        for app_label, codename, group_name in group_rows.union(user_rows, all=True):
+            if group_name:
+                groups.add(group_name)
+            if codename:
+                perms.add(f"{app_label}.{codename}")
+        return cls(groups, perms, user.is_active, user.is_superuser, user.is_staff)
+
+
+def _current_versions(cache, user_id):
+    """Current (user, global) stamps, creating them on first use or after eviction"""
+    user_key = _user_version_key(user_id)
+    versions = cache.get_many([user_key, GLOBAL_VERSION_KEY])
+    for key in (user_key, GLOBAL_VERSION_KEY):
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return versions[user_key], versions[GLOBAL_VERSION_KEY]
+
+
+def bump_user_version(user_id) -> None:
+    """Invalidate the stored snapshots of one user"""
+    cache = _shared_cache()
+    if cache is not None:
+        cache.set(_user_version_key(user_id), uuid.uuid4().hex, None)
+
+
+def bump_global_version() -> None:
+    """Invalidate every stored snapshot, e.g. after a group's permissions change"""
+    cache = _shared_cache()
+    if cache is not None:
+        cache.set(GLOBAL_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def load_permission_snapshot(user, session=None) -> PermissionSnapshot:
+    """
+    Snapshot from the session if its stamp is current, otherwise rebuild and
+    store it. Without a shared cache nothing is stored: it is always rebuilt.
+    """
+    cache = _shared_cache()
+    if cache is None:
+        return PermissionSnapshot.fetch(user)
+
+    version = list(_current_versions(cache, user.pk))
+    stored = session.get(SESSION_KEY) if session is not None else None
+    if (stored and stored['user_id'] == user.pk and stored['version'] == version
+            and time.time() - stored['created'] < _config().get('max_age', 300)):
+        return PermissionSnapshot(stored['groups'], stored['perms'], *stored['flags'])
+
+    snapshot = PermissionSnapshot.fetch(user)
+    if session is not None:
+        session[SESSION_KEY] = {
+            'user_id': user.pk,
+            'version': version,
+            'created': time.time(),
+            'groups': sorted(snapshot.groups),
+            'perms': sorted(snapshot.perms),
+            'flags': [snapshot.is_active, snapshot.is_superuser, snapshot.is_staff],
+        }
+    return snapshot
+
+
+def get_permission_snapshot(user) -> PermissionSnapshot:
+    """
+    The request's snapshot for user. PermissionSnapshotMiddleware attaches
+    one backed by the session; outside a request it is built once per user
+    object.
+    """
+    snapshot = getattr(user, '_permission_snapshot', None)
+    if snapshot is None:
+        snapshot = load_permission_snapshot(user)
+        user._permission_snapshot = snapshot
+    return snapshot
+
+
+def remap_legacy_backend(session) -> None:
+    """
+    Point a session logged in through ModelBackend at SnapshotModelBackend,
+    which resolves the same users. ModelBackend is not listed in
+    AUTHENTICATION_BACKENDS, since it would answer every permission check
+    the snapshot denies with its own queries.
+    """
+    if session.get(BACKEND_SESSION_KEY) in LEGACY_BACKENDS:
+        session[BACKEND_SESSION_KEY] = SNAPSHOT_BACKEND
+
+
+class PermissionSnapshotMiddleware:
+    """Attach the session-backed permission snapshot to request.user"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = getattr(request, 'session', None)
+        if session is not None:
+            # Before request.user is resolved from the session
+            remap_legacy_backend(session)
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            # Lazy so requests that never check permissions skip the version lookup
+            user._permission_snapshot = SimpleLazyObject(
+                lambda: load_permission_snapshot(user, request.session)
+            )
+        return self.get_response(request)
+
+
+class SnapshotModelBackend(ModelBackend):
+    """ModelBackend whose permission checks (permission_required, has_perm) read the snapshot"""
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        return set(get_permission_snapshot(user_obj).perms)
+
+    def get_group_permissions(self, user_obj, obj=None):
+        # Group and direct permissions are merged in the snapshot
+        return self.get_all_permissions(user_obj, obj)
@@ -10,18 +10,20 @@ from django.http import HttpResponseForbidden
 from django.shortcuts import render
 from django.core.exceptions import PermissionDenied
 
+from .permission_snapshot import get_permission_snapshot
+
 
 def user_in_group(group_name):
     """Check if user belongs to a specific group"""
     def check_group(user):
-        return user.groups.filter(name=group_name).exists() if user.is_authenticated else False
+        return get_permission_snapshot(user).in_group(group_name) if user.is_authenticated else False
     return check_group
 
 
 def user_has_permission(permission_name):
     """Check if user has a specific permission"""
     def check_permission(user):
-        return user.has_perm(permission_name) if user.is_authenticated else False
+        return get_permission_snapshot(user).has_perm(permission_name) if user.is_authenticated else False
     return check_permission
 
 
@@ -31,7 +33,8 @@ def can_access_examenes(user):
         return False
     
     allowed_groups = ['Administrador', 'Medico', 'Medico_de_Junta', 'Enfermero', 'Tecnico']
-    return user.groups.filter(name__in=allowed_groups).exists() or user.has_perm('can_view_all_examenes')
+    snapshot = get_permission_snapshot(user)
+    return snapshot.in_group(*allowed_groups) or snapshot.has_perm('can_view_all_examenes')
 
 
 def can_access_diagnosticos(user):
@@ -40,7 +43,8 @@ def can_access_diagnosticos(user):
         return False
     
     allowed_groups = ['Administrador', 'Medico', 'Medico_de_Junta', 'Enfermero', 'Tecnico']
-    return user.groups.filter(name__in=allowed_groups).exists() or user.has_perm('can_view_all_diagnosticos')
+    snapshot = get_permission_snapshot(user)
+    return snapshot.in_group(*allowed_groups) or snapshot.has_perm('can_view_all_diagnosticos')
 
 
 def can_access_cirugias(user):
@@ -50,7 +54,8 @@ def can_access_cirugias(user):
     
     # Solo Administrador, Medico y Medico_de_Junta pueden ver cirugias
     allowed_groups = ['Administrador', 'Medico', 'Medico_de_Junta']
-    return user.groups.filter(name__in=allowed_groups).exists() or user.has_perm('can_view_all_cirugias')
+    snapshot = get_permission_snapshot(user)
+    return snapshot.in_group(*allowed_groups) or snapshot.has_perm('can_view_all_cirugias')
 
 
 def can_access_consultas(user):
@@ -60,7 +65,8 @@ def can_access_consultas(user):
     
     # Solo Administrador, Medico, Medico_de_Junta y Enfermero pueden ver consultas
     allowed_groups = ['Administrador', 'Medico', 'Medico_de_Junta', 'Enfermero']
-    return user.groups.filter(name__in=allowed_groups).exists() or user.has_perm('can_view_all_consultas')
+    snapshot = get_permission_snapshot(user)
+    return snapshot.in_group(*allowed_groups) or snapshot.has_perm('can_view_all_consultas')
 
 
 def can_add_examenes(user):
@@ -69,7 +75,8 @@ def can_add_examenes(user):
         return False
     
     allowed_groups = ['Administrador', 'Medico', 'Medico_de_Junta', 'Enfermero', 'Tecnico']
-    return user.groups.filter(name__in=allowed_groups).exists() or user.has_perm('can_add_examenes')
+    snapshot = get_permission_snapshot(user)
+    return snapshot.in_group(*allowed_groups) or snapshot.has_perm('can_add_examenes')
 
 
 def can_add_diagnosticos(user):
@@ -78,7 +85,8 @@ def can_add_diagnosticos(user):
         return False
     
     allowed_groups = ['Administrador', 'Medico', 'Medico_de_Junta', 'Enfermero']
-    return user.groups.filter(name__in=allowed_groups).exists() or user.has_perm('can_add_diagnosticos')
+    snapshot = get_permission_snapshot(user)
+    return snapshot.in_group(*allowed_groups) or snapshot.has_perm('can_add_diagnosticos')
 
 
 def can_add_cirugias(user):
@@ -88,7 +96,8 @@ def can_add_cirugias(user):
     
     # Solo Administrador, Medico y Medico_de_Junta pueden agregar cirugias
     allowed_groups = ['Administrador', 'Medico', 'Medico_de_Junta']
-    return user.groups.filter(name__in=allowed_groups).exists() or user.has_perm('can_add_cirugias')
+    snapshot = get_permission_snapshot(user)
+    return snapshot.in_group(*allowed_groups) or snapshot.has_perm('can_add_cirugias')
 
 
 def can_add_consultas(user):
@@ -98,7 +107,8 @@ def can_add_consultas(user):
     
     # Solo Administrador, Medico, Medico_de_Junta y Enfermero pueden agregar consultas
     allowed_groups = ['Administrador', 'Medico', 'Medico_de_Junta', 'Enfermero']
-    return user.groups.filter(name__in=allowed_groups).exists() or user.has_perm('can_add_consultas')
+    snapshot = get_permission_snapshot(user)
+    return snapshot.in_group(*allowed_groups) or snapshot.has_perm('can_add_consultas')
 
 
 # Decoradores para vistas
@@ -222,7 +232,7 @@ def get_user_permissions_context(user):
             'is_tecnico': False,
         }
     
-    user_groups = list(user.groups.values_list('name', flat=True))
+    user_groups = sorted(get_permission_snapshot(user).groups)
     
     return {
         'can_access_examenes': can_access_examenes(user),
@@ -0,0 +1,78 @@
+"""
+Signal handlers that keep the patient dossier cache, the critical-info
+projection and the permission snapshots coherent with local data.
+"""
+
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from consultas.models import ConsultaMedica, Prescripcion
+from pacientes2.logic.informacion_critica_logic import actualizar_prescripciones, actualizar_secciones_locales
+from pacientes2.models import Paciente2
+
+from .dossier_cache import dossier_cache
+from .permission_snapshot import bump_global_version, bump_user_version
+
+
+@receiver([post_save, post_delete], sender=Paciente2)
+def invalidate_paciente_dossier(sender, instance, **kwargs):
+    """Patient data is embedded in most sections, so drop the whole dossier"""
+    dossier_cache.invalidate(instance.pk)
+
+
+@receiver(post_save, sender=Paciente2)
+def update_paciente_informacion_critica(sender, instance, created, **kwargs):
+    actualizar_secciones_locales(instance.pk, nuevo=created)
+
+
+@receiver([post_save, post_delete], sender=ConsultaMedica)
+def invalidate_consulta_dossier(sender, instance, **kwargs):
+    dossier_cache.invalidate(instance.paciente_id, ['consultas', 'api_consultas', 'api_prescripciones'])
+    actualizar_prescripciones(instance.paciente_id)
+
+
+@receiver([post_save, post_delete], sender=Prescripcion)
+def invalidate_prescripcion_dossier(sender, instance, **kwargs):
+    paciente_id = ConsultaMedica.objects.filter(
+        pk=instance.consulta_id
+    ).values_list('paciente_id', flat=True).first()
+    if paciente_id is not None:
+        dossier_cache.invalidate(paciente_id, ['consultas', 'api_prescripciones'])
+        actualizar_prescripciones(paciente_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+def invalidate_user_permission_snapshot(sender, instance, action, reverse, pk_set, **kwargs):
+    """Membership or direct permissions changed; reverse means instance is a Group/Permission"""
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_user_version(instance.pk)
+    elif action == 'post_clear':
+        bump_global_version()
+    else:
+        for user_id in pk_set or ():
+            bump_user_version(user_id)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_permission_snapshots(sender, action, **kwargs):
+    if action.startswith('post_'):
+        bump_global_version()
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_flags_snapshot(sender, instance, created, **kwargs):
+    """is_active, is_staff and is_superuser are part of the snapshot"""
+    if created or kwargs.get('update_fields') == frozenset({'last_login'}):
+        return
+    bump_user_version(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Group)
+def invalidate_group_snapshots(sender, created=False, **kwargs):
+    # Renaming or deleting a group changes the group names of its members
+    if not created:
+        bump_global_version()
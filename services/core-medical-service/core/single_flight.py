@@ -0,0 +1,112 @@
+"""
+Single-flight coalescing for identical downstream reads.
+
+Concurrent calls with the same key inside a worker wait for one leader
+call and share its result. When a shared Django cache alias is given,
+leaders in different workers also coordinate: one takes a short lock in
+the cache, publishes its result there, and the others pick it up instead
+of calling the service again.
+
+Callers share one response, so a key must identify the credentials the
+call is made with as well as what it reads; credential_key gives that part.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Mapping, Optional
+
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def credential_key(headers: Optional[Mapping[str, str]]) -> str:
+    """
+    Digest of the Authorization header, so calls made with different
+    tokens are never coalesced. Empty when there is none.
+    """
+    authorization = (headers or {}).get('Authorization')
+    if not authorization:
+        return ''
+    return hashlib.sha256(authorization.encode()).hexdigest()[:32]
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent identical calls into one in-flight execution"""
+
+    def __init__(self, shared_cache: Optional[str] = None, lock_timeout: float = 10,
+                 result_ttl: float = 1, poll_interval: float = 0.02):
+        self.shared_cache = shared_cache
+        self.lock_timeout = lock_timeout
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {'leaders': 0, 'followers': 0, 'shared_followers': 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Run fn once for all concurrent callers of key and return its result"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats['leaders'] += 1
+            else:
+                self.stats['followers'] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run_shared(key, fn) if self.shared_cache else fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def _run_shared(self, key: str, fn: Callable[[], Any]) -> Any:
+        """Coordinate with leaders in other workers through the shared cache"""
+        cache = caches[self.shared_cache]
+        lock_key = f"single_flight:lock:{key}"
+        result_key = f"single_flight:result:{key}"
+
+        if cache.add(lock_key, 1, self.lock_timeout):
+            try:
+                result = fn()
+                cache.set(result_key, result, self.result_ttl)
+                return result
+            finally:
+                cache.delete(lock_key)
+
+        # Another worker is fetching: wait for its published result
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            result = cache.get(result_key, _MISSING)
+            if result is not _MISSING:
+                with self._lock:
+                    self.stats['shared_followers'] += 1
+                return result
+            if cache.get(lock_key) is None:
+                break
+            time.sleep(self.poll_interval)
+        result = cache.get(result_key, _MISSING)
+        return fn() if result is _MISSING else result
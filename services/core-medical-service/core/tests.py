@@ -0,0 +1,355 @@
+import asyncio
+import io
+import threading
+import time
+from contextlib import redirect_stdout
+from unittest import mock
+
+import jwt
+from django.contrib.auth import BACKEND_SESSION_KEY
+from django.contrib.auth.models import AnonymousUser, Group, Permission, User
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from pacientes2.models import Paciente2
+
+from .http_pool import AsyncHTTPPool
+from .management.commands.benchmark_login_middleware import legacy_process_request
+from .middleware import LoginRequiredMiddleware, compile_exempt_matcher
+from .authentication import SERVICE_NAME, service_tokens
+from .dossier_cache import DossierCache, dossier_cache
+from .http_pool import http_pool
+from .microservice_client import microservice_client
+from .permission_snapshot import SNAPSHOT_BACKEND, get_permission_snapshot
+from .single_flight import SingleFlight
+
+
+def permission_queries(queries):
+    """Queries that read groups or permissions"""
+    return [q['sql'] for q in queries if 'auth_permission' in q['sql'] or 'auth_group' in q['sql']]
+
+
+class PermissionSnapshotTests(TestCase):
+    """Permission checks cost one query per request, granted or denied"""
+
+    def setUp(self):
+        self.medico = Group.objects.create(name='Medico')
+        self.medico.permissions.add(Permission.objects.get(codename='view_paciente2'))
+        self.user = User.objects.create_user('ana', password='secreta')
+        self.user.groups.add(self.medico)
+        self.user.user_permissions.add(Permission.objects.get(codename='add_paciente2'))
+
+    def test_snapshot_loads_groups_and_permissions_in_one_query(self):
+        user = User.objects.get(pk=self.user.pk)
+
+        with self.assertNumQueries(1):
+            snapshot = get_permission_snapshot(user)
+
+        self.assertEqual(snapshot.groups, {'Medico'})
+        self.assertEqual(snapshot.perms, {'pacientes2.view_paciente2', 'pacientes2.add_paciente2'})
+        with self.assertNumQueries(0):
+            self.assertTrue(snapshot.in_group('Medico', 'Tecnico'))
+            self.assertFalse(snapshot.in_group('Tecnico'))
+            self.assertTrue(user.has_perm('pacientes2.view_paciente2'))
+            self.assertTrue(user.has_perm('pacientes2.add_paciente2'))
+            self.assertFalse(user.has_perm('pacientes2.delete_paciente2'))
+
+    def test_denied_checks_do_not_fall_through_to_model_backend(self):
+        user = User.objects.get(pk=self.user.pk)
+
+        with self.assertNumQueries(1):
+            self.assertFalse(user.has_perm('pacientes2.delete_paciente2'))
+            self.assertFalse(user.has_perms(['pacientes2.change_paciente2', 'consultas.view_consultamedica']))
+            self.assertFalse(user.has_module_perms('consultas'))
+
+    def test_forbidden_request_makes_one_permission_query(self):
+        tecnico = User.objects.create_user('luis')
+        self.client.force_login(tecnico)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('informacionCritica', args=[1]))
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(len(permission_queries(queries)), 1)
+
+    def test_sessions_created_with_model_backend_stay_logged_in(self):
+        self.client.force_login(User.objects.create_user('luis'),
+                                backend='django.contrib.auth.backends.ModelBackend')
+
+        response = self.client.get(reverse('informacionCritica', args=[1]))
+
+        # Resolved as the logged-in user (403), not redirected to the login page
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], SNAPSHOT_BACKEND)
+
+
+class CoalescingTests(TestCase):
+    """Identical reads share one downstream call only when made with the same token"""
+
+    URL = 'http://diagnosis-service:8080/api/diagnosticos2/'
+
+    def test_single_flight_keeps_callers_with_different_tokens_apart(self):
+        single_flight = SingleFlight()
+        release = threading.Event()
+        sent = []
+
+        def send(method, url, **kwargs):
+            sent.append(kwargs['headers']['Authorization'])
+            release.wait(5)
+            return {'as': kwargs['headers']['Authorization']}
+
+        results = {}
+
+        def read(name, token):
+            results[name] = microservice_client._make_request(
+                'GET', self.URL, params={'paciente_id': 1}, headers={'Authorization': token}
+            )
+
+        callers = [threading.Thread(target=read, args=(name, token))
+                   for name, token in [('a1', 'Bearer a'), ('a2', 'Bearer a'), ('b1', 'Bearer b'), ('b2', 'Bearer b')]]
+        with mock.patch.object(microservice_client, 'single_flight', single_flight), \
+                mock.patch.object(microservice_client, '_send_request', side_effect=send):
+            for caller in callers:
+                caller.start()
+            deadline = time.monotonic() + 5
+            while single_flight.stats['followers'] < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            release.set()
+            for caller in callers:
+                caller.join()
+
+        self.assertEqual(sorted(sent), ['Bearer a', 'Bearer b'])
+        self.assertEqual(results, {
+            'a1': {'as': 'Bearer a'}, 'a2': {'as': 'Bearer a'},
+            'b1': {'as': 'Bearer b'}, 'b2': {'as': 'Bearer b'},
+        })
+
+    def test_async_pool_keeps_callers_with_different_tokens_apart(self):
+        pool = AsyncHTTPPool()
+        sent = []
+
+        async def get_json(url, params, headers, timeout):
+            sent.append(headers['Authorization'])
+            await asyncio.sleep(0.01)
+            return {'as': headers['Authorization']}
+
+        async def read_all():
+            return await asyncio.gather(*(
+                pool.get_json(self.URL, params={'paciente_id': 1}, headers={'Authorization': token})
+                for token in ['Bearer a', 'Bearer a', 'Bearer b', 'Bearer b']
+            ))
+
+        with mock.patch.object(pool, '_get_json', side_effect=get_json):
+            results = asyncio.run(read_all())
+
+        self.assertEqual(sorted(sent), ['Bearer a', 'Bearer b'])
+        self.assertEqual([r['as'] for r in results], ['Bearer a', 'Bearer a', 'Bearer b', 'Bearer b'])
+        self.assertEqual(pool.stats['coalesced'], 2)
+
+
+def claims(headers):
+    """Payload of the bearer token in headers, unverified"""
+    scheme, token = headers['Authorization'].split(' ')
+    assert scheme == 'Bearer'
+    return jwt.decode(token, options={'verify_signature': False})
+
+
+class ServiceTokenTests(TestCase):
+    """Every downstream call carries a token, for the signed-in user or for core itself"""
+
+    def test_clinical_history_fan_out_acts_for_the_signed_in_user(self):
+        user = User.objects.create_user('ana')
+        paciente = Paciente2.objects.create(
+            nombre='Ana', edad=30, fecha_nacimiento='1994-01-01', genero='otro',
+            direccion='Calle 1', telefono='3000000000', tipo_sangre='o+',
+        )
+        client = APIClient()
+        client.force_login(user)
+
+        with mock.patch.object(http_pool, 'fetch_all', return_value=({}, [])) as fetch_all:
+            response = client.get(reverse('historia-clinica', args=[paciente.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        calls = fetch_all.call_args.args[0]
+        self.assertEqual(set(calls), {'examenes', 'diagnosticos', 'cirugias'})
+        for call in calls.values():
+            self.assertEqual(claims(call['headers'])['user_id'], user.pk)
+            self.assertEqual(claims(call['headers'])['service'], SERVICE_NAME)
+
+    def test_calls_without_a_request_authenticate_as_core(self):
+        response = mock.Mock(status_code=200, headers={})
+        response.json.return_value = {'results': []}
+
+        with mock.patch.object(microservice_client.session, 'request', return_value=response) as request:
+            microservice_client._send_request('GET', f"{microservice_client._service_urls()['diagnosis']}/x/")
+
+        token = claims(request.call_args.kwargs['headers'])
+        self.assertEqual(token['service'], SERVICE_NAME)
+        self.assertNotIn('user_id', token)
+
+    def test_a_forwarded_token_is_kept(self):
+        response = mock.Mock(status_code=200, headers={})
+        response.json.return_value = {}
+
+        with mock.patch.object(microservice_client.session, 'request', return_value=response) as request:
+            microservice_client._send_request(
+                'POST', f"{microservice_client._service_urls()['surgery']}/x/",
+                headers={'Authorization': 'Bearer forwarded'}, json={},
+            )
+
+        self.assertEqual(request.call_args.kwargs['headers']['Authorization'], 'Bearer forwarded')
+
+
+class LoginRequiredMiddlewareTests(TestCase):
+    """The compiled matcher exempts the same paths as the original scan"""
+
+    def test_matcher_kinds(self):
+        matcher = compile_exempt_matcher(['/health/ready'], ['/admin/'], [r'.*login'])
+
+        self.assertTrue(matcher.match('/health/ready'))
+        self.assertFalse(matcher.match('/health/ready/'))
+        self.assertFalse(matcher.match('/x/health/ready'))
+        self.assertTrue(matcher.match('/admin/'))
+        self.assertTrue(matcher.match('/admin/pacientes2/paciente2/'))
+        self.assertFalse(matcher.match('/x/admin/'))
+        self.assertTrue(matcher.match('/health/auth/login/'))
+        self.assertFalse(matcher.match('/pacientes2/'))
+
+    def test_matcher_escapes_paths_and_prefixes(self):
+        matcher = compile_exempt_matcher(['/a.b/'], ['/c+d/'])
+
+        self.assertTrue(matcher.match('/a.b/'))
+        self.assertFalse(matcher.match('/axb/'))
+        self.assertTrue(matcher.match('/c+d/e/'))
+        self.assertFalse(matcher.match('/ccd/e/'))
+
+    def test_no_exemptions(self):
+        self.assertIsNone(compile_exempt_matcher([], []))
+
+    def test_same_decisions_as_the_original_middleware(self):
+        middleware = LoginRequiredMiddleware(lambda request: None)
+        factory = RequestFactory()
+        paths = [
+            '/', '/pacientes2/', '/paciente2/1/informacionCritica', '/consultas/',
+            '/accounts/login/', '/accounts/logout/', '/accounts/password_reset/', '/accounts/password_reset/done/',
+            '/accounts/reset/MQ/set-password/', '/admin/', '/admin/login/', '/admin/auth/user/',
+            '/health/ready', '/health/ready/', '/health/live', '/health/auth/login/', '/health/auth/validate/',
+            '/auth/login/', '/auth/validate/', '/auth/refresh/', '/api/', '/api/consultations/',
+            '/health/api/dossier-cache/metrics/', '/health/api/setup-permissions/', '/reportes/loginattempts',
+        ]
+        for path in paths:
+            with self.subTest(path=path):
+                request = factory.get(path)
+                request.user = AnonymousUser()
+                with redirect_stdout(io.StringIO()):
+                    legacy = legacy_process_request(request)
+                self.assertEqual(middleware.process_request(request) is None, legacy is None)
+
+    def test_anonymous_requests_are_redirected_to_login(self):
+        response = self.client.get('/consultas/')
+
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith('/accounts/login/?next=/consultas/'))
+
+    def test_service_endpoints_are_exempt_but_still_authenticated(self):
+        client = APIClient()
+        for method, path in [('post', '/api/patients/bulk_basic/'), ('get', '/api/patients/events/')]:
+            with self.subTest(path=path):
+                response = getattr(client, method)(path, {})
+                # Rejected by DRF, not redirected to the login page
+                self.assertIn(response.status_code, (401, 403))
+
+    def test_other_patient_api_paths_still_require_login(self):
+        for path in ['/api/patients/', '/api/patients/1/basic_info/']:
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(path).status_code, 302)
+
+
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'default'},
+    'dossier': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dossier'},
+}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class DossierCacheTests(TestCase):
+    """An invalidation in one worker reaches every worker's local tier"""
+
+    def worker(self, **config):
+        with override_settings(DOSSIER_CACHE={'shared_cache': 'dossier', 'local_ttl': 5, **config}):
+            return DossierCache()
+
+    def test_read_through_loads_once(self):
+        cache = self.worker()
+        loader = mock.Mock(return_value=['consulta'])
+
+        self.assertEqual(cache.get_or_load(1, 'consultas', loader), ['consulta'])
+        self.assertEqual(cache.get_or_load(1, 'consultas', loader), ['consulta'])
+        loader.assert_called_once()
+
+    def test_invalidation_reaches_other_workers(self):
+        primero, segundo = self.worker(), self.worker()
+        segundo.get_or_load(1, 'examenes', lambda: ['viejo'])
+        segundo.get_or_load(2, 'examenes', lambda: ['otro paciente'])
+
+        primero.invalidate(1, ['examenes'])
+
+        self.assertEqual(segundo.get_or_load(1, 'examenes', lambda: ['nuevo']), ['nuevo'])
+        self.assertEqual(segundo.get_or_load(2, 'examenes', lambda: ['recargado']), ['otro paciente'])
+
+    def test_a_load_racing_an_invalidation_is_not_served(self):
+        cache = self.worker()
+        generation = cache.generation(1)
+
+        cache.invalidate(1)
+        cache.set(1, 'cirugias', ['leído antes de invalidar'], generation)
+
+        self.assertEqual(cache.get_many(1, ['cirugias']), {})
+
+    def test_without_a_shared_tier_local_entries_expire_after_local_ttl(self):
+        with override_settings(DOSSIER_CACHE={'shared_cache': None, 'local_ttl': 5}):
+            cache = DossierCache()
+        with mock.patch('core.dossier_cache.time.monotonic', return_value=1000):
+            cache.set(1, 'paciente', {'nombre': 'Ana'})
+        with mock.patch('core.dossier_cache.time.monotonic', return_value=1004):
+            self.assertEqual(cache.get_many(1, ['paciente']), {'paciente': {'nombre': 'Ana'}})
+        with mock.patch('core.dossier_cache.time.monotonic', return_value=1006):
+            self.assertEqual(cache.get_many(1, ['paciente']), {})
+
+
+class DossierInvalidationEndpointTests(TestCase):
+    """Downstream services invalidate with core's token and no session"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {service_tokens.get()}")
+        patcher = mock.patch('core.api_views.actualizar_secciones_remotas')
+        self.refrescar = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def invalidate(self, sections=None, client=None):
+        return (client or self.client).post(
+            reverse('dossier-invalidate', args=[7]), {'sections': sections} if sections else {}, format='json'
+        )
+
+    def test_named_sections_are_invalidated_and_refreshed(self):
+        with mock.patch.object(dossier_cache, 'invalidate') as invalidate:
+            response = self.invalidate(['diagnosticos'])
+
+        self.assertEqual(response.status_code, 200)
+        invalidate.assert_called_once_with(7, ['diagnosticos', 'api_diagnosticos'])
+        self.assertEqual(self.refrescar.call_args.args[0], 7)
+        self.assertEqual(self.refrescar.call_args.args[2], ['diagnosticos'])
+
+    def test_unknown_sections_are_rejected(self):
+        self.assertEqual(self.invalidate(['consultas']).status_code, 400)
+        self.refrescar.assert_not_called()
+
+    def test_anonymous_calls_are_rejected_not_redirected(self):
+        self.assertIn(self.invalidate(['examenes'], client=APIClient()).status_code, (401, 403))
+
+    def test_other_patient_routes_under_health_still_require_login(self):
+        self.assertEqual(APIClient().get(reverse('historia-clinica', args=[7])).status_code, 302)
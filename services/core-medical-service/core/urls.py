@@ -24,6 +24,8 @@ urlpatterns = [
     path('api/', include(router.urls)),
     path('api/patient/<int:paciente_id>/basic/', api_views.get_patient_basic_info, name='patient-basic'),
     path('api/patient/<int:paciente_id>/historia-clinica/', api_views.get_historia_clinica_completa, name='historia-clinica'),
+    path('api/patient/<int:paciente_id>/dossier/invalidate/', api_views.invalidate_patient_dossier, name='dossier-invalidate'),
+    path('api/dossier-cache/metrics/', api_views.dossier_cache_metrics, name='dossier-cache-metrics'),
     
     # Permissions setup endpoints
     path('api/setup-permissions/', permissions_api.setup_permissions_endpoint, name='setup-permissions'),
@@ -6,6 +6,7 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
 from django.contrib import messages
 from .forms import UserCreateForm
+from .permission_snapshot import get_permission_snapshot
 
 # --- CORREGIDO: Usar doble guion bajo para _name_ ---
 logger = logging.getLogger(__name__)
@@ -40,7 +41,7 @@ def liveness_check(request):
 
 def is_admin(user):
     """Check if the user is an admin (has staff status or is in admin group)"""
-    return user.is_staff or user.is_superuser or user.groups.filter(name='admin').exists()
+    return user.is_staff or user.is_superuser or get_permission_snapshot(user).in_group('admin')
 
 @login_required
 @user_passes_test(is_admin)
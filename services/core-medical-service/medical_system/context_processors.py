@@ -1,7 +1,13 @@
 # medical_system/context_processors.py
 
+from core.permission_snapshot import get_permission_snapshot
+
+
 def permisos_usuario(request):
-    grupos_restringidos = ['Tecnico', 'Enfermero']
-    tiene_permiso_extra = not request.user.groups.filter(name__in=grupos_restringidos).exists() if request.user.is_authenticated else False
-    tiene_permiso_unico = not request.user.groups.filter(name__in=["Tecnico"]).exists() if request.user.is_authenticated else False
-    return {'tiene_permiso_extra': tiene_permiso_extra, 'tiene_permiso_unico': tiene_permiso_unico }
+    if not request.user.is_authenticated:
+        return {'tiene_permiso_extra': False, 'tiene_permiso_unico': False, 'es_admin': False}
+    permisos = get_permission_snapshot(request.user)
+    tiene_permiso_extra = not permisos.in_group('Tecnico', 'Enfermero')
+    tiene_permiso_unico = not permisos.in_group('Tecnico')
+    es_admin = permisos.is_staff or permisos.is_superuser or permisos.in_group('admin')
+    return {'tiene_permiso_extra': tiene_permiso_extra, 'tiene_permiso_unico': tiene_permiso_unico, 'es_admin': es_admin }
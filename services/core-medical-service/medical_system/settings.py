@@ -58,6 +58,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.permission_snapshot.PermissionSnapshotMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'core.middleware.LoginRequiredMiddleware',
@@ -152,6 +153,110 @@ EXAMS_SERVICE_URL = os.getenv('EXAMS_SERVICE_URL', 'http://localhost:8001')
 DIAGNOSIS_SERVICE_URL = os.getenv('DIAGNOSIS_SERVICE_URL', 'http://localhost:8002')
 SURGERY_SERVICE_URL = os.getenv('SURGERY_SERVICE_URL', 'http://localhost:8003')
 
+# Cross-service fan-out: overall deadline and per-service budgets (seconds)
+MICROSERVICE_FANOUT_DEADLINE = float(os.getenv('MICROSERVICE_FANOUT_DEADLINE', '3.0'))
+MICROSERVICE_SERVICE_BUDGETS = {
+    'exams': float(os.getenv('EXAMS_SERVICE_BUDGET', '2.5')),
+    'diagnosis': float(os.getenv('DIAGNOSIS_SERVICE_BUDGET', '2.5')),
+    'surgery': float(os.getenv('SURGERY_SERVICE_BUDGET', '2.5')),
+}
+
+# Keep-alive connection pools to the other microservices (one per service, per worker)
+MICROSERVICE_HTTP_POOL = {
+    'limit': int(os.getenv('MICROSERVICE_POOL_LIMIT', '100')),
+    'limit_per_host': int(os.getenv('MICROSERVICE_POOL_LIMIT_PER_HOST', '20')),
+    'dns_cache_ttl': int(os.getenv('MICROSERVICE_POOL_DNS_TTL', '300')),
+    'keepalive_timeout': int(os.getenv('MICROSERVICE_POOL_KEEPALIVE', '30')),
+}
+
+# Circuit breakers per service and a retry budget per service.
+# No CACHES backend is shared by default, so the budget is per worker (a warning is
+# logged at startup). Point 'shared_cache' at a CACHES alias backed by Redis/Memcached
+# so all workers draw from one budget.
+MICROSERVICE_RESILIENCE = {
+    'max_retries': int(os.getenv('MICROSERVICE_MAX_RETRIES', '3')),
+    'backoff_factor': float(os.getenv('MICROSERVICE_BACKOFF_FACTOR', '0.5')),
+    'shared_cache': os.getenv('MICROSERVICE_RESILIENCE_CACHE') or None,
+    'circuit_breaker': {
+        'failure_rate_threshold': float(os.getenv('CIRCUIT_FAILURE_RATE', '0.5')),
+        'window_seconds': int(os.getenv('CIRCUIT_WINDOW_SECONDS', '30')),
+        'minimum_calls': int(os.getenv('CIRCUIT_MINIMUM_CALLS', '5')),
+        'open_seconds': int(os.getenv('CIRCUIT_OPEN_SECONDS', '15')),
+    },
+    'retry_budget': {
+        'ratio': float(os.getenv('RETRY_BUDGET_RATIO', '0.2')),
+        'min_retries': int(os.getenv('RETRY_BUDGET_MIN_RETRIES', '3')),
+        'window_seconds': int(os.getenv('RETRY_BUDGET_WINDOW_SECONDS', '10')),
+    },
+}
+
+# Coalesce identical concurrent GETs; a shared CACHES alias extends this across workers
+MICROSERVICE_SINGLE_FLIGHT = {
+    'enabled': os.getenv('MICROSERVICE_SINGLE_FLIGHT', 'True').lower() == 'true',
+    'shared_cache': os.getenv('MICROSERVICE_SINGLE_FLIGHT_CACHE') or None,
+    'result_ttl': float(os.getenv('MICROSERVICE_SINGLE_FLIGHT_TTL', '1')),
+}
+
+# Permission checks read a per-session snapshot of groups and permissions.
+# Snapshots are only reused across requests when 'cache_alias' names a shared
+# CACHES alias (not LocMem), so version bumps reach every worker; otherwise
+# each request loads its own. ModelBackend is not listed, since it would run
+# its own queries for every permission the snapshot denies; sessions created
+# with it are remapped by PermissionSnapshotMiddleware.
+AUTHENTICATION_BACKENDS = [
+    'core.permission_snapshot.SnapshotModelBackend',
+]
+PERMISSION_SNAPSHOT = {
+    'cache_alias': os.getenv('PERMISSION_SNAPSHOT_CACHE') or None,
+    'max_age': int(os.getenv('PERMISSION_SNAPSHOT_MAX_AGE', '300')),
+}
+
+# Client-side HTTP cache for downstream GETs, revalidated with ETag/Last-Modified.
+# Point 'cache_alias' at a shared CACHES alias so workers revalidate each other's entries.
+MICROSERVICE_HTTP_CACHE = {
+    'enabled': os.getenv('MICROSERVICE_HTTP_CACHE', 'True').lower() == 'true',
+    'cache_alias': os.getenv('MICROSERVICE_HTTP_CACHE_ALIAS', 'default'),
+    'ttl': int(os.getenv('MICROSERVICE_HTTP_CACHE_TTL', '600')),
+}
+
+# Background health prober for the other microservices
+HEALTH_PROBER = {
+    'interval': int(os.getenv('HEALTH_PROBE_INTERVAL', '15')),
+    'history_size': int(os.getenv('HEALTH_PROBE_HISTORY', '240')),
+    'shared_cache': os.getenv('HEALTH_PROBER_CACHE') or None,
+}
+
+# Patient change outbox (GET /api/patients/events/). Outbox writers are
+# serialized until commit, so events become visible in id order; the commit
+# window only holds back very recent events as a margin for writes made
+# without that lock.
+PATIENT_OUTBOX = {
+    'commit_window_seconds': int(os.getenv('PATIENT_OUTBOX_COMMIT_WINDOW', '2')),
+}
+
+# Critical-info projection: reads serve it as stored and flag it once older than max_age_seconds;
+# refresh_critical_info --pending-only --stale refreshes it in the background
+CRITICAL_INFO = {
+    'max_age_seconds': int(os.getenv('CRITICAL_INFO_MAX_AGE', '300')),
+}
+
+# Patient dossier cache: local LRU tier plus optional shared tier (a CACHES alias)
+DOSSIER_CACHE = {
+    'local_max_entries': int(os.getenv('DOSSIER_CACHE_MAX_ENTRIES', '1024')),
+    'shared_cache': os.getenv('DOSSIER_SHARED_CACHE') or None,
+    # Local entries live at most this long when there is no shared tier to broadcast invalidations
+    'local_ttl': int(os.getenv('DOSSIER_CACHE_LOCAL_TTL', '5')),
+    'default_ttl': 60,
+    'ttl': {
+        'paciente': 600,
+        'consultas': 300,
+        'prescripciones': 300,
+        'examenes': 120,
+        'diagnosticos': 120,
+        'cirugias': 300,
+    },
+}
+
 
 STORAGES = {
     # ...
@@ -218,6 +323,36 @@ LOGIN_URL = 'login' # This should match the URL name from django.contrib.auth.ur
 # Where to redirect after logout
 LOGOUT_REDIRECT_URL = '/'  # Redirect to home page after logout
 
+# Paths LoginRequiredMiddleware lets through without a session, compiled into
+# one matcher at startup. Anonymous redirects are logged at DEBUG, sampled.
+# Exempt API endpoints must authenticate callers themselves (DRF + JWT).
+LOGIN_REQUIRED = {
+    'login_url': '/accounts/login/',
+    'exempt_paths': [
+        '/accounts/login/',       # The login page itself
+        '/admin/login/',
+        '/health/ready',          # Health check endpoints
+        '/health/live',
+        '/auth/login/',           # JWT endpoints
+        '/auth/validate/',
+        '/auth/refresh/',
+        '/api/',
+        '/api/patients/events/',  # Patient change feed for the other services (DRF + JWT)
+        '/api/patients/bulk_basic/',  # Batched patient lookups from the other services (DRF + JWT)
+    ],
+    'exempt_prefixes': [
+        '/accounts/password_reset/',
+        '/accounts/reset/',
+        '/admin/',
+    ],
+    # Regexes matched from the start of the path
+    'exempt_patterns': [
+        r'.*login',               # Anything login related, e.g. /health/auth/login/
+        r'/health/api/patient/\d+/dossier/invalidate/\Z',  # From the other services (DRF + JWT)
+    ],
+    'log_sample_rate': float(os.getenv('LOGIN_REQUIRED_LOG_SAMPLE_RATE', '0.01')),
+}
+
 # URLs that do not require login
 LOGIN_EXEMPT_URLS = [
     reverse_lazy('login'),
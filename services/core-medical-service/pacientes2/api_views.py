@@ -1,10 +1,19 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from .models import Paciente2
+from .models import EventoPaciente, Paciente2
 from .serializers import Paciente2Serializer, Paciente2BasicSerializer
 
+# Máximo de pacientes por consulta en lote
+BATCH_MAX_PATIENTS = 500
+# Máximo de eventos por página del feed de cambios
+EVENTS_MAX_LIMIT = 1000
+
 class Paciente2APIViewSet(viewsets.ModelViewSet):
     queryset = Paciente2.objects.all()
     serializer_class = Paciente2Serializer
@@ -54,3 +63,51 @@ class Paciente2APIViewSet(viewsets.ModelViewSet):
             'existing_ids': existing_ids,
             'non_existing_ids': [pid for pid in patient_ids if pid not in existing_ids]
         })
+
+    @action(detail=False, methods=['post'])
+    def bulk_basic(self, request):
+        """Endpoint para obtener información básica de varios pacientes en una sola consulta"""
+        patient_ids = request.data.get('patient_ids') if isinstance(request.data, dict) else None
+        try:
+            patient_ids = [int(pid) for pid in patient_ids] if isinstance(patient_ids, list) else None
+        except (TypeError, ValueError):
+            patient_ids = None
+        if patient_ids is None or len(patient_ids) > BATCH_MAX_PATIENTS:
+            return Response(
+                {'error': f'patient_ids debe ser una lista de máximo {BATCH_MAX_PATIENTS} IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        pacientes = Paciente2.objects.filter(id__in=patient_ids)
+        return Response({
+            'results': {str(p['id']): p for p in Paciente2BasicSerializer(pacientes, many=True).data}
+        })
+
+    @action(detail=False, methods=['get'])
+    def events(self, request):
+        """
+        Feed de cambios de pacientes (outbox) a partir de un id de evento, en orden.
+        Las escrituras del outbox se serializan (EventoPaciente.reservar_orden),
+        así que los eventos se hacen visibles en orden de id y el consumidor no
+        salta ninguno aunque una transacción tarde en confirmar. La ventana de
+        commit solo añade un margen para eventos escritos sin ese lock.
+        """
+        try:
+            after = int(request.query_params.get('after', 0))
+            limit = min(int(request.query_params.get('limit', EVENTS_MAX_LIMIT)), EVENTS_MAX_LIMIT)
+        except ValueError:
+            return Response(
+                {'error': 'after y limit deben ser enteros'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ventana = getattr(settings, 'PATIENT_OUTBOX', {}).get('commit_window_seconds', 2)
+        eventos = list(
+            EventoPaciente.objects.filter(id__gt=after, creado__lte=timezone.now() - timedelta(seconds=ventana))
+            .order_by('id')
+            .values('id', 'paciente_id', 'tipo', 'datos')[:max(limit, 1)]
+        )
+        return Response({
+            'results': eventos,
+            'last_id': eventos[-1]['id'] if eventos else after,
+        })
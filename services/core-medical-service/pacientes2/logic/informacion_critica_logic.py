@@ -0,0 +1,152 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Paciente2, InformacionCritica
+from core.microservice_client import microservice_client
+from core.dossier_cache import dossier_cache, REMOTE_SECTIONS
+from consultas.models import Prescripcion
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Sección remota -> campo de la proyección que la almacena
+SECCIONES_REMOTAS = {
+    "examenes": "examenes_anormales",
+    "diagnosticos": "tratamientos_activos",
+    "cirugias": "cirugias_recientes",
+}
+
+# Campos que se conservan de cada registro remoto
+CAMPOS_REMOTOS = {
+    "examenes": ("id", "nombre", "tipo_examen", "fecha_examen", "resultado"),
+    "diagnosticos": ("id", "nombre", "diagnostico", "fecha_inicio", "fecha_fin", "indicaciones"),
+    "cirugias": ("id", "nombre", "tipo", "fecha", "estado_postoperatorio"),
+}
+
+def _prescripciones_activas(paciente_id):
+    """
+    Prescripciones del paciente que no han terminado.
+    """
+    hoy = timezone.now().date()
+    return list(
+        Prescripcion.objects.filter(consulta__paciente_id=paciente_id)
+        .filter(Q(fecha_fin__isnull=True) | Q(fecha_fin__gte=hoy))
+        .order_by("-fecha_inicio")
+        .values("id", "medicamento", "dosis", "via_administracion", "frecuencia", "fecha_inicio", "fecha_fin")
+    )
+
+def actualizar_secciones_locales(paciente_id, nuevo=False):
+    """
+    Recalcula el tipo de sangre y las prescripciones activas desde la base
+    local. Una proyección recién creada marca las secciones remotas como
+    pendientes, salvo para un paciente nuevo, que aún no tiene registros.
+    Devuelve None si el paciente no existe.
+    """
+    tipo_sangre = Paciente2.objects.filter(pk=paciente_id).values_list("tipo_sangre", flat=True).first()
+    if tipo_sangre is None:
+        return None
+
+    proyeccion, _ = InformacionCritica.objects.get_or_create(
+        paciente_id=paciente_id,
+        defaults={"secciones_pendientes": [] if nuevo else list(SECCIONES_REMOTAS)},
+    )
+    proyeccion.tipo_sangre = dict(Paciente2.SANGRE).get(tipo_sangre, tipo_sangre)
+    proyeccion.prescripciones_activas = _prescripciones_activas(paciente_id)
+    proyeccion.save(update_fields=["tipo_sangre", "prescripciones_activas", "actualizado"])
+    return proyeccion
+
+def actualizar_prescripciones(paciente_id):
+    """
+    Recalcula las prescripciones activas de una proyección existente.
+    No crea proyecciones, para no interferir con el borrado en cascada
+    de un paciente.
+    """
+    InformacionCritica.objects.filter(paciente_id=paciente_id).update(
+        prescripciones_activas=_prescripciones_activas(paciente_id),
+        actualizado=timezone.now(),
+    )
+
+def actualizar_secciones_remotas(paciente_id, request=None, secciones=None):
+    """
+    Refresca desde los microservicios las secciones remotas indicadas.
+    Las secciones que no responden conservan su último valor y quedan
+    marcadas como pendientes.
+    """
+    proyeccion = InformacionCritica.objects.filter(paciente_id=paciente_id).first()
+    if proyeccion is None:
+        proyeccion = actualizar_secciones_locales(paciente_id)
+        if proyeccion is None:
+            return None
+
+    secciones = list(secciones or SECCIONES_REMOTAS)
+    registros = microservice_client.get_critical_records(paciente_id, request, sections=secciones)
+    pendientes = set(proyeccion.secciones_pendientes)
+    campos = ["secciones_pendientes", "actualizado"]
+    for seccion in secciones:
+        if seccion in registros["partial"]:
+            pendientes.add(seccion)
+            continue
+        campo = SECCIONES_REMOTAS[seccion]
+        setattr(proyeccion, campo, [
+            {clave: registro.get(clave) for clave in CAMPOS_REMOTOS[seccion]}
+            for registro in registros[seccion]
+        ])
+        pendientes.discard(seccion)
+        campos.append(campo)
+
+    proyeccion.secciones_pendientes = sorted(pendientes)
+    proyeccion.save(update_fields=campos)
+    return proyeccion
+
+def registrar_cambio_remoto(paciente_id, secciones, request=None):
+    """
+    Aplica un cambio en registros remotos: invalida el expediente en caché
+    y refresca las secciones afectadas de la proyección.
+    """
+    dossier_cache.invalidate(paciente_id, [seccion for nombre in secciones for seccion in REMOTE_SECTIONS[nombre]])
+    actualizar_secciones_remotas(paciente_id, request, secciones)
+
+def limite_antiguedad():
+    """
+    Instante antes del cual una proyección se considera desactualizada,
+    según CRITICAL_INFO['max_age_seconds'].
+    """
+    max_age = getattr(settings, 'CRITICAL_INFO', {}).get('max_age_seconds', 300)
+    return timezone.now() - timedelta(seconds=max_age)
+
+def get_informacion_critica(paciente_id, request=None):
+    """
+    Obtiene la información crítica de un paciente desde su proyección local,
+    con una única consulta a la base local. Las secciones pendientes o
+    antiguas no se refrescan aquí, sino en refresh_critical_info: la
+    respuesta las señala con secciones_pendientes y desactualizada. Solo si
+    el paciente aún no tiene proyección se construye antes de responder.
+    """
+    proyeccion = InformacionCritica.objects.select_related("paciente").filter(paciente_id=paciente_id).first()
+    if proyeccion is None:
+        if actualizar_secciones_remotas(paciente_id, request) is None:
+            return None
+        proyeccion = InformacionCritica.objects.select_related("paciente").get(paciente_id=paciente_id)
+
+    # Las fechas se guardan en ISO, así que se comparan como texto
+    hoy = timezone.now().date().isoformat()
+    return {
+        "paciente": proyeccion.paciente,
+        "tipo_sangre": proyeccion.tipo_sangre,
+        "tratamientos_activos": [
+            tratamiento for tratamiento in proyeccion.tratamientos_activos
+            if (tratamiento.get("fecha_inicio") or "") <= hoy <= (tratamiento.get("fecha_fin") or hoy)
+        ],
+        "cirugias_recientes": proyeccion.cirugias_recientes,
+        "examenes_anormales": proyeccion.examenes_anormales,
+        "prescripciones_activas": [
+            prescripcion for prescripcion in proyeccion.prescripciones_activas
+            if not prescripcion.get("fecha_fin") or prescripcion["fecha_fin"] >= hoy
+        ],
+        "secciones_pendientes": proyeccion.secciones_pendientes,
+        "actualizado": proyeccion.actualizado,
+        "desactualizada": proyeccion.actualizado < limite_antiguedad(),
+    }
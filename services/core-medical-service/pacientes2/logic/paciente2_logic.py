@@ -1,5 +1,6 @@
 from ..models import Paciente2
 from core.microservice_client import microservice_client
+from core.dossier_cache import dossier_cache
 from consultas.models import ConsultaMedica
 import logging
 
@@ -12,6 +13,27 @@ def get_pacientes2():
     queryset = Paciente2.objects.all()
     return (queryset)
 
+def get_resumen_pacientes(pacientes, request=None, incluir_cirugias=True):
+    """
+    Cuenta exámenes, diagnósticos y cirugías de varios pacientes con un
+    conteo agrupado por microservicio, pedidos en paralelo. Un conteo es
+    None si el servicio falló.
+    """
+    ids = [paciente.id for paciente in pacientes]
+    if not ids:
+        return {}
+
+    secciones = ["examenes", "diagnosticos"] + (["cirugias"] if incluir_cirugias else [])
+    conteos = microservice_client.get_record_counts(ids, request, sections=secciones)
+
+    return {
+        paciente_id: {
+            seccion: conteos[seccion].get(paciente_id) if seccion in conteos else None
+            for seccion in ("examenes", "diagnosticos", "cirugias")
+        }
+        for paciente_id in ids
+    }
+
 def create_paciente2(form):
     """
     Crea un paciente a partir de un form.
@@ -29,59 +51,55 @@ def get_paciente_by_id2(paciente_id):
     except Paciente2.DoesNotExist:
         return None
 
-def get_historia_clinica(paciente_id, request=None):
+def _get_dossier(paciente_id, request=None):
     """
-    Obtiene la historia clínica de un paciente, incluyendo exámenes y diagnósticos.
+    Arma el expediente del paciente usando la caché de expedientes:
+    solo las secciones ausentes se consultan a la base de datos o a los
+    microservicios. Las secciones parciales no se guardan en caché.
     """
-    paciente = get_paciente_by_id2(paciente_id)
-    if not paciente:
-        return None
+    secciones_remotas = ['examenes', 'diagnosticos', 'cirugias']
+    generacion = dossier_cache.generation(paciente_id)
+    dossier = dossier_cache.get_many(paciente_id, ['paciente'] + secciones_remotas, generacion)
+    paciente = dossier.get('paciente')
+    if paciente is None:
+        paciente = get_paciente_by_id2(paciente_id)
+        if not paciente:
+            return None
+        dossier_cache.set(paciente_id, 'paciente', paciente, generacion)
 
-    # Fetch data from microservices using the client
-    examenes = microservice_client.get_patient_exams(paciente_id, request)
-    diagnosticos = microservice_client.get_patient_diagnoses(paciente_id, request)
-    cirugias = microservice_client.get_patient_surgeries(paciente_id, request)
+    faltantes = [seccion for seccion in secciones_remotas if seccion not in dossier]
+    parciales = []
+    if faltantes:
+        # Fetch missing sections from microservices concurrently, bounded by a single deadline
+        registros = microservice_client.get_patient_records(paciente_id, request, sections=faltantes)
+        parciales = registros["partial"]
+        for seccion in faltantes:
+            dossier[seccion] = registros[seccion]
+            if seccion not in parciales:
+                dossier_cache.set(paciente_id, seccion, registros[seccion], generacion)
 
     # Get consultations from local database
-    consultas = list(ConsultaMedica.objects.filter(paciente_id=paciente_id).values(
-        'id', 'fecha', 'motivo_consulta', 'diagnostico_principal',
-        'plan_tratamiento', 'observaciones'
+    consultas = dossier_cache.get_or_load(paciente_id, 'consultas', lambda: list(
+        ConsultaMedica.objects.filter(paciente_id=paciente_id).values(
+            'id', 'fecha', 'motivo_consulta', 'diagnostico_principal',
+            'plan_tratamiento', 'observaciones'
+        )
     ))
 
     return {
         "paciente": paciente,
-        "examenes": examenes,
-        "diagnosticos": diagnosticos,
-        "cirugias": cirugias,
+        "examenes": dossier["examenes"],
+        "diagnosticos": dossier["diagnosticos"],
+        "cirugias": dossier["cirugias"],
         "consultas": consultas,
+        "secciones_parciales": parciales,
     }
 
-def get_informacion_critica(paciente_id, request=None):
+def get_historia_clinica(paciente_id, request=None):
     """
-    Obtiene la información crítica de un paciente.
+    Obtiene la historia clínica de un paciente, incluyendo exámenes y diagnósticos.
     """
-    paciente = get_paciente_by_id2(paciente_id)
-    if not paciente:
-        return None
-
-    # Fetch data from microservices using the client
-    examenes = microservice_client.get_patient_exams(paciente_id, request)
-    diagnosticos = microservice_client.get_patient_diagnoses(paciente_id, request)
-    cirugias = microservice_client.get_patient_surgeries(paciente_id, request)
-
-    # Get consultations from local database
-    consultas = list(ConsultaMedica.objects.filter(paciente_id=paciente_id).values(
-        'id', 'fecha', 'motivo_consulta', 'diagnostico_principal',
-        'plan_tratamiento', 'observaciones'
-    ))
-
-    return {
-        "paciente": paciente,
-        "examenes": examenes,
-        "diagnosticos": diagnosticos,
-        "cirugias": cirugias,
-        "consultas": consultas,
-    }
+    return _get_dossier(paciente_id, request)
 
 def delete_paciente2(paciente_id):
     """
@@ -1,4 +1,8 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+
+# Clave del advisory lock que serializa las escrituras del outbox
+LOCK_OUTBOX = 7316201
 
 class Paciente2(models.Model):
     GENERO = [
@@ -25,9 +29,91 @@ class Paciente2(models.Model):
     telefono = models.CharField(max_length=15)
     tipo_sangre = models.CharField(max_length=5, choices=SANGRE)
     fecha_registro = models.DateField(auto_now_add=True)
-    
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored name to publish only real changes
+        instance._nombre_guardado = instance.__dict__.get('nombre')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # The patient row and its outbox event are committed together
+        publicar = getattr(self, '_nombre_guardado', None) != self.nombre
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if publicar:
+                EventoPaciente.registrar(self)
+        self._nombre_guardado = self.nombre
 
     def __str__(self):
         return f"{self.nombre} ({self.edad} años)"
 
 
+class EventoPaciente(models.Model):
+    """
+    Outbox de cambios de pacientes. Cada fila se escribe en la misma
+    transacción que el cambio del paciente; los demás servicios leen los
+    eventos en orden de id para actualizar sus copias de paciente_nombre.
+
+    Quien escribe eventos toma antes reservar_orden(), así que las
+    transacciones del outbox confirman en el orden de sus ids y un lector
+    nunca ve un id mayor antes que uno menor.
+    """
+    ACTUALIZADO = 'paciente.actualizado'
+
+    paciente_id = models.IntegerField(db_index=True)
+    tipo = models.CharField(max_length=50, default=ACTUALIZADO)
+    datos = models.JSONField(default=dict)
+    creado = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['id']
+
+    @classmethod
+    def datos_de(cls, paciente):
+        return {'id': paciente.pk, 'nombre': paciente.nombre}
+
+    @staticmethod
+    def reservar_orden():
+        """
+        Toma hasta el commit el advisory lock del outbox; debe llamarse dentro
+        de la transacción, antes de insertar. Otro escritor espera a que esta
+        transacción termine para tomar su id. SQLite ya serializa escrituras.
+        """
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_xact_lock(%s)', [LOCK_OUTBOX])
+
+    @classmethod
+    def registrar(cls, paciente):
+        with transaction.atomic():
+            cls.reservar_orden()
+            return cls.objects.create(paciente_id=paciente.pk, datos=cls.datos_de(paciente))
+
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.paciente_id})"
+
+
+
+
+class InformacionCritica(models.Model):
+    """
+    Proyección precalculada de la información crítica de un paciente.
+    Se actualiza incrementalmente cuando cambian los registros de origen,
+    de modo que la vista de emergencias se sirve con una sola consulta local.
+    """
+    paciente = models.OneToOneField(
+        Paciente2, on_delete=models.CASCADE, primary_key=True, related_name='informacion_critica'
+    )
+    tipo_sangre = models.CharField(max_length=5, blank=True)
+    tratamientos_activos = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    cirugias_recientes = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    examenes_anormales = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    prescripciones_activas = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    # Remote sections whose last refresh failed and may be out of date
+    secciones_pendientes = models.JSONField(default=list)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Información crítica de {self.paciente_id}"
@@ -1,3 +1,230 @@
-from django.test import TestCase
+import threading
+from datetime import date, timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.microservice_client import microservice_client
+
+from .logic.informacion_critica_logic import get_informacion_critica
+from .models import EventoPaciente, InformacionCritica, Paciente2
+
+FEED_URL = '/api/patients/events/'
+
+
+def crear_paciente(nombre):
+    return Paciente2.objects.create(
+        nombre=nombre, edad=30, fecha_nacimiento=date(1994, 1, 1), genero='otro',
+        direccion='Calle 1', telefono='3000000000', tipo_sangre='o+',
+    )
+
+
+def envejecer(segundos=3600):
+    """Lleva todos los eventos fuera de la ventana de commit"""
+    EventoPaciente.objects.update(creado=timezone.now() - timedelta(seconds=segundos))
+
+
+@override_settings(PATIENT_OUTBOX={'commit_window_seconds': 30})
+class FeedEventosPacienteTests(TestCase):
+    """Outbox de pacientes: qué se publica y en qué orden lo lee un consumidor"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('servicio'))
+
+    def leer(self, after=0, limit=None):
+        params = {'after': after}
+        if limit is not None:
+            params['limit'] = limit
+        response = self.client.get(FEED_URL, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_solo_los_cambios_de_nombre_publican_eventos(self):
+        paciente = crear_paciente('Ana')
+        paciente.telefono = '3111111111'
+        paciente.save()
+        Paciente2.objects.get(pk=paciente.pk).save()
+        paciente.nombre = 'Ana María'
+        paciente.save()
+
+        self.assertEqual(
+            list(EventoPaciente.objects.values_list('paciente_id', 'datos')),
+            [(paciente.pk, {'id': paciente.pk, 'nombre': 'Ana'}),
+             (paciente.pk, {'id': paciente.pk, 'nombre': 'Ana María'})],
+        )
+
+    def test_el_feed_entrega_en_orden_de_id_desde_after(self):
+        ana, luis = crear_paciente('Ana'), crear_paciente('Luis')
+        ana.nombre = 'Ana María'
+        ana.save()
+        envejecer()
+        ids = list(EventoPaciente.objects.values_list('id', flat=True))
+
+        pagina = self.leer(limit=2)
+        self.assertEqual([e['id'] for e in pagina['results']], ids[:2])
+        self.assertEqual(pagina['last_id'], ids[1])
+        self.assertEqual([e['paciente_id'] for e in pagina['results']], [ana.pk, luis.pk])
+
+        siguiente = self.leer(after=pagina['last_id'])
+        self.assertEqual(
+            [(e['paciente_id'], e['datos']['nombre']) for e in siguiente['results']],
+            [(ana.pk, 'Ana María')],
+        )
+        self.assertEqual(self.leer(after=siguiente['last_id']), {'results': [], 'last_id': ids[2]})
+
+    def test_los_eventos_dentro_de_la_ventana_de_commit_se_retienen(self):
+        crear_paciente('Ana')
+        crear_paciente('Luis')
+
+        # Recién escritos: una transacción con un id menor podría seguir abierta
+        self.assertEqual(self.leer(), {'results': [], 'last_id': 0})
+
+        envejecer()
+        self.assertEqual([e['datos']['nombre'] for e in self.leer()['results']], ['Ana', 'Luis'])
+
+    def test_el_consumidor_recibe_despues_los_eventos_retenidos(self):
+        crear_paciente('Ana')
+        crear_paciente('Luis')
+        primero, segundo = EventoPaciente.objects.values_list('id', flat=True)
+        EventoPaciente.objects.filter(id=primero).update(creado=timezone.now() - timedelta(seconds=40))
+        EventoPaciente.objects.filter(id=segundo).update(creado=timezone.now() - timedelta(seconds=20))
+
+        # Solo sale el que ya dejó la ventana; la posición del consumidor queda en él
+        pagina = self.leer()
+        self.assertEqual([e['id'] for e in pagina['results']], [primero])
+        self.assertEqual(pagina['last_id'], primero)
+
+        envejecer()
+        self.assertEqual([e['id'] for e in self.leer(after=pagina['last_id'])['results']], [segundo])
+
+    def test_after_invalido(self):
+        response = self.client.get(FEED_URL, {'after': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(PATIENT_OUTBOX={'commit_window_seconds': 0})
+class OrdenOutboxTests(TransactionTestCase):
+    """Un evento que confirma tarde no puede quedar detrás de la posición del consumidor"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('servicio'))
+        self.ana, self.luis = crear_paciente('Ana'), crear_paciente('Luis')
+        self.inicio = EventoPaciente.objects.order_by('-id').values_list('id', flat=True).first()
+
+    def leer(self):
+        return self.client.get(FEED_URL, {'after': self.inicio}).json()
+
+    def renombrar(self, paciente, nombre, antes_del_commit=None):
+        try:
+            with transaction.atomic():
+                paciente.nombre = nombre
+                paciente.save()
+                if antes_del_commit:
+                    antes_del_commit()
+        finally:
+            connection.close()
+
+    def test_un_escritor_espera_a_que_confirme_el_anterior(self):
+        insertado, confirmar = threading.Event(), threading.Event()
+        lento = threading.Thread(target=self.renombrar, args=(self.ana, 'Ana María'),
+                                 kwargs={'antes_del_commit': lambda: (insertado.set(), confirmar.wait(10))})
+        rapido = threading.Thread(target=self.renombrar, args=(self.luis, 'Luis Pérez'))
+        lento.start()
+        self.assertTrue(insertado.wait(10))
+        rapido.start()
+        rapido.join(0.5)
+
+        # El segundo renombrado espera al primero en vez de confirmar con un id mayor
+        self.assertTrue(rapido.is_alive())
+        self.assertEqual(self.leer(), {'results': [], 'last_id': self.inicio})
+
+        confirmar.set()
+        lento.join(10)
+        rapido.join(10)
+        self.assertEqual(
+            [(e['paciente_id'], e['datos']['nombre']) for e in self.leer()['results']],
+            [(self.ana.pk, 'Ana María'), (self.luis.pk, 'Luis Pérez')],
+        )
+
+
+def registros_criticos(paciente_id, request=None, sections=None):
+    """Respuesta de los microservicios: un examen anormal y nada más"""
+    return {
+        'examenes': [{'id': 1, 'nombre': 'EEG', 'tipo_examen': 'neurologico',
+                      'fecha_examen': '2024-05-01', 'resultado': 'anormal', 'archivo': 'x.pdf'}],
+        'diagnosticos': [], 'cirugias': [], 'partial': [],
+    }
+
+
+@override_settings(CRITICAL_INFO={'max_age_seconds': 300})
+class InformacionCriticaTests(TestCase):
+    """La vista de emergencias se sirve de la proyección sin esperar a los microservicios"""
+
+    def setUp(self):
+        patcher = mock.patch.object(microservice_client, 'get_critical_records', side_effect=registros_criticos)
+        self.remotos = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_la_lectura_no_espera_a_las_secciones_pendientes_ni_antiguas(self):
+        paciente = crear_paciente('Ana')
+        InformacionCritica.objects.filter(paciente=paciente).update(
+            secciones_pendientes=['examenes'], actualizado=timezone.now() - timedelta(hours=1),
+        )
+
+        with self.assertNumQueries(1):
+            informacion = get_informacion_critica(paciente.pk)
+
+        self.remotos.assert_not_called()
+        self.assertEqual(informacion['paciente'], paciente)
+        self.assertEqual(informacion['secciones_pendientes'], ['examenes'])
+        self.assertTrue(informacion['desactualizada'])
+
+    def test_una_proyeccion_reciente_no_esta_desactualizada(self):
+        paciente = crear_paciente('Ana')
+
+        informacion = get_informacion_critica(paciente.pk)
+
+        self.remotos.assert_not_called()
+        self.assertEqual(informacion['tipo_sangre'], 'O+')
+        self.assertEqual(informacion['secciones_pendientes'], [])
+        self.assertFalse(informacion['desactualizada'])
+
+    def test_sin_proyeccion_se_construye_antes_de_responder(self):
+        paciente = crear_paciente('Ana')
+        InformacionCritica.objects.filter(paciente=paciente).delete()
+
+        informacion = get_informacion_critica(paciente.pk)
+
+        self.remotos.assert_called_once()
+        self.assertEqual(informacion['examenes_anormales'], [{
+            'id': 1, 'nombre': 'EEG', 'tipo_examen': 'neurologico',
+            'fecha_examen': '2024-05-01', 'resultado': 'anormal',
+        }])
+        self.assertEqual(informacion['secciones_pendientes'], [])
+
+    def test_paciente_inexistente(self):
+        self.assertIsNone(get_informacion_critica(999))
+        self.remotos.assert_not_called()
+
+    def test_el_comando_refresca_pendientes_y_antiguas(self):
+        pendiente, antigua, reciente = crear_paciente('Ana'), crear_paciente('Luis'), crear_paciente('Eva')
+        InformacionCritica.objects.filter(paciente=pendiente).update(secciones_pendientes=['cirugias'])
+        InformacionCritica.objects.filter(paciente=antigua).update(actualizado=timezone.now() - timedelta(hours=1))
+
+        call_command('refresh_critical_info', '--pending-only', '--stale', stdout=StringIO())
+
+        self.assertEqual(
+            {(c.args[0], tuple(c.kwargs['sections'])) for c in self.remotos.call_args_list},
+            {(pendiente.pk, ('cirugias',)), (antigua.pk, ('examenes', 'diagnosticos', 'cirugias'))},
+        )
+        self.assertFalse(InformacionCritica.objects.exclude(secciones_pendientes=[]).exists())
+        for paciente in (pendiente, antigua, reciente):
+            self.assertFalse(get_informacion_critica(paciente.pk)['desactualizada'])
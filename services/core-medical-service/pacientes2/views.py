@@ -1,26 +1,39 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
+from django.core.paginator import Paginator
 from django.urls import reverse
 from .forms import Paciente2Form
 from .models import Paciente2
 from django.http import HttpResponse
-from .logic.paciente2_logic import get_pacientes2, create_paciente2, get_paciente_by_id2, get_historia_clinica, delete_paciente2, get_informacion_critica
+from .logic.paciente2_logic import get_pacientes2, create_paciente2, get_paciente_by_id2, get_historia_clinica, delete_paciente2, get_resumen_pacientes
+from .logic.informacion_critica_logic import get_informacion_critica
 from django.contrib.auth.decorators import login_required, permission_required
+from core.permission_snapshot import get_permission_snapshot
+
+# Pacientes por página en la lista; cada página hace un conteo por microservicio
+PACIENTES_POR_PAGINA = 50
 
 @login_required
 @permission_required('pacientes2.view_paciente2', raise_exception=True)
 def paciente_list2(request):
-    pacientes2 = get_pacientes2()
-    puede_eliminar = request.user.is_superuser or request.user.groups.filter(name="admin").exists()
+    pagina = Paginator(get_pacientes2().order_by('id'), PACIENTES_POR_PAGINA).get_page(request.GET.get('page'))
+    pacientes2 = list(pagina)
+    puede_eliminar = request.user.is_superuser or get_permission_snapshot(request.user).in_group("admin")
+    puede_ver_cirugias = not get_permission_snapshot(request.user).in_group("Tecnico", "Enfermero")
+    resumen = get_resumen_pacientes(pacientes2, request, incluir_cirugias=puede_ver_cirugias)
+    for paciente2 in pacientes2:
+        paciente2.resumen = resumen.get(paciente2.id, {})
     return render(request, 'pacientes2/pacientes2.html', {
         'paciente_list2': pacientes2,
-        'puede_eliminar': puede_eliminar
+        'page_obj': pagina,
+        'puede_eliminar': puede_eliminar,
+        'puede_ver_cirugias': puede_ver_cirugias,
         })
 
 
 @login_required
 def paciente_create2(request):
-    if  ( request.user.groups.filter(name__in=["Tecnico"]).exists()):
+    if  ( get_permission_snapshot(request.user).in_group("Tecnico")):
         messages.error(request, "No tienes permisos para añadir un paciente.")
         return redirect('pacienteList2')
 
@@ -53,11 +66,11 @@ def historia_clinica_view(request, paciente_id):
     if not historia:
         return HttpResponse("Paciente no encontrado", status=404)
 
-    if  ( request.user.groups.filter(name__in=["Tecnico" ]).exists()):
+    if  ( get_permission_snapshot(request.user).in_group("Tecnico")):
         historia["cirugias"] = "No tienes permisos para ver esta información."
         historia["consultas"] = "No tienes permisos para ver esta información."
 
-    if  (request.user.groups.filter(name__in=["Enfermero" ]).exists()):
+    if  (get_permission_snapshot(request.user).in_group("Enfermero")):
         historia["cirugias"] = "No tienes permisos para ver esta información."
 
     return render(request, 'pacientes2/historia_clinica.html', historia)
@@ -84,12 +97,12 @@ def informacion_critica(request, paciente_id):
     if not informacion:
         return HttpResponse("Paciente no encontrado", status=404)
 
-    if  ( request.user.groups.filter(name__in=["Tecnico" ]).exists()):
-        informacion["cirugias"] = "No tienes permisos para ver esta información."
-        informacion["consultas"] = "No tienes permisos para ver esta información."
+    if  ( get_permission_snapshot(request.user).in_group("Tecnico")):
+        informacion["cirugias_recientes"] = "No tienes permisos para ver esta información."
+        informacion["prescripciones_activas"] = "No tienes permisos para ver esta información."
 
-    if  (request.user.groups.filter(name__in=["Enfermero" ]).exists()):
-        informacion["cirugias"] = "No tienes permisos para ver esta información."
+    if  (get_permission_snapshot(request.user).in_group("Enfermero")):
+        informacion["cirugias_recientes"] = "No tienes permisos para ver esta información."
 
 
     return render(request, 'pacientes2/informacion_critica.html', informacion)
@@ -99,7 +112,7 @@ def paciente_edit2(request, paciente_id):
     paciente = get_object_or_404(Paciente2, id=paciente_id)
 
     # Verificar permisos dentro de la vista
-    if  (request.user.groups.filter(name__in=["Tecnico"]).exists()):
+    if  (get_permission_snapshot(request.user).in_group("Tecnico")):
         messages.error(request, "No tienes permisos para modificar este paciente.")
         return redirect('pacienteDetail2', paciente_id=paciente.id)
 
@@ -3,8 +3,13 @@ JWT Authentication for microservices communication
 """
 import jwt
 import os
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from django.contrib.auth.models import User
+from django.utils.functional import cached_property
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from django.conf import settings
@@ -15,10 +20,87 @@ import json
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-super-secret-jwt-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRY_HOURS = 24
+# Decoded tokens kept per process, each until its own exp
+JWT_DECODED_CACHE_SIZE = int(os.getenv('JWT_DECODED_CACHE_SIZE', '4096'))
+# Short-lived tokens this service mints for its own downstream calls
+SERVICE_NAME = os.getenv('SERVICE_NAME', 'core-medical-service')
+SERVICE_TOKEN_TTL_SECONDS = int(os.getenv('SERVICE_TOKEN_TTL_SECONDS', '300'))
+SERVICE_TOKEN_REFRESH_MARGIN_SECONDS = 30
+
+
+class TokenPrincipal:
+    """
+    Authenticated caller built from token claims alone. It carries the user
+    ID, username and group names; any other User attribute (e.g. groups,
+    email, has_perm) loads the User row on first use, so only endpoints
+    that need it pay for the database lookup.
+    """
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+
+    def __init__(self, payload):
+        self.id = self.pk = payload.get('user_id')
+        self.service = payload.get('service')
+        self.username = payload.get('username') or f"service:{self.service}"
+        self.group_names = frozenset(payload.get('groups', ()))
+        self.is_staff = payload.get('is_staff', False)
+        self.is_superuser = payload.get('is_superuser', False)
+
+    @cached_property
+    def user(self):
+        if self.id is None:
+            raise AuthenticationFailed('Service token is not bound to a user')
+        try:
+            return User.objects.get(id=self.id)
+        except User.DoesNotExist:
+            raise AuthenticationFailed('User not found')
+
+    def __getattr__(self, name):
+        # Only called for attributes not defined above
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __str__(self):
+        return self.username
+
+
+class DecodedTokenCache:
+    """Thread-safe LRU of decoded token payloads keyed by token hash"""
+
+    def __init__(self, max_entries=JWT_DECODED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def decode(self, token):
+        """Decoded payload for token; raises jwt errors like jwt.decode"""
+        key = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                if payload['exp'] > time.time():
+                    self._entries.move_to_end(key)
+                    return payload
+                del self._entries[key]
+                raise jwt.ExpiredSignatureError('Signature has expired')
+
+        payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
+        if 'exp' in payload:
+            with self._lock:
+                self._entries[key] = payload
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return payload
+
+
+decoded_tokens = DecodedTokenCache()
 
 class JWTAuthentication(BaseAuthentication):
     """
-    Custom JWT authentication for microservices
+    Custom JWT authentication for microservices.
+    Stateless: the request user is a TokenPrincipal built from the claims.
     """
 
     def authenticate(self, request):
@@ -37,20 +119,14 @@ class JWTAuthentication(BaseAuthentication):
             return None
 
         try:
-            # Decode JWT token
-            payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-            user_id = payload.get('user_id')
-
-            if not user_id:
+            # Decode JWT token (cached until it expires)
+            payload = decoded_tokens.decode(token)
+            # Service tokens may act for no particular user
+            if not payload.get('user_id') and not payload.get('service'):
                 raise AuthenticationFailed('Invalid token payload')
 
-            # Get user from database
-            try:
-                user = User.objects.get(id=user_id)
-            except User.DoesNotExist:
-                raise AuthenticationFailed('User not found')
-
-            return (user, token)
+            # Authenticate from the claims; the User row is loaded only if an endpoint needs it
+            return (TokenPrincipal(payload), token)
 
         except jwt.ExpiredSignatureError:
             raise AuthenticationFailed('Token has expired')
@@ -66,6 +142,9 @@ def generate_jwt_token(user):
         'user_id': user.id,
         'username': user.username,
         'email': user.email,
+        'groups': [group.name for group in user.groups.all()],
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
         'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRY_HOURS),
         'iat': datetime.utcnow(),
     }
@@ -74,6 +153,61 @@ def generate_jwt_token(user):
     return token
 
 
+def generate_service_token(user=None):
+    """
+    Generate a short-lived token for a call made by this service, acting
+    for user when given (a User or TokenPrincipal) or as the service itself.
+    Returns the token and its expiry as a Unix timestamp.
+    """
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=SERVICE_TOKEN_TTL_SECONDS)
+    payload = {'service': SERVICE_NAME, 'exp': expires, 'iat': now}
+    if user is not None:
+        group_names = getattr(user, 'group_names', None)
+        payload.update({
+            'user_id': user.pk,
+            'username': user.username,
+            'groups': sorted(group_names) if group_names is not None else [group.name for group in user.groups.all()],
+            'is_staff': user.is_staff,
+            'is_superuser': user.is_superuser,
+        })
+
+    token = jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+    return token, time.time() + SERVICE_TOKEN_TTL_SECONDS
+
+
+class ServiceTokenCache:
+    """
+    Per-process LRU of minted service tokens keyed by identity (a user or
+    the service itself). A token is reused until shortly before it expires,
+    so downstream calls do not sign a new JWT each time.
+    """
+
+    def __init__(self, max_entries=JWT_DECODED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user=None):
+        identity = f"user:{user.pk}" if user is not None else f"service:{SERVICE_NAME}"
+        with self._lock:
+            cached = self._tokens.get(identity)
+            if cached is not None and cached[1] - time.time() > SERVICE_TOKEN_REFRESH_MARGIN_SECONDS:
+                self._tokens.move_to_end(identity)
+                return cached[0]
+
+        token, expires_at = generate_service_token(user)
+        with self._lock:
+            self._tokens[identity] = (token, expires_at)
+            self._tokens.move_to_end(identity)
+            if len(self._tokens) > self.max_entries:
+                self._tokens.popitem(last=False)
+        return token
+
+
+service_tokens = ServiceTokenCache()
+
+
 def validate_jwt_token(token):
     """
     Validate JWT token and return user data
@@ -147,5 +281,5 @@ def get_authenticated_microservice_client(service_url, user):
     """
     Get authenticated HTTP client for microservice communication
     """
-    token = generate_jwt_token(user)
+    token = service_tokens.get(user)
     return MicroserviceClient(service_url, token)
@@ -0,0 +1,15 @@
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class ServiceOrPublicAccess(BasePermission):
+    """
+    Access for the service-to-service API. Callers forward a short-lived
+    service token minted by core; while REQUIRE_SERVICE_AUTH is off,
+    anonymous calls are still accepted so older clients keep working.
+    """
+
+    def has_permission(self, request, view):
+        if not getattr(settings, 'REQUIRE_SERVICE_AUTH', False):
+            return True
+        return bool(request.user and request.user.is_authenticated)
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',  # ETag + 304 on If-None-Match for API reads
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # For microservice communication
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -98,10 +99,13 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
     'PAGE_SIZE': 20
 }
 
+# Reject public API calls that carry no service token from core
+REQUIRE_SERVICE_AUTH = os.getenv('REQUIRE_SERVICE_AUTH', 'False').lower() == 'true'
+
 # CORS settings for microservice communication
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:8000').split(',')
 CORS_ALLOW_CREDENTIALS = True
@@ -109,6 +113,27 @@ CORS_ALLOW_CREDENTIALS = True
 # Core service URL for patient data
 CORE_SERVICE_URL = os.getenv('CORE_SERVICE_URL', 'http://localhost:8000')
 
+# Batched patient lookups against core, cached per process
+PATIENT_RESOLVER = {
+    'ttl': int(os.getenv('PATIENT_RESOLVER_TTL', '300')),
+    'negative_ttl': int(os.getenv('PATIENT_RESOLVER_NEGATIVE_TTL', '60')),
+    'stale_ttl': int(os.getenv('PATIENT_RESOLVER_STALE_TTL', '3600')),
+    'timeout': float(os.getenv('PATIENT_RESOLVER_TIMEOUT', '3')),
+    'max_entries': int(os.getenv('PATIENT_RESOLVER_MAX_ENTRIES', '10000')),
+}
+
+# Notify core's dossier cache after this service's records change
+DOSSIER_NOTIFY = {
+    'enabled': os.getenv('DOSSIER_NOTIFY', 'True').lower() == 'true',
+    'timeout': float(os.getenv('DOSSIER_NOTIFY_TIMEOUT', '3')),
+}
+
+# Consumer of core's patient change feed (manage.py consume_patient_events)
+PATIENT_SYNC = {
+    'batch_size': int(os.getenv('PATIENT_SYNC_BATCH_SIZE', '1000')),
+    'timeout': float(os.getenv('PATIENT_SYNC_TIMEOUT', '5')),
+}
+
 # Static files
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
@@ -1,16 +1,41 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
-from django.db.models import Q
+from django.db.models import Count
+from django.utils.dateparse import parse_date
+from core.pagination import SearchPagination
+from core.permissions import ServiceOrPublicAccess
 from .models import Diagnostico2, Tratamiento2
+from .search import highlight, search_diagnoses
 from .serializers import (
     Diagnostico2Serializer, DiagnosticoCreateSerializer,
     Tratamiento2Serializer, TratamientoCreateSerializer
 )
 
+# Upper bound on patient IDs accepted by batch endpoints
+BATCH_MAX_PATIENTS = 500
+
+def _patient_ids(values):
+    """Patient IDs as ints; None unless values is a list of at most BATCH_MAX_PATIENTS integers"""
+    if not isinstance(values, list) or len(values) > BATCH_MAX_PATIENTS:
+        return None
+    try:
+        return [int(value) for value in values]
+    except (TypeError, ValueError):
+        return None
+
+def _date_param(params, name, default):
+    """Optional YYYY-MM-DD query parameter; ValueError if malformed"""
+    value = params.get(name)
+    if not value:
+        return default
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(name)
+    return parsed
+
 class Diagnostico2ViewSet(viewsets.ModelViewSet):
-    queryset = Diagnostico2.objects.all()
+    queryset = Diagnostico2.objects.prefetch_related('tratamientos')
     serializer_class = Diagnostico2Serializer
 
     def get_serializer_class(self):
@@ -34,7 +59,7 @@ class Diagnostico2ViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def search(self, request):
-        """Search diagnoses by patient name or diagnosis name"""
+        """Ranked full-text search over diagnosis name, patient name and results"""
         query = request.query_params.get('q', '')
         if not query:
             return Response(
@@ -42,13 +67,14 @@ class Diagnostico2ViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        diagnoses = self.queryset.filter(
-            Q(nombre__icontains=query) |
-            Q(paciente_nombre__icontains=query) |
-            Q(resultados_obtenidos__icontains=query)
-        )
-        serializer = self.get_serializer(diagnoses, many=True)
-        return Response(serializer.data)
+        paginator = SearchPagination()
+        page = paginator.paginate_queryset(search_diagnoses(self.queryset, query), request, view=self)
+        highlights = highlight(page, query)
+        data = self.get_serializer(page, many=True).data
+        for diagnosis, item in zip(page, data):
+            item['rank'] = getattr(diagnosis, 'rank', None)
+            item['resaltado'] = highlights.get(diagnosis.pk)
+        return paginator.get_paginated_response(data)
 
     def create(self, request, *args, **kwargs):
         """Create a new diagnosis"""
@@ -99,16 +125,33 @@ class Tratamiento2ViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def active(self, request):
-        """Get active treatments (ongoing treatments)"""
+        """
+        Get treatments active on a date (default today) or overlapping a
+        date range (desde/hasta), optionally for one patient; paginated
+        """
         from django.utils import timezone
-        today = timezone.now().date()
+        params = request.query_params
+        try:
+            on_date = _date_param(params, 'date', timezone.now().date())
+            desde = _date_param(params, 'desde', on_date)
+            hasta = _date_param(params, 'hasta', desde)
+            patient_id = int(params['patient_id']) if params.get('patient_id') else None
+        except ValueError:
+            desde = hasta = None
+        if desde is None or desde > hasta:
+            return Response(
+                {'error': 'date, desde and hasta must be valid YYYY-MM-DD dates with desde <= hasta, '
+                          'and patient_id an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        treatments = self.queryset.filter(
-            fecha_inicio__lte=today,
-            fecha_fin__gte=today
-        )
-        serializer = self.get_serializer(treatments, many=True)
-        return Response(serializer.data)
+        treatments = self.queryset.filter(fecha_inicio__lte=hasta, fecha_fin__gte=desde)
+        if patient_id is not None:
+            treatments = treatments.filter(paciente_id=patient_id)
+
+        page = self.paginate_queryset(treatments)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         """Create a new treatment"""
@@ -121,10 +164,10 @@ class Tratamiento2ViewSet(viewsets.ModelViewSet):
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
 class PublicDiagnostico2ViewSet(viewsets.ReadOnlyModelViewSet):
-    """Public API for microservice communication - no authentication required"""
-    queryset = Diagnostico2.objects.all()
+    """Service-to-service API, authenticated with core's service token"""
+    queryset = Diagnostico2.objects.prefetch_related('tratamientos')
     serializer_class = Diagnostico2Serializer
-    permission_classes = [AllowAny]
+    permission_classes = [ServiceOrPublicAccess]
 
     @action(detail=False, methods=['get'])
     def by_patient(self, request):
@@ -140,9 +183,63 @@ class PublicDiagnostico2ViewSet(viewsets.ReadOnlyModelViewSet):
         serializer = self.get_serializer(diagnoses, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Get diagnoses for several patients at once, grouped by patient"""
+        patient_ids = _patient_ids(request.data.get('patient_ids') if isinstance(request.data, dict) else None)
+        if patient_ids is None:
+            return Response(
+                {'error': f'patient_ids must be a list of at most {BATCH_MAX_PATIENTS} IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        diagnoses = self.queryset.filter(paciente_id__in=patient_ids)
+        grouped = {str(patient_id): [] for patient_id in patient_ids}
+        for item in self.get_serializer(diagnoses, many=True).data:
+            grouped[str(item['paciente_id'])].append(item)
+        return Response({'results': grouped})
+
+    @action(detail=False, methods=['get'])
+    def counts(self, request):
+        """Count diagnoses for several patients (?patient_ids=1,2,3) with one GROUP BY"""
+        raw = request.query_params.get('patient_ids', '')
+        patient_ids = _patient_ids([value for value in raw.split(',') if value.strip()])
+        if patient_ids is None:
+            return Response(
+                {'error': f'patient_ids must be a comma-separated list of at most {BATCH_MAX_PATIENTS} IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        counts = dict.fromkeys(map(str, patient_ids), 0)
+        rows = (
+            Diagnostico2.objects.filter(paciente_id__in=patient_ids).order_by()
+            .values('paciente_id').annotate(total=Count('id'))
+        )
+        for row in rows:
+            counts[str(row['paciente_id'])] = row['total']
+        return Response({'results': counts})
+
 
 class PublicTratamiento2ViewSet(viewsets.ReadOnlyModelViewSet):
-    """Public API for treatments - no authentication required"""
+    """Service-to-service API for treatments, authenticated with core's service token"""
     queryset = Tratamiento2.objects.all()
     serializer_class = Tratamiento2Serializer
-    permission_classes = [AllowAny]
+    permission_classes = [ServiceOrPublicAccess]
+
+    @action(detail=False, methods=['get'])
+    def active(self, request):
+        """Get a patient's treatments that have not ended yet (ongoing or upcoming)"""
+        from django.utils import timezone
+        patient_id = request.query_params.get('patient_id')
+        if not patient_id:
+            return Response(
+                {'error': 'patient_id parameter is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        treatments = self.queryset.filter(
+            paciente_id=patient_id,
+            fecha_fin__gte=timezone.now().date()
+        ).order_by('fecha_fin')
+        serializer = self.get_serializer(treatments, many=True)
+        return Response({'results': serializer.data})
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class VariablesConfig(AppConfig):
     name = 'diagnosticos2'
+
+    def ready(self):
+        # Connect the core notification handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,65 @@
+import random
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+
+from diagnosticos2.models import Diagnostico2
+from diagnosticos2.search import full_text_enabled, refresh_search_vectors, search_diagnoses
+
+WORDS = (
+    'paciente presenta crisis focales descargas epileptiformes temporales izquierdas '
+    'resonancia normal hipocampo esclerosis actividad lenta difusa electroencefalograma '
+    'convulsiones nocturnas ausencias tonico clonicas aura cefalea somnolencia '
+    'tratamiento levetiracetam carbamazepina valproato respuesta parcial control adecuado'
+).split()
+QUERIES = ['esclerosis hipocampo', 'crisis nocturnas', 'levetiracetam', 'descargas temporales izquierdas']
+
+
+class Command(BaseCommand):
+    help = 'Compare icontains scans against ranked full-text search on a generated table of diagnoses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Diagnoses to generate')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query')
+
+    def timed(self, fn, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - start) * 1000 / repeat
+
+    def handle(self, *args, **options):
+        if not full_text_enabled():
+            raise CommandError('This benchmark needs PostgreSQL')
+
+        rng = random.Random(42)
+        today = date.today()
+        with transaction.atomic():
+            for start in range(0, options['rows'], 10000):
+                Diagnostico2.objects.bulk_create([
+                    Diagnostico2(
+                        nombre=' '.join(rng.choices(WORDS, k=3)), fecha_realizacion=today,
+                        paciente_id=rng.randint(1, 50000), paciente_nombre=f"Paciente {i}",
+                        resultados_obtenidos=' '.join(rng.choices(WORDS, k=60)), info_extra='',
+                    )
+                    for i in range(start, min(start + 10000, options['rows']))
+                ])
+            refresh_search_vectors(Diagnostico2.objects.all())
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE diagnosticos2_diagnostico2')
+
+            for text in QUERIES:
+                legacy_ms = self.timed(lambda: list(Diagnostico2.objects.filter(
+                    Q(nombre__icontains=text) | Q(paciente_nombre__icontains=text) |
+                    Q(resultados_obtenidos__icontains=text)
+                )[:20]), options['repeat'])
+                fts_ms = self.timed(
+                    lambda: list(search_diagnoses(Diagnostico2.objects.all(), text)[:20]), options['repeat']
+                )
+                self.stdout.write(
+                    f"{text!r:<36} icontains {legacy_ms:9.1f} ms, full-text (ranked, first page) {fts_ms:9.1f} ms"
+                )
+            transaction.set_rollback(True)
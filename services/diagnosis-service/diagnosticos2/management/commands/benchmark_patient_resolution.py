@@ -0,0 +1,109 @@
+import json
+import re
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from diagnosticos2.models import Diagnostico2, Tratamiento2
+from diagnosticos2.patient_resolver import patient_resolver
+from diagnosticos2.serializers import Diagnostico2Serializer
+
+
+class StubCoreHandler(BaseHTTPRequestHandler):
+    """Stub core service: single and bulk patient lookups with a fixed latency"""
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    calls = 0
+
+    def _reply(self, payload):
+        StubCoreHandler.calls += 1
+        time.sleep(self.latency)
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        match = re.search(r'/(\d+)/$', self.path)
+        self._reply({'id': int(match.group(1)), 'nombre': f"Paciente {match.group(1)}"})
+
+    def do_POST(self):
+        ids = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['patient_ids']
+        self._reply({'results': {str(pid): {'id': pid, 'nombre': f"Paciente {pid}"} for pid in ids}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def legacy_patient_data(instance):
+    """What each serialized row used to do: one blocking GET to core"""
+    response = requests.get(f"{settings.CORE_SERVICE_URL}/api/pacientes/{instance.paciente_id}/")
+    return response.json() if response.status_code == 200 else None
+
+
+def legacy_serialize(diagnoses):
+    data = []
+    for diagnosis in diagnoses:
+        item = {'id': diagnosis.id, 'paciente_data': legacy_patient_data(diagnosis), 'tratamientos': []}
+        for treatment in diagnosis.tratamientos.all():
+            item['tratamientos'].append({'id': treatment.id, 'paciente_data': legacy_patient_data(treatment)})
+        data.append(item)
+    return data
+
+
+class Command(BaseCommand):
+    help = 'Count core calls and time to serialize a diagnosis list, per-row lookups versus the batched resolver'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--diagnoses', type=int, default=100, help='Diagnoses in the list')
+        parser.add_argument('--treatments', type=int, default=3, help='Treatments per diagnosis')
+        parser.add_argument('--patients', type=int, default=40, help='Distinct patients')
+        parser.add_argument('--latency-ms', type=float, default=5.0, help='Stub core latency per call')
+
+    def run(self, fn, diagnoses):
+        StubCoreHandler.calls = 0
+        start = time.perf_counter()
+        fn(diagnoses)
+        return (time.perf_counter() - start) * 1000, StubCoreHandler.calls
+
+    def handle(self, *args, **options):
+        StubCoreHandler.latency = options['latency_ms'] / 1000
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubCoreHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        with override_settings(CORE_SERVICE_URL=f"http://127.0.0.1:{server.server_port}"), transaction.atomic():
+            today = date.today()
+            # bulk_create skips save(), which would look the patient up
+            diagnoses = Diagnostico2.objects.bulk_create([
+                Diagnostico2(nombre=f"Diagnóstico {i}", fecha_realizacion=today,
+                             paciente_id=i % options['patients'] + 1,
+                             resultados_obtenidos='', info_extra='')
+                for i in range(options['diagnoses'])
+            ])
+            Tratamiento2.objects.bulk_create([
+                Tratamiento2(nombre=f"Tratamiento {j}", diagnostico=diagnosis, paciente_id=diagnosis.paciente_id,
+                             fecha_inicio=today, fecha_fin=today, indicaciones='')
+                for diagnosis in diagnoses for j in range(options['treatments'])
+            ])
+            queryset = Diagnostico2.objects.filter(id__in=[d.id for d in diagnoses]).prefetch_related('tratamientos')
+
+            legacy_ms, legacy_calls = self.run(legacy_serialize, list(queryset))
+            patient_resolver.clear()
+            cold_ms, cold_calls = self.run(lambda rows: Diagnostico2Serializer(rows, many=True).data, list(queryset))
+            warm_ms, warm_calls = self.run(lambda rows: Diagnostico2Serializer(rows, many=True).data, list(queryset))
+            transaction.set_rollback(True)
+        server.shutdown()
+        patient_resolver.clear()
+
+        self.stdout.write(f"Per-row lookups:          {legacy_ms:8.1f} ms, {legacy_calls} core calls")
+        self.stdout.write(f"Batched resolver (cold):  {cold_ms:8.1f} ms, {cold_calls} core calls")
+        self.stdout.write(f"Batched resolver (warm):  {warm_ms:8.1f} ms, {warm_calls} core calls")
@@ -0,0 +1,34 @@
+import logging
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+from diagnosticos2.patient_sync import consume_patient_events, fill_missing_names
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Keep paciente_nombre in sync by consuming core's patient change events"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Apply pending events and exit')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls')
+
+    def handle(self, *args, **options):
+        filled = fill_missing_names()
+        if filled:
+            self.stdout.write(f"Filled {filled} rows with known patient names")
+
+        while True:
+            try:
+                read = consume_patient_events()
+                if read:
+                    fill_missing_names()
+                    self.stdout.write(f"Applied {read} patient events")
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"Core patient feed unavailable: {e}")
+            if options['once']:
+                return
+            time.sleep(options['interval'])
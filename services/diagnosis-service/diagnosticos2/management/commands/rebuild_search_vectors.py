@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from diagnosticos2.models import Diagnostico2
+from diagnosticos2.search import full_text_enabled, refresh_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Fill or rebuild the full-text search column of every diagnosis, in id ranges'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Diagnoses per UPDATE')
+        parser.add_argument('--missing-only', action='store_true', help='Only rows without a search vector')
+
+    def handle(self, *args, **options):
+        if not full_text_enabled():
+            self.stdout.write(self.style.WARNING('Full-text search needs PostgreSQL; nothing to do'))
+            return
+
+        queryset = Diagnostico2.objects.all()
+        if options['missing_only']:
+            queryset = queryset.filter(busqueda__isnull=True)
+        last_id = queryset.aggregate(ultimo=Max('id'))['ultimo'] or 0
+        batch = options['batch_size']
+        updated = 0
+        for start in range(0, last_id, batch):
+            updated += refresh_search_vectors(queryset.filter(id__gt=start, id__lte=start + batch))
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt search vectors for {updated} diagnoses"))
@@ -1,6 +1,21 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
-import requests
-from django.conf import settings
+from .patient_resolver import patient_resolver
+
+class PacienteNombre(models.Model):
+    """Local copy of patient names, fed by core's patient change events"""
+    paciente_id = models.IntegerField(primary_key=True)
+    nombre = models.CharField(max_length=200)
+    # Last core event applied; the highest one is the consumer's position in the feed
+    evento_id = models.BigIntegerField(db_index=True)
+
+    @classmethod
+    def nombre_de(cls, paciente_id):
+        return cls.objects.filter(paciente_id=paciente_id).values_list('nombre', flat=True).first() or ''
+
+    def __str__(self):
+        return f"{self.paciente_id}: {self.nombre}"
 
 class Diagnostico2(models.Model):
     nombre = models.CharField(max_length=100)
@@ -9,30 +24,28 @@ class Diagnostico2(models.Model):
     paciente_nombre = models.CharField(max_length=200, blank=True)  # Cache patient name for display
     resultados_obtenidos = models.TextField()
     info_extra = models.TextField()
+    # Spanish tsvector over nombre, paciente_nombre and resultados_obtenidos (see search.py)
+    busqueda = SearchVectorField(null=True, editable=False)
 
     class Meta:
         permissions = [
             ("can_make_diagnosis", "Can make diagnosis"),
         ]
+        indexes = [
+            GinIndex(fields=['busqueda'], name='diagnostico2_busqueda_gin'),
+        ]
 
     def get_paciente_data(self):
         """Fetch patient data from the core medical service"""
-        try:
-            core_service_url = getattr(settings, 'CORE_SERVICE_URL', 'http://localhost:8000')
-            response = requests.get(f"{core_service_url}/api/pacientes/{self.paciente_id}/")
-            if response.status_code == 200:
-                return response.json()
-        except Exception as e:
-            print(f"Error fetching patient data: {e}")
-        return None
+        return patient_resolver.get(self.paciente_id)
 
     def save(self, *args, **kwargs):
-        # Cache patient name when saving
+        # Cache patient name from the local copy kept in sync with core
         if not self.paciente_nombre:
-            patient_data = self.get_paciente_data()
-            if patient_data:
-                self.paciente_nombre = f"{patient_data.get('nombre', '')} {patient_data.get('apellido', '')}"
+            self.paciente_nombre = PacienteNombre.nombre_de(self.paciente_id)
         super().save(*args, **kwargs)
+        from .search import refresh_search_vectors
+        refresh_search_vectors(Diagnostico2.objects.filter(pk=self.pk))
 
     def __str__(self):
         return f"{self.nombre}"
@@ -46,23 +59,23 @@ class Tratamiento2(models.Model):
     fecha_fin = models.DateField()
     indicaciones = models.TextField()
 
+    class Meta:
+        # Active-on-a-date and range-overlap queries bound fecha_fin from below
+        # and fecha_inicio from above; leading with fecha_fin keeps the scan to
+        # treatments that have not ended, however long the history grows.
+        indexes = [
+            models.Index(fields=['fecha_fin', 'fecha_inicio'], name='tratamiento2_vigencia_idx'),
+            models.Index(fields=['paciente_id', 'fecha_fin', 'fecha_inicio'], name='tratamiento2_pac_vig_idx'),
+        ]
+
     def get_paciente_data(self):
         """Fetch patient data from the core medical service"""
-        try:
-            core_service_url = getattr(settings, 'CORE_SERVICE_URL', 'http://localhost:8000')
-            response = requests.get(f"{core_service_url}/api/pacientes/{self.paciente_id}/")
-            if response.status_code == 200:
-                return response.json()
-        except Exception as e:
-            print(f"Error fetching patient data: {e}")
-        return None
+        return patient_resolver.get(self.paciente_id)
 
     def save(self, *args, **kwargs):
-        # Cache patient name when saving
+        # Cache patient name from the local copy kept in sync with core
         if not self.paciente_nombre:
-            patient_data = self.get_paciente_data()
-            if patient_data:
-                self.paciente_nombre = f"{patient_data.get('nombre', '')} {patient_data.get('apellido', '')}"
+            self.paciente_nombre = PacienteNombre.nombre_de(self.paciente_id)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -0,0 +1,112 @@
+"""
+Consumer of core's patient change events (GET /api/patients/events/).
+
+Core writes an outbox row in the same transaction as every patient rename.
+This consumer reads the feed in order from the last applied event, keeps
+PacienteNombre up to date and rewrites the denormalized paciente_nombre
+columns with one UPDATE per model, so saves never call core and renamed
+patients converge within one polling interval plus core's commit window
+(a couple of seconds each by default).
+
+Applying is monotone per patient: an event no newer than the one already
+stored for its patient is ignored, so re-reading part of the feed is safe.
+"""
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Max, OuterRef, Subquery, Value, When
+
+from core.authentication import service_tokens
+
+from .models import Diagnostico2, PacienteNombre, Tratamiento2
+from .search import refresh_search_vectors
+
+# Models whose paciente_nombre column mirrors core
+DENORMALIZED_MODELS = (Diagnostico2, Tratamiento2)
+
+
+def _config():
+    return getattr(settings, 'PATIENT_SYNC', {})
+
+
+def fetch_events(after, limit):
+    """One page of the core feed after the given event id"""
+    url = f"{getattr(settings, 'CORE_SERVICE_URL', 'http://localhost:8000')}/api/patients/events/"
+    response = requests.get(
+        url,
+        params={'after': after, 'limit': limit},
+        headers={'Authorization': f"Bearer {service_tokens.get()}"},
+        timeout=_config().get('timeout', 5),
+    )
+    response.raise_for_status()
+    return response.json().get('results', [])
+
+
+def apply_events(events):
+    """Store the latest name per patient and rewrite the denormalized columns"""
+    latest = {}
+    for event in events:
+        nombre = (event.get('datos') or {}).get('nombre')
+        if nombre is not None and event['id'] > latest.get(event['paciente_id'], (0, None))[0]:
+            latest[event['paciente_id']] = (event['id'], nombre)
+    applied = PacienteNombre.objects.filter(paciente_id__in=latest).values_list('paciente_id', 'evento_id')
+    for paciente_id, evento_id in applied:
+        if evento_id >= latest[paciente_id][0]:
+            del latest[paciente_id]
+    if not latest:
+        return 0
+
+    with transaction.atomic():
+        PacienteNombre.objects.bulk_create(
+            [PacienteNombre(paciente_id=pid, nombre=nombre, evento_id=evento_id)
+             for pid, (evento_id, nombre) in latest.items()],
+            update_conflicts=True,
+            unique_fields=['paciente_id'],
+            update_fields=['nombre', 'evento_id'],
+        )
+        nombre_case = Case(
+            *[When(paciente_id=pid, then=Value(nombre)) for pid, (_, nombre) in latest.items()],
+            default=F('paciente_nombre'),
+        )
+        for model in DENORMALIZED_MODELS:
+            model.objects.filter(paciente_id__in=latest).update(paciente_nombre=nombre_case)
+        # paciente_nombre is part of the search document
+        refresh_search_vectors(Diagnostico2.objects.filter(paciente_id__in=latest))
+    return len(latest)
+
+
+def fill_missing_names():
+    """Name rows saved before their patient's name was known locally"""
+    known = PacienteNombre.objects.filter(paciente_id=OuterRef('paciente_id')).values('nombre')[:1]
+    filled = 0
+    for model in DENORMALIZED_MODELS:
+        pending = list(model.objects.filter(
+            paciente_nombre='',
+            paciente_id__in=PacienteNombre.objects.values('paciente_id'),
+        ).values_list('pk', flat=True))
+        if not pending:
+            continue
+        filled += model.objects.filter(pk__in=pending).update(paciente_nombre=Subquery(known))
+        if model is Diagnostico2:
+            refresh_search_vectors(Diagnostico2.objects.filter(pk__in=pending))
+    return filled
+
+
+def consume_patient_events():
+    """
+    Apply every pending event, one page at a time.
+    Returns the number of events read.
+    """
+    limit = _config().get('batch_size', 1000)
+    after = PacienteNombre.objects.aggregate(ultimo=Max('evento_id'))['ultimo'] or 0
+    read = 0
+    while True:
+        events = fetch_events(after, limit)
+        if not events:
+            return read
+        apply_events(events)
+        read += len(events)
+        after = events[-1]['id']
+        if len(events) < limit:
+            return read
@@ -0,0 +1,70 @@
+"""
+Full-text search over diagnoses.
+
+On PostgreSQL each diagnosis keeps a Spanish tsvector in Diagnostico2.busqueda
+(GIN-indexed), weighted A for the diagnosis and patient names and B for the
+clinical results. Queries use websearch syntax, are ranked with ts_rank and
+highlighted with ts_headline. Other backends fall back to the previous
+icontains filters, ordered by newest first.
+"""
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Q
+
+from .models import Diagnostico2
+
+SEARCH_CONFIG = 'spanish'
+
+
+def full_text_enabled():
+    return connection.vendor == 'postgresql'
+
+
+def search_vector():
+    return (
+        SearchVector('nombre', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('paciente_nombre', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('resultados_obtenidos', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def refresh_search_vectors(queryset):
+    """Recompute busqueda for the given diagnoses with one UPDATE"""
+    if full_text_enabled():
+        return queryset.update(busqueda=search_vector())
+    return 0
+
+
+def search_diagnoses(queryset, text):
+    """Matching diagnoses, best match first"""
+    if not full_text_enabled():
+        return queryset.filter(
+            Q(nombre__icontains=text) |
+            Q(paciente_nombre__icontains=text) |
+            Q(resultados_obtenidos__icontains=text)
+        ).order_by('-id')
+
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return queryset.filter(busqueda=query).annotate(
+        rank=SearchRank(F('busqueda'), query)
+    ).order_by('-rank', '-id')
+
+
+def highlight(diagnoses, text):
+    """
+    Highlighted fragments of resultados_obtenidos by diagnosis id, computed
+    for one page only since ts_headline re-parses each document.
+    """
+    ids = [diagnosis.pk for diagnosis in diagnoses]
+    if not ids or not full_text_enabled():
+        return {}
+    query = SearchQuery(text, config=SEARCH_CONFIG, search_type='websearch')
+    return dict(
+        Diagnostico2.objects.filter(pk__in=ids).annotate(
+            resaltado=SearchHeadline(
+                'resultados_obtenidos', query, config=SEARCH_CONFIG,
+                start_sel='<mark>', stop_sel='</mark>', max_fragments=2,
+            )
+        ).values_list('pk', 'resaltado')
+    )
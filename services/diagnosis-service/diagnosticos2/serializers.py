@@ -1,15 +1,32 @@
 from rest_framework import serializers
 from .models import Diagnostico2, Tratamiento2
+from .patient_resolver import patient_resolver
+
+
+class PatientResolvingListSerializer(serializers.ListSerializer):
+    """Loads the patients of every row (and nested treatment) in one batch before serializing"""
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        patient_ids = set()
+        for item in items:
+            patient_ids.add(item.paciente_id)
+            if isinstance(item, Diagnostico2):
+                patient_ids.update(t.paciente_id for t in item.tratamientos.all())
+        patient_resolver.prime(patient_ids)
+        return super().to_representation(items)
+
 
 class Tratamiento2Serializer(serializers.ModelSerializer):
     class Meta:
         model = Tratamiento2
         fields = '__all__'
+        list_serializer_class = PatientResolvingListSerializer
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         # Add patient data if available
-        patient_data = instance.get_paciente_data()
+        patient_data = patient_resolver.get(instance.paciente_id)
         if patient_data:
             representation['paciente_data'] = patient_data
         return representation
@@ -19,12 +36,13 @@ class Diagnostico2Serializer(serializers.ModelSerializer):
 
     class Meta:
         model = Diagnostico2
-        fields = '__all__'
+        exclude = ['busqueda']
+        list_serializer_class = PatientResolvingListSerializer
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
         # Add patient data if available
-        patient_data = instance.get_paciente_data()
+        patient_data = patient_resolver.get(instance.paciente_id)
         if patient_data:
             representation['paciente_data'] = patient_data
         return representation
@@ -0,0 +1,19 @@
+"""
+Signal handlers that tell core when a patient's diagnoses or treatments
+change. Queryset update() calls (e.g. patient name sync) send no signals
+and do not touch anything core caches.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .dossier_notify import notify_patient_changed
+from .models import Diagnostico2, Tratamiento2
+
+
+@receiver(post_save, sender=Diagnostico2)
+@receiver(post_delete, sender=Diagnostico2)
+@receiver(post_save, sender=Tratamiento2)
+@receiver(post_delete, sender=Tratamiento2)
+def notify_core(sender, instance, **kwargs):
+    notify_patient_changed(instance.paciente_id)
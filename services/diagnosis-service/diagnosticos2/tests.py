@@ -1,3 +1,249 @@
-from django.test import TestCase
+import io
+import time
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+import jwt
+import requests
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.authentication import JWT_ALGORITHM, JWT_SECRET_KEY
+
+from .models import Diagnostico2, PacienteNombre, Tratamiento2
+from .patient_resolver import PatientResolver, patient_resolver
+from .serializers import Diagnostico2Serializer
+from .patient_sync import apply_events, consume_patient_events
+
+
+def event(event_id, paciente_id, nombre):
+    return {'id': event_id, 'paciente_id': paciente_id, 'tipo': 'paciente.actualizado',
+            'datos': {'id': paciente_id, 'nombre': nombre}}
+
+
+@override_settings(DOSSIER_NOTIFY={'enabled': False}, PATIENT_SYNC={'batch_size': 2})
+class PatientEventsTests(TestCase):
+    """Applying core's patient feed is ordered, monotone per patient and idempotent"""
+
+    def setUp(self):
+        self.diagnostico = Diagnostico2.objects.create(
+            nombre='Epilepsia focal', fecha_realizacion=date(2024, 5, 1), paciente_id=7,
+            resultados_obtenidos='EEG anormal', info_extra='',
+        )
+
+    def names(self):
+        return dict(PacienteNombre.objects.values_list('paciente_id', 'nombre'))
+
+    def test_latest_event_per_patient_wins(self):
+        apply_events([event(1, 7, 'Ana'), event(2, 8, 'Luis'), event(3, 7, 'Ana María')])
+
+        self.assertEqual(self.names(), {7: 'Ana María', 8: 'Luis'})
+        self.diagnostico.refresh_from_db()
+        self.assertEqual(self.diagnostico.paciente_nombre, 'Ana María')
+
+    def test_reapplying_older_events_does_not_regress(self):
+        apply_events([event(1, 7, 'Ana'), event(3, 7, 'Ana María')])
+
+        # A re-read overlapping what was already applied
+        self.assertEqual(apply_events([event(1, 7, 'Ana'), event(2, 8, 'Luis')]), 1)
+
+        self.assertEqual(self.names(), {7: 'Ana María', 8: 'Luis'})
+        self.assertEqual(PacienteNombre.objects.get(paciente_id=7).evento_id, 3)
+        self.diagnostico.refresh_from_db()
+        self.assertEqual(self.diagnostico.paciente_nombre, 'Ana María')
+
+    def test_consumer_resumes_after_the_highest_applied_event(self):
+        feed = [event(1, 7, 'Ana'), event(2, 8, 'Luis'), event(3, 7, 'Ana María')]
+        requested = []
+
+        def fetch(after, limit):
+            requested.append(after)
+            return [e for e in feed if e['id'] > after][:limit]
+
+        with mock.patch('diagnosticos2.patient_sync.fetch_events', side_effect=fetch):
+            self.assertEqual(consume_patient_events(), 3)
+            feed.append(event(4, 8, 'Luis Pérez'))
+            self.assertEqual(consume_patient_events(), 1)
+
+        self.assertEqual(requested, [0, 2, 3])
+        self.assertEqual(self.names(), {7: 'Ana María', 8: 'Luis Pérez'})
+
+
+def service_token(**claims):
+    """A token as core mints it for a downstream call"""
+    payload = {'service': 'core-medical-service', 'exp': int(time.time()) + 300, **claims}
+    return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
+
+
+@override_settings(REQUIRE_SERVICE_AUTH=True)
+class ServiceAuthTests(TestCase):
+    """With REQUIRE_SERVICE_AUTH on, the public API only answers calls carrying core's token"""
+
+    URL = '/public-api/tratamientos/active/?patient_id=7'
+
+    def test_calls_without_a_token_are_rejected(self):
+        response = APIClient().get(self.URL)
+
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_core_service_token_is_accepted(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {service_token()}")
+
+        self.assertEqual(client.get(self.URL).status_code, 200)
+
+    def test_token_acting_for_a_user_is_accepted(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {service_token(user_id=3, username='ana', groups=['Medico'])}")
+
+        self.assertEqual(client.get(self.URL).status_code, 200)
+
+    @override_settings(REQUIRE_SERVICE_AUTH=False)
+    def test_anonymous_calls_pass_until_the_flag_is_on(self):
+        self.assertEqual(APIClient().get(self.URL).status_code, 200)
+
+
+def core_answers(known):
+    """A bulk_basic response from core knowing only the given patient IDs"""
+    def post(url, json, headers, timeout):
+        response = mock.Mock()
+        response.json.return_value = {'results': {
+            str(pid): {'id': pid, 'nombre': f'Paciente {pid}'} for pid in json['patient_ids'] if pid in known
+        }}
+        return response
+    return post
+
+
+@override_settings(DOSSIER_NOTIFY={'enabled': False})
+class PatientResolutionTests(TestCase):
+    """A page of diagnoses resolves its patients with one request to core"""
+
+    def setUp(self):
+        patient_resolver.clear()
+        self.addCleanup(patient_resolver.clear)
+        for paciente_id in (1, 2, 3):
+            diagnostico = Diagnostico2.objects.create(
+                nombre='Epilepsia', fecha_realizacion=date(2024, 5, 1), paciente_id=paciente_id,
+                resultados_obtenidos='EEG', info_extra='',
+            )
+        Tratamiento2.objects.create(
+            nombre='Levetiracetam', diagnostico=diagnostico, paciente_id=4,
+            fecha_inicio=date(2024, 5, 1), fecha_fin=date(2024, 11, 1), indicaciones='500 mg',
+        )
+
+    def serialize(self):
+        queryset = Diagnostico2.objects.prefetch_related('tratamientos').order_by('paciente_id')
+        return Diagnostico2Serializer(queryset, many=True).data
+
+    def test_one_request_for_every_patient_on_the_page(self):
+        with mock.patch('diagnosticos2.patient_resolver.requests.post', side_effect=core_answers({1, 2, 4})) as post:
+            rows = self.serialize()
+
+        post.assert_called_once()
+        self.assertEqual(post.call_args.kwargs['json'], {'patient_ids': [1, 2, 3, 4]})
+        self.assertEqual([row.get('paciente_data', {}).get('nombre') for row in rows],
+                         ['Paciente 1', 'Paciente 2', None])
+        self.assertEqual(rows[2]['tratamientos'][0]['paciente_data']['nombre'], 'Paciente 4')
+
+    def test_known_and_unknown_patients_are_cached(self):
+        with mock.patch('diagnosticos2.patient_resolver.requests.post', side_effect=core_answers({1, 2, 4})) as post:
+            self.serialize()
+            self.serialize()
+
+        post.assert_called_once()
+
+
+class PatientResolverTests(SimpleTestCase):
+    """Batching and the cache rules while core is slow or down"""
+
+    def resolver(self, **config):
+        with override_settings(PATIENT_RESOLVER={'ttl': 300, 'negative_ttl': 60, 'stale_ttl': 3600, **config}):
+            return PatientResolver()
+
+    def test_large_pages_are_split_into_batches(self):
+        resolver = self.resolver()
+
+        with mock.patch('diagnosticos2.patient_resolver.requests.post', side_effect=core_answers(set())) as post:
+            resolver.prime(range(1, 1201))
+
+        self.assertEqual([len(c.kwargs['json']['patient_ids']) for c in post.call_args_list], [500, 500, 200])
+
+    def test_outage_serves_stale_data_and_asks_once(self):
+        resolver = self.resolver(ttl=0)
+        with mock.patch('diagnosticos2.patient_resolver.requests.post', side_effect=core_answers({1})):
+            resolver.prime([1])
+
+        failing = mock.patch('diagnosticos2.patient_resolver.requests.post',
+                             side_effect=requests.exceptions.ConnectionError('core down'))
+        with failing as post:
+            resolver.prime([1, 2])
+            self.assertEqual(resolver.get(1), {'id': 1, 'nombre': 'Paciente 1'})
+            self.assertIsNone(resolver.get(2))
+
+        # Both were answered from the cache after the single failed batch
+        post.assert_called_once()
+        self.assertEqual(resolver.stats['stale'], 1)
+        self.assertEqual(resolver.stats['errors'], 1)
+
+
+@override_settings(DOSSIER_NOTIFY={'enabled': False})
+class DiagnosisSearchTests(TestCase):
+    """Ranked full-text search on PostgreSQL, icontains elsewhere"""
+
+    URL = '/api/diagnosticos/search/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('medico'))
+        patcher = mock.patch('diagnosticos2.patient_resolver.requests.post', side_effect=core_answers({1}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patient_resolver.clear()
+        self.addCleanup(patient_resolver.clear)
+        self.en_nombre = self.diagnose('Epilepsia focal', 'EEG con actividad lenta')
+        self.en_resultados = self.diagnose('Cefalea', 'Descartar epilepsia tras EEG')
+        self.diagnose('Fractura de radio', 'Radiografía con trazo oblicuo')
+
+    def diagnose(self, nombre, resultados):
+        return Diagnostico2.objects.create(
+            nombre=nombre, fecha_realizacion=date(2024, 5, 1), paciente_id=1, paciente_nombre='Ana Gómez',
+            resultados_obtenidos=resultados, info_extra='',
+        )
+
+    def search(self, q):
+        return self.client.get(self.URL, {'q': q})
+
+    def test_name_matches_rank_above_result_matches(self):
+        response = self.search('epilepsia')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([item['id'] for item in results], [self.en_nombre.pk, self.en_resultados.pk])
+        self.assertGreater(results[0]['rank'], results[1]['rank'])
+        self.assertIn('<mark>', results[1]['resaltado'])
+
+    def test_queries_are_stemmed(self):
+        ids = [item['id'] for item in self.search('fracturas').data['results']]
+
+        self.assertEqual(ids, [Diagnostico2.objects.get(nombre='Fractura de radio').pk])
+
+    def test_other_backends_fall_back_to_icontains_newest_first(self):
+        with mock.patch('diagnosticos2.search.full_text_enabled', return_value=False):
+            results = self.search('pilep').data['results']
+
+        self.assertEqual([item['id'] for item in results], [self.en_resultados.pk, self.en_nombre.pk])
+        self.assertEqual({item['rank'] for item in results}, {None})
+        self.assertEqual({item['resaltado'] for item in results}, {None})
+
+    def test_query_is_required(self):
+        self.assertEqual(self.search('').status_code, 400)
+
+    def test_rebuild_fills_only_missing_vectors(self):
+        Diagnostico2.objects.filter(pk=self.en_nombre.pk).update(busqueda=None)
+        self.assertEqual([item['id'] for item in self.search('focal').data['results']], [])
+
+        call_command('rebuild_search_vectors', '--missing-only', stdout=io.StringIO())
+
+        self.assertEqual([item['id'] for item in self.search('focal').data['results']], [self.en_nombre.pk])
@@ -1,17 +1,34 @@
 """
 Database configuration for FastAPI Exams Service
 """
+import functools
+from typing import Any, Callable, TypeVar
+
+import anyio
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from .config import settings
 
+T = TypeVar("T")
+
+if settings.DATABASE_URL.startswith("sqlite"):
+    # SQLite stand-in: sessions are used from the DB worker threads
+    engine_options = {"connect_args": {"check_same_thread": False}}
+else:
+    engine_options = {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+
 # Create SQLAlchemy engine
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
     pool_recycle=300,
-    echo=settings.DEBUG
+    echo=settings.DEBUG,
+    **engine_options
 )
 
 # Create SessionLocal class
@@ -20,6 +37,16 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create Base class for models
 Base = declarative_base()
 
+# Bounds how many blocking DB calls run at once; created on first use
+# because anyio limiters must be built inside the running event loop
+_db_limiter = None
+
+def get_db_limiter() -> anyio.CapacityLimiter:
+    global _db_limiter
+    if _db_limiter is None:
+        _db_limiter = anyio.CapacityLimiter(settings.DB_THREAD_POOL_SIZE)
+    return _db_limiter
+
 def get_db():
     """
     Database dependency for FastAPI
@@ -29,3 +56,11 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Run blocking database work in the DB thread pool so the event loop keeps
+    serving other requests. Everything that touches the session, including
+    lazy-loaded relationships, must happen inside fn.
+    """
+    return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs), limiter=get_db_limiter())
@@ -1,7 +1,7 @@
 """
 SQLAlchemy models for Exams Service
 """
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..database import Base
@@ -29,6 +29,12 @@ class Exam(Base):
     # Relationships
     files = relationship("ExamFile", back_populates="exam", cascade="all, delete-orphan")
 
+    # Keyset pagination order (exam_date, id), overall and per patient
+    __table_args__ = (
+        Index("ix_exams_exam_date_id", "exam_date", "id"),
+        Index("ix_exams_patient_exam_date_id", "patient_id", "exam_date", "id"),
+    )
+
 class ExamType(Base):
     __tablename__ = "exam_types"
 
@@ -2,7 +2,7 @@
 Pydantic schemas for Exams Service
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime, date
 from enum import Enum
 
@@ -252,11 +252,24 @@ class ExamListResponse(BaseModel):
     count: int
     next: Optional[str] = None
     previous: Optional[str] = None
+    count_is_estimate: bool = False
 
 class ExamResponse(ExamCompatible):
     """Single exam response"""
     pass
 
+class ExamBatchRequest(BaseModel):
+    """Patient IDs for a multi-patient exam lookup"""
+    patient_ids: List[int] = Field(..., max_length=500)
+
+class ExamBatchResponse(BaseModel):
+    """Exams grouped by patient ID"""
+    results: Dict[int, List[ExamCompatible]]
+
+class ExamCountsResponse(BaseModel):
+    """Number of exams per patient ID"""
+    results: Dict[int, int]
+
 class FileUploadResponse(BaseModel):
     file_id: int
     file_name: str
@@ -278,6 +291,7 @@ class ExamListResponse(BaseModel):
     count: int
     next: Optional[str] = None
     previous: Optional[str] = None
+    count_is_estimate: bool = False
 
 class ExamResponse(ExamCompatible):
     """Single exam response"""
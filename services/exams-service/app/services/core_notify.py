@@ -0,0 +1,45 @@
+"""
+Tells core that a patient's exams changed, so it drops its cached dossier
+sections and refreshes the critical-info projection
+(POST /health/api/patient/<id>/dossier/invalidate/).
+
+Endpoints schedule it as a background task, after the response is sent:
+core reads this service back while handling it. A lost notification is
+logged; core's section TTLs bound how long it serves the old records.
+"""
+import logging
+import time
+
+import httpx
+from jose import jwt
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+# Dossier section owned by this service
+SECTION = "examenes"
+
+
+def _service_token() -> str:
+    """Short-lived token core accepts as a call from this service"""
+    now = int(time.time())
+    payload = {"service": "exams-service", "iat": now, "exp": now + 300}
+    return jwt.encode(payload, settings.JWT_SECRET_KEY, algorithm="HS256")
+
+
+def notify_patient_changed(patient_id: int) -> None:
+    """Blocking; FastAPI runs sync background tasks in its thread pool"""
+    if not settings.DOSSIER_NOTIFY_ENABLED:
+        return
+    url = f"{settings.CORE_SERVICE_URL.rstrip('/')}/health/api/patient/{patient_id}/dossier/invalidate/"
+    try:
+        response = httpx.post(
+            url,
+            json={"sections": [SECTION]},
+            headers={"Authorization": f"Bearer {_service_token()}"},
+            timeout=settings.DOSSIER_NOTIFY_TIMEOUT,
+        )
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.warning(f"Could not notify core of changes for patient {patient_id}: {e}")
@@ -1,12 +1,17 @@
 """
 Exam Service - Business logic for exam management
 """
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List, Optional
+from sqlalchemy.orm import Session, load_only, noload, selectinload
+from sqlalchemy import func, insert, text, tuple_
+from sqlalchemy.dialects import postgresql
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
+import base64
+import binascii
+import json
 import logging
 
+from ..config import settings
 from ..models.exam_models import Exam, ExamFile, ExamType, ExamResult, ExamAppointment
 from ..schemas.exam_schemas import (
     ExamCreate, ExamUpdate, ExamFileCreate,
@@ -18,6 +23,21 @@ from ..schemas.exam_schemas import (
 
 logger = logging.getLogger(__name__)
 
+# Exam columns read by exam_to_compatible_response; read paths load only these
+RESPONSE_COLUMNS = (
+    Exam.id, Exam.exam_name, Exam.patient_id, Exam.description, Exam.exam_type,
+    Exam.exam_date, Exam.results, Exam.notes, Exam.created_at,
+)
+
+def response_options(include_files: bool = True) -> tuple:
+    """
+    Loader options for exams that are only turned into responses: the
+    response columns, plus every file of the page in one extra SELECT ... IN
+    query (or none at all when include_files is False).
+    """
+    files = selectinload(Exam.files) if include_files else noload(Exam.files)
+    return (load_only(*RESPONSE_COLUMNS), files)
+
 def exam_to_compatible_response(exam: Exam) -> dict:
     """Convert SQLAlchemy Exam model to Django-compatible response"""
     return {
@@ -53,10 +73,11 @@ def get_exams(
     skip: int = 0,
     limit: int = 100,
     patient_id: Optional[int] = None,
-    status: Optional[str] = None
+    status: Optional[str] = None,
+    include_files: bool = True
 ) -> List[Exam]:
     """Get list of exams with optional filtering"""
-    query = db.query(Exam)
+    query = db.query(Exam).options(*response_options(include_files))
     
     if patient_id:
         query = query.filter(Exam.patient_id == patient_id)
@@ -66,26 +87,181 @@ def get_exams(
     
     return query.offset(skip).limit(limit).all()
 
+class InvalidCursor(ValueError):
+    """A listing cursor that was not produced by encode_cursor"""
+
+def encode_cursor(exam_date: datetime, exam_id: int, reverse: bool = False) -> str:
+    """Encode a keyset position (exam_date, id) as an opaque cursor"""
+    raw = json.dumps({"d": exam_date.isoformat(), "id": exam_id, "r": reverse}).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int, bool]:
+    """Decode a cursor into (exam_date, exam_id, reverse). Raises InvalidCursor if malformed"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(data["d"]), int(data["id"]), bool(data.get("r", False))
+    except (TypeError, KeyError, ValueError, binascii.Error) as e:
+        # ValueError also covers JSONDecodeError, UnicodeDecodeError and bad dates or ids
+        raise InvalidCursor("Invalid cursor") from e
+
+def _filter_exams(query, patient_id: Optional[int] = None, status: Optional[str] = None):
+    """Apply the list filters shared by pages and counts"""
+    if patient_id:
+        query = query.filter(Exam.patient_id == patient_id)
+
+    if status:
+        query = query.filter(Exam.status == status)
+
+    return query
+
+def get_exams_page(
+    db: Session,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    patient_id: Optional[int] = None,
+    status: Optional[str] = None,
+    include_files: bool = True
+) -> Tuple[List[Exam], Optional[str], Optional[str]]:
+    """
+    Get one page of exams, newest first, using keyset pagination on
+    (exam_date, id). Every page is a range scan of the matching index, so
+    deep pages cost the same as the first. Returns the exams and the next
+    and previous cursors.
+    """
+    query = _filter_exams(
+        db.query(Exam).options(*response_options(include_files)), patient_id, status
+    )
+    position = tuple_(Exam.exam_date, Exam.id)
+
+    exam_date, exam_id, reverse = decode_cursor(cursor) if cursor else (None, None, False)
+    if reverse:
+        # Walking back towards newer exams: read ascending and flip
+        query = query.filter(position > tuple_(exam_date, exam_id))
+        query = query.order_by(Exam.exam_date.asc(), Exam.id.asc())
+    else:
+        if exam_id is not None:
+            query = query.filter(position < tuple_(exam_date, exam_id))
+        query = query.order_by(Exam.exam_date.desc(), Exam.id.desc())
+
+    exams = query.limit(limit + 1).all()
+    has_more = len(exams) > limit
+    exams = exams[:limit]
+    if reverse:
+        exams.reverse()
+
+    if not exams:
+        return exams, None, None
+    first, last = exams[0], exams[-1]
+    if reverse:
+        next_cursor = encode_cursor(last.exam_date, last.id)
+        previous_cursor = encode_cursor(first.exam_date, first.id, reverse=True) if has_more else None
+    else:
+        next_cursor = encode_cursor(last.exam_date, last.id) if has_more else None
+        previous_cursor = (
+            encode_cursor(first.exam_date, first.id, reverse=True) if exam_id is not None else None
+        )
+    return exams, next_cursor, previous_cursor
+
+def get_exams_by_patients(
+    db: Session,
+    patient_ids: List[int],
+    include_files: bool = True
+) -> Dict[int, List[Exam]]:
+    """Get exams for several patients in one query, grouped by patient ID"""
+    grouped = {patient_id: [] for patient_id in patient_ids}
+    if not patient_ids:
+        return grouped
+
+    exams = (
+        db.query(Exam)
+        .options(*response_options(include_files))
+        .filter(Exam.patient_id.in_(patient_ids))
+        .order_by(Exam.patient_id, Exam.exam_date.desc())
+        .all()
+    )
+    for exam in exams:
+        grouped[exam.patient_id].append(exam)
+    return grouped
+
+def count_exams_by_patients(db: Session, patient_ids: List[int]) -> Dict[int, int]:
+    """Count exams for several patients with one GROUP BY, zero for patients without exams"""
+    counts = dict.fromkeys(patient_ids, 0)
+    if not patient_ids:
+        return counts
+
+    rows = (
+        db.query(Exam.patient_id, func.count(Exam.id))
+        .filter(Exam.patient_id.in_(patient_ids))
+        .group_by(Exam.patient_id)
+        .all()
+    )
+    counts.update(rows)
+    return counts
+
+def get_abnormal_exams(
+    db: Session,
+    patient_id: int,
+    limit: int = 5,
+    include_files: bool = True
+) -> List[Exam]:
+    """Get a patient's most recent exams with an abnormal result"""
+    abnormal = db.query(ExamResult.exam_id).filter(ExamResult.result_type == "abnormal")
+    return (
+        db.query(Exam)
+        .options(*response_options(include_files))
+        .filter(Exam.patient_id == patient_id, Exam.id.in_(abnormal))
+        .order_by(Exam.exam_date.desc())
+        .limit(limit)
+        .all()
+    )
+
 def get_exams_count(
     db: Session,
     patient_id: Optional[int] = None,
     status: Optional[str] = None
 ) -> int:
     """Get total count of exams with optional filtering"""
-    query = db.query(func.count(Exam.id))
-    
-    if patient_id:
-        query = query.filter(Exam.patient_id == patient_id)
-    
-    if status:
-        query = query.filter(Exam.status == status)
-    
-    return query.scalar()
+    return _filter_exams(db.query(func.count(Exam.id)), patient_id, status).scalar()
+
+def estimate_exams_count(
+    db: Session,
+    patient_id: Optional[int] = None,
+    status: Optional[str] = None
+) -> Tuple[int, bool]:
+    """
+    Count of exams with optional filtering, and whether it is an estimate.
+    On PostgreSQL the number comes from the planner's row estimate for the
+    same filters, which costs an EXPLAIN instead of a scan. Estimates below
+    EXACT_COUNT_THRESHOLD are replaced by an exact count, cheap at that
+    size; other databases always count exactly.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return get_exams_count(db, patient_id=patient_id, status=status), False
+
+    statement = _filter_exams(db.query(Exam.id), patient_id, status).statement
+    sql = statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    estimate = int(plan[0]["Plan"]["Plan Rows"])
+
+    if estimate < settings.EXACT_COUNT_THRESHOLD:
+        return get_exams_count(db, patient_id=patient_id, status=status), False
+    return estimate, True
 
 def get_exam_by_id(db: Session, exam_id: int) -> Optional[Exam]:
     """Get exam by ID"""
     return db.query(Exam).filter(Exam.id == exam_id).first()
 
+def get_exam_detail(db: Session, exam_id: int, include_files: bool = True) -> Optional[Exam]:
+    """Get exam by ID with only what its response needs loaded"""
+    return (
+        db.query(Exam)
+        .options(*response_options(include_files))
+        .filter(Exam.id == exam_id)
+        .first()
+    )
+
 def create_exam(db: Session, exam_data: ExamCreate) -> Exam:
     """Create a new exam"""
     db_exam = Exam(
@@ -200,6 +376,44 @@ def create_exam_file(
     logger.info(f"Created file record {db_file.id} for exam {exam_id}")
     return db_file
 
+def create_exam_files(
+    db: Session,
+    exam_id: int,
+    files: List[dict],
+    uploaded_by: int
+) -> int:
+    """
+    Create the records of several uploaded files with one INSERT and one
+    commit. Each item has filename, file_url, file_size and content_type.
+    Rolls back and re-raises if the insert fails.
+    """
+    if not files:
+        return 0
+
+    rows = [
+        {
+            "exam_id": exam_id,
+            "file_name": f["filename"],
+            "original_name": f["filename"],
+            "file_type": f["content_type"],
+            "file_size": f["file_size"],
+            "gcs_path": f["file_url"],
+            "uploaded_by": uploaded_by,
+            "description": f.get("description"),
+            "is_result": f.get("is_result", False),
+        }
+        for f in files
+    ]
+    try:
+        db.execute(insert(ExamFile), rows)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    logger.info(f"Created {len(rows)} file records for exam {exam_id}")
+    return len(rows)
+
 def get_exam_file_by_id(db: Session, file_id: int) -> Optional[ExamFile]:
     """Get exam file by ID"""
     return db.query(ExamFile).filter(ExamFile.id == file_id).first()
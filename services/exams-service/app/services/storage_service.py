@@ -1,16 +1,20 @@
 """
 Google Cloud Storage Service for file uploads
 """
+import asyncio
+import functools
 import os
 import uuid
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional, Tuple
 import logging
+import anyio
 from fastapi import UploadFile, HTTPException
 from google.cloud import storage
 from google.cloud.exceptions import GoogleCloudError
 
 from ..config import settings
+from .upload_stream import ChecksumMismatch, UploadTooLarge, stream_to_blob
 
 logger = logging.getLogger(__name__)
 
@@ -46,7 +50,8 @@ class CloudStorageService:
         if not file.filename:
             raise HTTPException(status_code=400, detail="No file selected")
         
-        if file.size > settings.MAX_FILE_SIZE:
+        # size is unknown for some clients; the stream enforces the limit too
+        if file.size is not None and file.size > settings.MAX_FILE_SIZE:
             raise HTTPException(
                 status_code=400,
                 detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE} bytes"
@@ -77,6 +82,55 @@ class CloudStorageService:
         Upload file to Google Cloud Storage
         Returns the GCS path of the uploaded file
         """
+        gcs_path, _ = await self._upload_exam_file(file, exam_id, patient_id, description)
+        return gcs_path
+
+    async def upload_exam_files(
+        self,
+        files: List[UploadFile],
+        exam_id: int,
+        patient_id: int
+    ) -> List[Tuple[str, int]]:
+        """
+        Upload several files concurrently, at most UPLOAD_CONCURRENCY at once
+        Returns (GCS path, size in bytes) per file, in the order given
+
+        Every file is validated before any is sent. If one upload fails, the
+        ones that succeeded are deleted before the error is raised.
+        """
+        for file in files:
+            self._validate_file(file)
+
+        semaphore = asyncio.Semaphore(settings.UPLOAD_CONCURRENCY)
+
+        async def upload(file):
+            async with semaphore:
+                return await self._upload_exam_file(file, exam_id, patient_id)
+
+        outcomes = await asyncio.gather(*(upload(file) for file in files), return_exceptions=True)
+        failures = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        if failures:
+            await self.discard_exam_files(
+                [outcome[0] for outcome in outcomes if not isinstance(outcome, BaseException)]
+            )
+            raise failures[0]
+        return outcomes
+
+    async def _upload_exam_file(
+        self,
+        file: UploadFile,
+        exam_id: int,
+        patient_id: int,
+        description: Optional[str] = None
+    ) -> Tuple[str, int]:
+        """
+        Upload file to Google Cloud Storage
+        Returns the GCS path of the uploaded file and its size in bytes
+
+        The file is streamed in UPLOAD_CHUNK_SIZE chunks through a resumable
+        session in a worker thread, so the event loop keeps serving other
+        requests and memory per upload stays one chunk.
+        """
         try:
             # Validate file
             self._validate_file(file)
@@ -97,19 +151,34 @@ class CloudStorageService:
                 "description": description or ""
             }
             
-            # Upload file content
-            file_content = await file.read()
-            blob.upload_from_string(
-                file_content,
-                content_type=file.content_type
-            )
+            # Stream file content from the spooled upload, off the event loop
+            await file.seek(0)
+            size, _ = await anyio.to_thread.run_sync(functools.partial(
+                stream_to_blob,
+                blob,
+                file.file,
+                content_type=file.content_type,
+                chunk_size=settings.UPLOAD_CHUNK_SIZE,
+                max_size=settings.MAX_FILE_SIZE
+            ))
             
             # Make blob publicly readable (optional, depends on requirements)
             # blob.make_public()
             
-            logger.info(f"Uploaded file to GCS: {file_path}")
-            return f"gs://{self.bucket_name}/{file_path}"
+            logger.info(f"Uploaded file to GCS: {file_path} ({size} bytes)")
+            return f"gs://{self.bucket_name}/{file_path}", size
             
+        except HTTPException:
+            raise
+        except UploadTooLarge:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE} bytes"
+            )
+        except ChecksumMismatch as e:
+            logger.error(f"GCS upload checksum error: {e}")
+            await anyio.to_thread.run_sync(self._discard_blob, blob)
+            raise HTTPException(status_code=500, detail="File upload failed")
         except GoogleCloudError as e:
             logger.error(f"GCS upload error: {e}")
             raise HTTPException(status_code=500, detail="File upload failed")
@@ -117,6 +186,31 @@ class CloudStorageService:
             logger.error(f"Unexpected error during file upload: {e}")
             raise HTTPException(status_code=500, detail="File upload failed")
 
+    def _discard_blob(self, blob) -> None:
+        """Best-effort removal of an object whose upload did not verify"""
+        try:
+            blob.delete()
+        except Exception as e:
+            logger.warning(f"Could not remove unverified upload {blob.name}: {e}")
+
+    def _blob_for_path(self, gcs_path: str):
+        """Blob for a gs:// path in this bucket, or a bare object name"""
+        prefix = f"gs://{self.bucket_name}/"
+        return self.bucket.blob(gcs_path[len(prefix):] if gcs_path.startswith(prefix) else gcs_path)
+
+    async def discard_exam_files(self, gcs_paths: List[str]) -> None:
+        """
+        Best-effort concurrent removal of uploaded objects whose exam file
+        records were never written; failures are logged, not raised
+        """
+        if not gcs_paths:
+            return
+        logger.warning(f"Removing {len(gcs_paths)} uploaded files without records")
+        await asyncio.gather(*(
+            anyio.to_thread.run_sync(self._discard_blob, self._blob_for_path(gcs_path))
+            for gcs_path in gcs_paths
+        ))
+
     async def delete_exam_file(self, gcs_path: str) -> bool:
         """Delete file from Google Cloud Storage"""
         try:
@@ -0,0 +1,76 @@
+"""
+Streaming uploads for CloudStorageService.
+
+The upload source is read in UPLOAD_CHUNK_SIZE pieces through a resumable
+upload session. Each piece is hashed and counted as it passes, so memory
+per upload stays one chunk whatever the file size, oversized files are
+rejected without being buffered, and the stored object can be checked
+against the bytes that were actually sent.
+"""
+import base64
+import hashlib
+from typing import BinaryIO, Tuple
+
+
+class UploadTooLarge(Exception):
+    """The source stream exceeded the allowed upload size"""
+
+
+class ChecksumMismatch(Exception):
+    """The stored object does not match the bytes that were sent"""
+
+
+class ChecksumReader:
+    """
+    Read-only file wrapper that hashes and counts bytes as they are read.
+    The uploader seeks back to resend a chunk after a transient error; bytes
+    already hashed are not hashed again.
+    """
+
+    def __init__(self, source: BinaryIO, max_size: int):
+        self.source = source
+        self.max_size = max_size
+        self.position = 0
+        self.size = 0
+        self._md5 = hashlib.md5()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.source.read(size)
+        start = self.position
+        self.position += len(data)
+        if self.position > self.max_size:
+            raise UploadTooLarge(f"Upload exceeds {self.max_size} bytes")
+        if self.position > self.size:
+            self._md5.update(data[self.size - start:])
+            self.size = self.position
+        return data
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        self.position = self.source.seek(offset, whence)
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+    @property
+    def md5_base64(self) -> str:
+        """Digest in the base64 form GCS reports as md5Hash"""
+        return base64.b64encode(self._md5.digest()).decode()
+
+
+def stream_to_blob(blob, source: BinaryIO, content_type: str, chunk_size: int,
+                   max_size: int) -> Tuple[int, str]:
+    """
+    Upload source to blob through a resumable session, chunk_size bytes at
+    a time. Blocking: run it in a worker thread. Returns the number of bytes
+    uploaded and their base64 MD5. source must be positioned at its start.
+    """
+    reader = ChecksumReader(source, max_size)
+    blob.chunk_size = chunk_size
+    # size=None forces the resumable path, which reads one chunk at a time;
+    # a known size below the multipart threshold would read it all at once
+    blob.upload_from_file(reader, size=None, content_type=content_type, rewind=False)
+
+    if blob.md5_hash and blob.md5_hash != reader.md5_base64:
+        raise ChecksumMismatch(f"MD5 mismatch for {blob.name}")
+    return reader.size, reader.md5_base64
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Concurrency benchmark for the exams service DB path.
+
+Runs the app against a throwaway SQLite database, adds a fixed latency to
+every SQL statement to stand in for a network round trip to PostgreSQL,
+and measures requests per second on GET /api/examenes/ as the number of
+in-flight requests grows. The same load is also run through the old
+pattern (sync session calls made directly on the event loop) for contrast.
+
+    python benchmark_concurrency.py --latency-ms 5 --requests 400
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--latency-ms", type=float, default=5.0, help="Latency added to every SQL statement")
+parser.add_argument("--requests", type=int, default=400, help="Requests per concurrency level")
+parser.add_argument("--levels", default="1,4,16,64", help="Comma-separated in-flight request counts")
+args = parser.parse_args()
+
+# Must be set before the app modules read their settings
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/benchmark.db"
+
+import httpx  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.models.exam_models import Exam  # noqa: E402
+from app.services import exam_service  # noqa: E402
+from main import app  # noqa: E402
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _simulated_round_trip(conn, cursor, statement, parameters, context, executemany):
+    time.sleep(args.latency_ms / 1000)
+
+
+def seed(count=200):
+    db = SessionLocal()
+    db.add_all([
+        Exam(patient_id=i % 20 + 1, doctor_id=1, exam_type="eeg", exam_name=f"Examen {i}",
+             exam_date=datetime.utcnow(), created_by=1)
+        for i in range(count)
+    ])
+    db.commit()
+    db.close()
+
+
+async def legacy_handler():
+    """The previous endpoint body: sync session calls made on the event loop"""
+    db = SessionLocal()
+    try:
+        exams, _, _ = exam_service.get_exams_page(db=db, limit=20)
+        exam_service.get_exams_count(db=db)
+        return [exam_service.exam_to_compatible_response(exam) for exam in exams]
+    finally:
+        db.close()
+
+
+async def run_level(make_call, concurrency, total):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await make_call()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def main():
+    seed()
+    levels = [int(level) for level in args.levels.split(",")]
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://exams") as client:
+        async def offloaded_call():
+            response = await client.get("/api/examenes/", params={"limit": 20})
+            response.raise_for_status()
+
+        print(f"{'in-flight':>9}  {'event-loop DB (req/s)':>22}  {'thread-pool DB (req/s)':>23}")
+        for level in levels:
+            legacy = await run_level(legacy_handler, level, args.requests)
+            offloaded = await run_level(offloaded_call, level, args.requests)
+            print(f"{level:>9}  {legacy:>22.1f}  {offloaded:>23.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Query count and latency of the exam list path at a given page size.
+
+Seeds a throwaway SQLite database with exams that have a few files each,
+then builds one page of responses three ways:
+
+- legacy: plain query, files lazy-loaded per exam (the old behaviour);
+- eager:  response columns only, files loaded with one SELECT ... IN;
+- no files: include_files=False, the files table is not queried.
+
+    python benchmark_exam_listing.py --page-sizes 100,1000 --files-per-exam 3
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--page-sizes", default="100,1000", help="Comma-separated page sizes")
+parser.add_argument("--files-per-exam", type=int, default=3)
+parser.add_argument("--repeat", type=int, default=20, help="Timed runs per scenario")
+args = parser.parse_args()
+
+# Must be set before the app modules read their settings
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/benchmark.db"
+
+from sqlalchemy import event  # noqa: E402
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.exam_models import Exam, ExamFile  # noqa: E402
+from app.services import exam_service  # noqa: E402
+
+statements = 0
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    global statements
+    statements += 1
+
+
+def seed(count):
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    for i in range(count):
+        exam = Exam(patient_id=i % 50 + 1, doctor_id=1, exam_type="laboratorio",
+                    exam_name=f"Examen {i}", description="Control", exam_date=datetime.utcnow(),
+                    created_by=1)
+        exam.files = [
+            ExamFile(file_name=f"{i}-{n}.pdf", original_name=f"{n}.pdf", file_type="application/pdf",
+                     file_size=1024, gcs_path=f"exams/{i}/{n}.pdf", uploaded_by=1)
+            for n in range(args.files_per_exam)
+        ]
+        db.add(exam)
+    db.commit()
+    db.close()
+
+
+def legacy_page(db, limit):
+    exams = db.query(Exam).order_by(Exam.id.desc()).limit(limit).all()
+    return [exam_service.exam_to_compatible_response(exam) for exam in exams]
+
+
+def current_page(db, limit, include_files):
+    exams, _, _ = exam_service.get_exams_page(db=db, limit=limit, include_files=include_files)
+    return [exam_service.exam_to_compatible_response(exam) for exam in exams]
+
+
+def measure(build, limit):
+    global statements
+    timings, queries = [], 0
+    for _ in range(args.repeat):
+        db = SessionLocal()
+        statements = 0
+        start = time.perf_counter()
+        build(db, limit)
+        timings.append((time.perf_counter() - start) * 1000)
+        queries = statements
+        db.close()
+    return statistics.median(timings), queries
+
+
+def main():
+    page_sizes = [int(size) for size in args.page_sizes.split(",")]
+    seed(max(page_sizes))
+    scenarios = [
+        ("legacy", legacy_page),
+        ("eager", lambda db, limit: current_page(db, limit, True)),
+        ("no files", lambda db, limit: current_page(db, limit, False)),
+    ]
+    print(f"{'page size':>9}  {'scenario':<9}  {'queries':>7}  {'median ms':>9}")
+    for limit in page_sizes:
+        for name, build in scenarios:
+            median_ms, queries = measure(build, limit)
+            print(f"{limit:>9}  {name:<9}  {queries:>7}  {median_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
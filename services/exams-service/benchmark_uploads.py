@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Memory and throughput of exam file uploads against a local stand-in bucket.
+
+LocalBlob mimics the google-cloud-storage Blob calls the service makes:
+upload_from_string takes the whole payload, upload_from_file reads
+chunk_size bytes at a time like a resumable session. Objects are written
+to a temporary directory with a simulated per-request latency.
+
+- legacy:   await file.read() then upload_from_string on the event loop;
+- streamed: upload_stream.stream_to_blob in a worker thread.
+
+    python benchmark_uploads.py --size-mb 10 --uploads 16 --concurrency 8
+"""
+import argparse
+import asyncio
+import base64
+import functools
+import hashlib
+import os
+import tempfile
+import time
+import tracemalloc
+
+import anyio
+from starlette.datastructures import UploadFile
+
+from app.services.upload_stream import stream_to_blob
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--size-mb", type=float, default=10.0, help="Size of each uploaded file")
+parser.add_argument("--uploads", type=int, default=16, help="Uploads per scenario")
+parser.add_argument("--concurrency", type=int, default=8, help="Uploads in flight")
+parser.add_argument("--chunk-kb", type=int, default=1024, help="Resumable chunk size (multiple of 256)")
+parser.add_argument("--latency-ms", type=float, default=20.0, help="Simulated latency per storage request")
+args = parser.parse_args()
+
+ROOT = tempfile.mkdtemp()
+
+
+class LocalBlob:
+    """Stand-in for google.cloud.storage.Blob backed by a local file"""
+
+    def __init__(self, name):
+        self.name = name
+        self.chunk_size = None
+        self.md5_hash = None
+
+    def _path(self):
+        return os.path.join(ROOT, self.name)
+
+    def upload_from_string(self, data, content_type=None):
+        time.sleep(args.latency_ms / 1000)
+        with open(self._path(), "wb") as target:
+            target.write(data)
+        self.md5_hash = base64.b64encode(hashlib.md5(data).digest()).decode()
+
+    def upload_from_file(self, file_obj, size=None, content_type=None, rewind=False):
+        digest = hashlib.md5()
+        with open(self._path(), "wb") as target:
+            while True:
+                # One request per chunk, as in a resumable session
+                time.sleep(args.latency_ms / 1000)
+                chunk = file_obj.read(self.chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                target.write(chunk)
+        self.md5_hash = base64.b64encode(digest.digest()).decode()
+
+
+def make_upload(payload):
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(payload)
+    spooled.seek(0)
+    return UploadFile(file=spooled, filename="scan.dcm", size=len(payload))
+
+
+async def legacy_upload(file, index):
+    blob = LocalBlob(f"legacy-{index}")
+    blob.upload_from_string(await file.read(), content_type="application/dicom")
+
+
+async def streamed_upload(file, index):
+    blob = LocalBlob(f"streamed-{index}")
+    await file.seek(0)
+    await anyio.to_thread.run_sync(functools.partial(
+        stream_to_blob, blob, file.file, content_type="application/dicom",
+        chunk_size=args.chunk_kb * 1024, max_size=len(payload) + 1
+    ))
+
+
+async def ticker(stop):
+    """Worst gap between event-loop ticks while uploads run"""
+    worst, last = 0.0, time.perf_counter()
+    while not stop.is_set():
+        await asyncio.sleep(0.001)
+        now = time.perf_counter()
+        worst, last = max(worst, now - last), now
+    return worst
+
+
+async def run(upload):
+    files = [make_upload(payload) for _ in range(args.uploads)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(index):
+        async with semaphore:
+            await upload(files[index], index)
+
+    stop = asyncio.Event()
+    tick = asyncio.create_task(ticker(stop))
+    tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(args.uploads)))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    stop.set()
+    stall = await tick
+    for file in files:
+        await file.close()
+    return peak, elapsed, stall
+
+
+payload = os.urandom(int(args.size_mb * 1024 * 1024))
+
+
+async def main():
+    total_mb = args.size_mb * args.uploads
+    print(f"{args.uploads} uploads of {args.size_mb} MB, {args.concurrency} in flight")
+    print(f"{'scenario':<9}  {'peak MB':>8}  {'MB/s':>7}  {'worst loop stall ms':>19}")
+    for name, upload in (("legacy", legacy_upload), ("streamed", streamed_upload)):
+        peak, elapsed, stall = await run(upload)
+        print(f"{name:<9}  {peak / 1048576:>8.1f}  {total_mb / elapsed:>7.1f}  {stall * 1000:>19.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -23,6 +23,10 @@ def init_db():
         logger.info("Creating database tables...")
         Base.metadata.create_all(bind=engine)
 
+        # create_all skips existing tables; add indexes introduced since
+        for index in exam_models.Exam.__table__.indexes:
+            index.create(bind=engine, checkfirst=True)
+
         # Create session
         SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
         db = SessionLocal()
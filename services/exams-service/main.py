@@ -3,20 +3,22 @@ FastAPI Exams Service
 Medical System - Microservice for handling medical exams with file uploads
 """
 
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, status
-from fastapi.responses import JSONResponse
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Depends, UploadFile, File, Form, Query, Request, status
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import List, Optional
 import os
+import hashlib
 import logging
 from datetime import datetime, date
 
-from app.database import get_db, engine
+from app.database import get_db, engine, run_db
 from app.models import exam_models
 from app.schemas import exam_schemas
-from app.services import exam_service, storage_service
+from app.services import core_notify, exam_service
+from app.services.storage_service import storage_service
 from app.config import settings
 
 # Configure logging
@@ -44,15 +46,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    """
+    Tag successful JSON GET responses with a content-hash ETag and answer a
+    matching If-None-Match with 304, so clients revalidating unchanged data
+    skip the body transfer and JSON parse.
+    """
+    response = await call_next(request)
+    if (request.method != "GET" or response.status_code != 200
+            or not response.headers.get("content-type", "").startswith("application/json")):
+        return response
+
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    headers.update({"ETag": etag, "Cache-Control": "no-cache"})
+    return Response(content=body, status_code=200, headers=headers, media_type=response.media_type)
+
+def _ping_database():
+    db = next(get_db())
+    try:
+        db.execute(text("SELECT 1"))
+    finally:
+        db.close()
+
 # Health check endpoints
 @app.get("/health/ready", tags=["Health"])
 async def readiness_check():
     """Check if the service is ready to handle requests"""
     try:
         # Test database connection
-        db = next(get_db())
-        db.execute(text("SELECT 1"))
-        db.close()
+        await run_db(_ping_database)
 
         # Test Google Cloud Storage connection (optional for local testing)
         try:
@@ -80,72 +109,209 @@ async def liveness_check():
     """Check if the service is alive"""
     return {"status": "alive", "timestamp": datetime.utcnow().isoformat()}
 
+def _page_url(request: Request, cursor: Optional[str]) -> Optional[str]:
+    """Absolute URL of the same listing at another cursor position"""
+    if cursor is None:
+        return None
+    return str(request.url.include_query_params(cursor=cursor))
+
+def _load_exams_page(db: Session, limit: int, cursor: Optional[str], patient_id: Optional[int],
+                     include_files: bool = True, exact_count: bool = False):
+    """
+    One page of exams as response dicts, plus the total, whether the total
+    is an estimate, and the cursors (runs in the DB pool)
+    """
+    exams, next_cursor, previous_cursor = exam_service.get_exams_page(
+        db=db,
+        limit=limit,
+        cursor=cursor,
+        patient_id=patient_id,
+        include_files=include_files
+    )
+    if exact_count:
+        total, estimated = exam_service.get_exams_count(db=db, patient_id=patient_id), False
+    else:
+        total, estimated = exam_service.estimate_exams_count(db=db, patient_id=patient_id)
+    results = [exam_service.exam_to_compatible_response(exam) for exam in exams]
+    return results, total, estimated, next_cursor, previous_cursor
+
+def _load_exam_response(db: Session, exam_id: int, include_files: bool = True) -> Optional[dict]:
+    """Response dict for one exam, or None (runs in the DB pool)"""
+    exam = exam_service.get_exam_detail(db=db, exam_id=exam_id, include_files=include_files)
+    return exam_service.exam_to_compatible_response(exam) if exam else None
+
 # Public API endpoints (for microservice communication)
 @app.get("/public-api/examenes/", response_model=exam_schemas.ExamListResponse, tags=["Public API"])
 async def get_examenes_public(
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
     patient_id: Optional[int] = None,
+    include_files: bool = True,
+    exact_count: bool = False,
     db: Session = Depends(get_db)
 ):
     """Get list of exams - public endpoint for microservice communication"""
+    # Reject a malformed cursor before any database work; nothing else maps to 400 here
     try:
-        exams = exam_service.get_exams(
-            db=db,
-            skip=skip,
-            limit=limit,
-            patient_id=patient_id
+        if cursor:
+            exam_service.decode_cursor(cursor)
+    except exam_service.InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    try:
+        results, total, estimated, next_cursor, previous_cursor = await run_db(
+            _load_exams_page, db, limit, cursor, patient_id, include_files, exact_count
         )
-        total = exam_service.get_exams_count(db=db, patient_id=patient_id)
 
         return exam_schemas.ExamListResponse(
-            results=[exam_service.exam_to_compatible_response(exam) for exam in exams],
+            results=results,
             count=total,
-            next=None,
-            previous=None
+            count_is_estimate=estimated,
+            next=_page_url(request, next_cursor),
+            previous=_page_url(request, previous_cursor)
         )
     except Exception as e:
         logger.error(f"Error getting exams: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@app.post("/public-api/examenes/batch", response_model=exam_schemas.ExamBatchResponse, tags=["Public API"])
+async def get_examenes_batch_public(
+    batch: exam_schemas.ExamBatchRequest,
+    include_files: bool = True,
+    db: Session = Depends(get_db)
+):
+    """Get exams for several patients at once, grouped by patient - public endpoint for microservice communication"""
+    try:
+        def load():
+            grouped = exam_service.get_exams_by_patients(
+                db=db, patient_ids=batch.patient_ids, include_files=include_files
+            )
+            return {
+                patient_id: [exam_service.exam_to_compatible_response(exam) for exam in exams]
+                for patient_id, exams in grouped.items()
+            }
+
+        return exam_schemas.ExamBatchResponse(results=await run_db(load))
+    except Exception as e:
+        logger.error(f"Error getting exams batch: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.get("/public-api/examenes/counts", response_model=exam_schemas.ExamCountsResponse, tags=["Public API"])
+async def get_examenes_counts_public(
+    patient_ids: str = "",
+    db: Session = Depends(get_db)
+):
+    """Count exams for several patients (?patient_ids=1,2,3) - public endpoint for microservice communication"""
+    try:
+        ids = [int(value) for value in patient_ids.split(",") if value.strip()]
+    except ValueError:
+        ids = None
+    if ids is None or len(ids) > 500:
+        raise HTTPException(status_code=400, detail="patient_ids must be a comma-separated list of at most 500 IDs")
+
+    try:
+        counts = await run_db(exam_service.count_exams_by_patients, db, ids)
+        return exam_schemas.ExamCountsResponse(results=counts)
+    except Exception as e:
+        logger.error(f"Error counting exams: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+@app.get("/public-api/examenes/abnormal", response_model=exam_schemas.ExamListResponse, tags=["Public API"])
+async def get_examenes_anormales_public(
+    patient_id: int,
+    limit: int = Query(5, ge=1, le=50),
+    include_files: bool = True,
+    db: Session = Depends(get_db)
+):
+    """Get a patient's latest abnormal exams - public endpoint for microservice communication"""
+    try:
+        def load():
+            exams = exam_service.get_abnormal_exams(
+                db=db, patient_id=patient_id, limit=limit, include_files=include_files
+            )
+            return [exam_service.exam_to_compatible_response(exam) for exam in exams]
+
+        results = await run_db(load)
+        return exam_schemas.ExamListResponse(results=results, count=len(results))
+    except Exception as e:
+        logger.error(f"Error getting abnormal exams: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @app.get("/public-api/examenes/{exam_id}", response_model=exam_schemas.ExamResponse, tags=["Public API"])
-async def get_exam_public(exam_id: int, db: Session = Depends(get_db)):
+async def get_exam_public(exam_id: int, include_files: bool = True, db: Session = Depends(get_db)):
     """Get exam by ID - public endpoint for microservice communication"""
-    exam = exam_service.get_exam_by_id(db=db, exam_id=exam_id)
+    exam = await run_db(_load_exam_response, db, exam_id, include_files)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
-    return exam_service.exam_to_compatible_response(exam)
+    return exam
 
 # Main API endpoints
 @app.get("/api/examenes/", response_model=exam_schemas.ExamListResponse, tags=["Exams"])
 async def get_examenes(
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=500),
     patient_id: Optional[int] = None,
+    include_files: bool = True,
+    exact_count: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Get list of exams with pagination"""
+    """Get list of exams with keyset cursor pagination"""
+    # Reject a malformed cursor before any database work; nothing else maps to 400 here
     try:
-        exams = exam_service.get_exams(
-            db=db,
-            skip=skip,
-            limit=limit,
-            patient_id=patient_id
+        if cursor:
+            exam_service.decode_cursor(cursor)
+    except exam_service.InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    try:
+        results, total, estimated, next_cursor, previous_cursor = await run_db(
+            _load_exams_page, db, limit, cursor, patient_id, include_files, exact_count
         )
-        total = exam_service.get_exams_count(db=db, patient_id=patient_id)
 
         return exam_schemas.ExamListResponse(
-            results=[exam_service.exam_to_compatible_response(exam) for exam in exams],
+            results=results,
             count=total,
-            next=None,
-            previous=None
+            count_is_estimate=estimated,
+            next=_page_url(request, next_cursor),
+            previous=_page_url(request, previous_cursor)
         )
     except Exception as e:
         logger.error(f"Error getting exams: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+async def _attach_files(db: Session, exam_id: int, patient_id: int, files: List[UploadFile]) -> None:
+    """
+    Upload files concurrently to Google Cloud Storage, then record them in
+    one transaction. If the records cannot be written, the uploaded objects
+    are deleted so storage holds no files the database does not know about.
+    """
+    uploaded = await storage_service.upload_exam_files(files=files, exam_id=exam_id, patient_id=patient_id)
+    records = [
+        {
+            "filename": file.filename,
+            "file_url": file_url,
+            "file_size": size,
+            "content_type": file.content_type,
+        }
+        for file, (file_url, size) in zip(files, uploaded)
+    ]
+    try:
+        await run_db(
+            exam_service.create_exam_files,
+            db=db,
+            exam_id=exam_id,
+            files=records,
+            uploaded_by=1  # Default user, should come from auth
+        )
+    except Exception:
+        await storage_service.discard_exam_files([file_url for file_url, _ in uploaded])
+        raise
+
 @app.post("/api/examenes/", response_model=exam_schemas.ExamResponse, tags=["Exams"])
 async def create_exam(
+    background_tasks: BackgroundTasks,
     nombre: str = Form(...),
     paciente_id: int = Form(...),
     descripcion: str = Form(...),
@@ -178,40 +344,18 @@ async def create_exam(
         )
 
         # Create exam in database
-        exam = exam_service.create_exam_compatible(db=db, exam_data=exam_data)
+        exam = await run_db(exam_service.create_exam_compatible, db=db, exam_data=exam_data)
+        # Read now: each commit below expires the instance, and a reload here would block the loop
+        exam_id = exam.id
 
         # Handle file uploads if any
-        uploaded_files = []
         if files and len(files) > 0 and files[0].filename:  # Check if files were actually uploaded
-            for file in files:
-                if file.size > settings.MAX_FILE_SIZE:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"File {file.filename} is too large. Max size: {settings.MAX_FILE_SIZE} bytes"
-                    )
-
-                # Upload file to Google Cloud Storage
-                file_url = await storage_service.upload_exam_file(
-                    file=file,
-                    exam_id=exam.id,
-                    patient_id=paciente_id
-                )
-
-                # Save file reference in database
-                file_record = exam_service.create_exam_file(
-                    db=db,
-                    exam_id=exam.id,
-                    filename=file.filename,
-                    file_url=file_url,
-                    file_size=file.size,
-                    content_type=file.content_type,
-                    uploaded_by=1  # Default user, should come from auth
-                )
-                uploaded_files.append(file_record)
+            await _attach_files(db, exam_id, paciente_id, files)
+
+        background_tasks.add_task(core_notify.notify_patient_changed, paciente_id)
 
         # Return exam with files
-        exam_response = exam_service.exam_to_compatible_response(exam)
-        return exam_response
+        return await run_db(exam_service.exam_to_compatible_response, exam)
 
     except HTTPException:
         raise
@@ -220,16 +364,17 @@ async def create_exam(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.get("/api/examenes/{exam_id}", response_model=exam_schemas.ExamResponse, tags=["Exams"])
-async def get_exam(exam_id: int, db: Session = Depends(get_db)):
+async def get_exam(exam_id: int, include_files: bool = True, db: Session = Depends(get_db)):
     """Get exam by ID"""
-    exam = exam_service.get_exam_by_id(db=db, exam_id=exam_id)
+    exam = await run_db(_load_exam_response, db, exam_id, include_files)
     if not exam:
         raise HTTPException(status_code=404, detail="Exam not found")
-    return exam_service.exam_to_compatible_response(exam)
+    return exam
 
 @app.put("/api/examenes/{exam_id}", response_model=exam_schemas.ExamResponse, tags=["Exams"])
 async def update_exam(
     exam_id: int,
+    background_tasks: BackgroundTasks,
     nombre: str = Form(...),
     descripcion: str = Form(...),
     tipo_examen: str = Form(...),
@@ -242,7 +387,7 @@ async def update_exam(
     """Update an existing exam"""
     try:
         # Check if exam exists
-        existing_exam = exam_service.get_exam_by_id(db=db, exam_id=exam_id)
+        existing_exam = await run_db(exam_service.get_exam_by_id, db=db, exam_id=exam_id)
         if not existing_exam:
             raise HTTPException(status_code=404, detail="Exam not found")
 
@@ -265,38 +410,18 @@ async def update_exam(
         )
 
         # Update exam in database
-        exam = exam_service.update_exam_compatible(db=db, exam_id=exam_id, exam_data=exam_update)
+        exam = await run_db(exam_service.update_exam_compatible, db=db, exam_id=exam_id, exam_data=exam_update)
+        # Read now: each commit below expires the instance, and a reload here would block the loop
+        patient_id = exam.patient_id
 
         # Handle new file uploads if any
         if files and len(files) > 0 and files[0].filename:
-            for file in files:
-                if file.size > settings.MAX_FILE_SIZE:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"File {file.filename} is too large. Max size: {settings.MAX_FILE_SIZE} bytes"
-                    )
-
-                # Upload file to Google Cloud Storage
-                file_url = await storage_service.upload_exam_file(
-                    file=file,
-                    exam_id=exam.id,
-                    patient_id=exam.patient_id
-                )
-
-                # Save file reference in database
-                exam_service.create_exam_file(
-                    db=db,
-                    exam_id=exam.id,
-                    filename=file.filename,
-                    file_url=file_url,
-                    file_size=file.size,
-                    content_type=file.content_type,
-                    uploaded_by=1  # Default user, should come from auth
-                )
+            await _attach_files(db, exam_id, patient_id, files)
+
+        background_tasks.add_task(core_notify.notify_patient_changed, patient_id)
 
         # Return updated exam
-        exam_response = exam_service.exam_to_compatible_response(exam)
-        return exam_response
+        return await run_db(exam_service.exam_to_compatible_response, exam)
 
     except HTTPException:
         raise
@@ -305,22 +430,26 @@ async def update_exam(
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.delete("/api/examenes/{exam_id}", tags=["Exams"])
-async def delete_exam(exam_id: int, db: Session = Depends(get_db)):
+async def delete_exam(exam_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
     """Delete an exam and its associated files"""
     try:
         # Check if exam exists
-        exam = exam_service.get_exam_by_id(db=db, exam_id=exam_id)
-        if not exam:
+        def load_files():
+            exam = exam_service.get_exam_by_id(db=db, exam_id=exam_id)
+            return (None, None) if exam is None else (exam.patient_id, list(exam.files))
+
+        patient_id, files = await run_db(load_files)
+        if files is None:
             raise HTTPException(status_code=404, detail="Exam not found")
 
         # Delete files from Google Cloud Storage
-        if exam.files:
-            for file_record in exam.files:
-                await storage_service.delete_exam_file(file_record.file_url)
+        for file_record in files:
+            await storage_service.delete_exam_file(file_record.file_url)
 
         # Delete exam from database (this will cascade delete files)
-        exam_service.delete_exam(db=db, exam_id=exam_id)
+        await run_db(exam_service.delete_exam, db=db, exam_id=exam_id)
 
+        background_tasks.add_task(core_notify.notify_patient_changed, patient_id)
         return {"message": "Exam deleted successfully"}
 
     except HTTPException:
@@ -334,12 +463,12 @@ async def delete_exam_file(exam_id: int, file_id: int, db: Session = Depends(get
     """Delete a specific file from an exam"""
     try:
         # Check if exam exists
-        exam = exam_service.get_exam_by_id(db=db, exam_id=exam_id)
+        exam = await run_db(exam_service.get_exam_by_id, db=db, exam_id=exam_id)
         if not exam:
             raise HTTPException(status_code=404, detail="Exam not found")
 
         # Get file record
-        file_record = exam_service.get_exam_file_by_id(db=db, file_id=file_id)
+        file_record = await run_db(exam_service.get_exam_file_by_id, db=db, file_id=file_id)
         if not file_record or file_record.exam_id != exam_id:
             raise HTTPException(status_code=404, detail="File not found")
 
@@ -347,7 +476,7 @@ async def delete_exam_file(exam_id: int, file_id: int, db: Session = Depends(get
         await storage_service.delete_exam_file(file_record.file_url)
 
         # Delete file record from database
-        exam_service.delete_exam_file(db=db, file_id=file_id)
+        await run_db(exam_service.delete_exam_file, db=db, file_id=file_id)
 
         return {"message": "File deleted successfully"}
 
@@ -0,0 +1,16 @@
+"""
+Exams service tests, run from the service directory:
+
+    python -m unittest discover -s tests -t .
+
+They use a throwaway SQLite database and never reach Google Cloud Storage
+or core. The environment must be set before the app modules read their
+settings, which happens on first import.
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/tests.db"
+# The storage client is built at import; against an emulator host it needs no credentials
+os.environ.setdefault("STORAGE_EMULATOR_HOST", "http://localhost:9023")
+os.environ["DOSSIER_NOTIFY"] = "False"
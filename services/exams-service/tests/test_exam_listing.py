@@ -0,0 +1,133 @@
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+from app.database import Base, SessionLocal, engine
+from app.models.exam_models import Exam, ExamFile
+from app.services import exam_service
+
+
+def seed(db, count, files_per_exam=2):
+    """count exams, one day apart, each with files_per_exam files"""
+    start = datetime(2024, 1, 1)
+    exams = []
+    for i in range(count):
+        exam = Exam(patient_id=i % 3 + 1, doctor_id=1, exam_type="laboratorio", exam_name=f"Examen {i}",
+                    description="Control", exam_date=start + timedelta(days=i), created_by=1)
+        exam.files = [
+            ExamFile(file_name=f"{i}-{n}.pdf", original_name=f"{n}.pdf", file_type="application/pdf",
+                     file_size=1024, gcs_path=f"exams/{i}/{n}.pdf", uploaded_by=1)
+            for n in range(files_per_exam)
+        ]
+        exams.append(exam)
+    db.add_all(exams)
+    db.commit()
+
+
+class ExamsTestCase(unittest.TestCase):
+    """Fresh tables and session for every test"""
+
+    def setUp(self):
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        self.db = SessionLocal()
+        self.addCleanup(self.db.close)
+
+
+class ExamPageQueryCountTests(ExamsTestCase):
+    """A page of responses costs a fixed number of queries, whatever its size"""
+
+    def setUp(self):
+        super().setUp()
+        seed(self.db, 25)
+        self.db.expunge_all()
+        self.statements = []
+
+        def count(conn, cursor, statement, parameters, context, executemany):
+            self.statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", count)
+        self.addCleanup(event.remove, engine, "before_cursor_execute", count)
+
+    def build_page(self, limit, include_files):
+        exams, _, _ = exam_service.get_exams_page(db=self.db, limit=limit, include_files=include_files)
+        return [exam_service.exam_to_compatible_response(exam) for exam in exams]
+
+    def test_page_with_files_takes_two_queries(self):
+        for limit in (5, 20):
+            with self.subTest(limit=limit):
+                self.statements.clear()
+                self.db.expunge_all()
+                page = self.build_page(limit, include_files=True)
+
+                self.assertEqual(len(self.statements), 2)
+                self.assertEqual(len(page), limit)
+                self.assertTrue(all(len(exam["files"]) == 2 for exam in page))
+
+    def test_page_without_files_takes_one_query(self):
+        page = self.build_page(20, include_files=False)
+
+        self.assertEqual(len(self.statements), 1)
+        self.assertNotIn("exam_files", self.statements[0])
+        self.assertTrue(all(exam["files"] == [] for exam in page))
+
+    def test_batch_by_patients_takes_two_queries(self):
+        grouped = exam_service.get_exams_by_patients(db=self.db, patient_ids=[1, 2])
+        responses = [exam_service.exam_to_compatible_response(e) for exams in grouped.values() for e in exams]
+
+        self.assertEqual(len(self.statements), 2)
+        self.assertEqual(len(responses), 17)
+
+
+class ExamCursorTests(ExamsTestCase):
+    """Keyset cursors walk every exam exactly once, forwards and back"""
+
+    def setUp(self):
+        super().setUp()
+        seed(self.db, 7, files_per_exam=0)
+        # Ties on exam_date are ordered by id
+        self.db.query(Exam).filter(Exam.id.in_([3, 4, 5])).update(
+            {Exam.exam_date: datetime(2024, 2, 1)}, synchronize_session=False
+        )
+        self.db.commit()
+        self.expected = [
+            exam_id for exam_id, in
+            self.db.query(Exam.id).order_by(Exam.exam_date.desc(), Exam.id.desc())
+        ]
+
+    def page(self, cursor=None):
+        exams, next_cursor, previous_cursor = exam_service.get_exams_page(db=self.db, limit=3, cursor=cursor)
+        return [exam.id for exam in exams], next_cursor, previous_cursor
+
+    def test_cursor_encoding_round_trips(self):
+        position = (datetime(2024, 2, 1, 10, 30), 42, True)
+        self.assertEqual(exam_service.decode_cursor(exam_service.encode_cursor(*position)), position)
+
+    def test_malformed_cursors_raise_invalid_cursor(self):
+        for cursor in ("not-base64!", "bm90IGpzb24=", exam_service.encode_cursor(datetime(2024, 1, 1), 1)[:-4]):
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(exam_service.InvalidCursor):
+                    exam_service.decode_cursor(cursor)
+
+    def test_forward_then_back_visits_the_same_pages(self):
+        forward, cursor, previous = [], None, None
+        while True:
+            ids, cursor, previous = self.page(cursor)
+            forward.append(ids)
+            if cursor is None:
+                break
+        self.assertEqual([exam_id for ids in forward for exam_id in ids], self.expected)
+        self.assertEqual([len(ids) for ids in forward], [3, 3, 1])
+
+        backward = []
+        while previous is not None:
+            ids, _, previous = self.page(previous)
+            backward.append(ids)
+        self.assertEqual(backward, forward[-2::-1])
+
+    def test_first_page_has_no_previous_cursor(self):
+        _, next_cursor, previous_cursor = self.page()
+
+        self.assertIsNone(previous_cursor)
+        self.assertIsNotNone(next_cursor)
@@ -0,0 +1,61 @@
+import io
+import unittest
+from unittest import mock
+
+from fastapi import HTTPException, UploadFile
+from sqlalchemy.exc import SQLAlchemyError
+from starlette.datastructures import Headers
+
+import main
+from app.services import exam_service
+from app.services.storage_service import storage_service
+
+
+def upload(name):
+    return UploadFile(file=io.BytesIO(b"%PDF-1.4"), filename=name,
+                      headers=Headers({"content-type": "application/pdf"}))
+
+
+class UploadCompensationTests(unittest.IsolatedAsyncioTestCase):
+    """Objects uploaded for records that are never written are removed from storage"""
+
+    async def test_failed_insert_discards_the_uploaded_files(self):
+        files = [upload("a.pdf"), upload("b.pdf")]
+        uploaded = [("gs://bucket/exams/a.pdf", 8), ("gs://bucket/exams/b.pdf", 8)]
+
+        with mock.patch.object(storage_service, "upload_exam_files", mock.AsyncMock(return_value=uploaded)), \
+                mock.patch.object(storage_service, "discard_exam_files", mock.AsyncMock()) as discard, \
+                mock.patch.object(exam_service, "create_exam_files", side_effect=SQLAlchemyError("insert failed")):
+            with self.assertRaises(SQLAlchemyError):
+                await main._attach_files(mock.Mock(), exam_id=1, patient_id=1, files=files)
+
+        discard.assert_awaited_once_with(["gs://bucket/exams/a.pdf", "gs://bucket/exams/b.pdf"])
+
+    async def test_written_records_keep_their_files(self):
+        uploaded = [("gs://bucket/exams/a.pdf", 8)]
+
+        with mock.patch.object(storage_service, "upload_exam_files", mock.AsyncMock(return_value=uploaded)), \
+                mock.patch.object(storage_service, "discard_exam_files", mock.AsyncMock()) as discard, \
+                mock.patch.object(exam_service, "create_exam_files", return_value=1) as create:
+            await main._attach_files(mock.Mock(), exam_id=1, patient_id=1, files=[upload("a.pdf")])
+
+        discard.assert_not_awaited()
+        self.assertEqual(create.call_args.kwargs["files"], [{
+            "filename": "a.pdf", "file_url": "gs://bucket/exams/a.pdf",
+            "file_size": 8, "content_type": "application/pdf",
+        }])
+
+    async def test_failed_upload_discards_the_others(self):
+        async def upload_one(file, exam_id, patient_id):
+            if file.filename == "b.pdf":
+                raise HTTPException(status_code=500, detail="File upload failed")
+            return f"gs://bucket/exams/{file.filename}", 8
+
+        with mock.patch.object(storage_service, "_upload_exam_file", side_effect=upload_one), \
+                mock.patch.object(storage_service, "discard_exam_files", mock.AsyncMock()) as discard:
+            with self.assertRaises(HTTPException):
+                await storage_service.upload_exam_files(
+                    files=[upload("a.pdf"), upload("b.pdf"), upload("c.pdf")], exam_id=1, patient_id=1
+                )
+
+        discard.assert_awaited_once_with(["gs://bucket/exams/a.pdf", "gs://bucket/exams/c.pdf"])
@@ -1,11 +1,36 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.db.models import Q
+from rest_framework.permissions import IsAuthenticated
+from core.permissions import ServiceOrPublicAccess
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_date
 from .models import Cirugia2
+from .rollup import live_statistics, surgery_statistics
 from .serializers import Cirugia2Serializer, Cirugia2BasicSerializer
 
+# Upper bound on patient IDs accepted by batch endpoints
+BATCH_MAX_PATIENTS = 500
+
+def _patient_ids(values):
+    """Patient IDs as ints; None unless values is a list of at most BATCH_MAX_PATIENTS integers"""
+    if not isinstance(values, list) or len(values) > BATCH_MAX_PATIENTS:
+        return None
+    try:
+        return [int(value) for value in values]
+    except (TypeError, ValueError):
+        return None
+
+def _date_param(params, name, default):
+    """Optional YYYY-MM-DD query parameter; ValueError if malformed"""
+    value = params.get(name)
+    if not value:
+        return default
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(name)
+    return parsed
+
 class Cirugia2ViewSet(viewsets.ModelViewSet):
     """
     ViewSet for Surgery operations in the surgery microservice
@@ -84,31 +109,36 @@ class Cirugia2ViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def statistics(self, request):
-        """Get surgery statistics"""
-        total = self.get_queryset().count()
-        by_type = {}
-        by_status = {}
-
-        for surgery in self.get_queryset():
-            # Count by type
-            tipo_display = surgery.get_tipo_display()
-            by_type[tipo_display] = by_type.get(tipo_display, 0) + 1
-
-            # Count by status
-            status_display = surgery.get_estado_postoperatorio_display()
-            by_status[status_display] = by_status.get(status_display, 0) + 1
-
-        return Response({
-            'total_surgeries': total,
-            'by_type': by_type,
-            'by_status': by_status
-        })
+        """
+        Get surgery counts by type, by post-operative status and type x status,
+        optionally within desde/hasta dates and for one type
+        """
+        params = request.query_params
+        try:
+            desde = _date_param(params, 'desde', None)
+            hasta = _date_param(params, 'hasta', None)
+        except ValueError:
+            return Response(
+                {'error': 'desde and hasta must be YYYY-MM-DD dates'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if params.get('patient_id') or params.get('estado'):
+            # The rollup has no patient or status dimension; aggregate the surgeries directly
+            queryset = self.get_queryset()
+            if desde:
+                queryset = queryset.filter(fecha__gte=desde)
+            if hasta:
+                queryset = queryset.filter(fecha__lte=hasta)
+            return Response(live_statistics(queryset))
+
+        return Response(surgery_statistics(desde=desde, hasta=hasta, tipo=params.get('tipo')))
 
 class PublicCirugia2ViewSet(viewsets.ReadOnlyModelViewSet):
-    """Public API for microservice communication - no authentication required"""
+    """Service-to-service API, authenticated with core's service token"""
     queryset = Cirugia2.objects.all()
     serializer_class = Cirugia2Serializer
-    permission_classes = [AllowAny]
+    permission_classes = [ServiceOrPublicAccess]
 
     @action(detail=False, methods=['get'])
     def by_patient(self, request):
@@ -123,3 +153,57 @@ class PublicCirugia2ViewSet(viewsets.ReadOnlyModelViewSet):
         surgeries = self.queryset.filter(paciente_id=patient_id)
         serializer = self.get_serializer(surgeries, many=True)
         return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def recent(self, request):
+        """Get a patient's most recent surgeries with their post-operative status"""
+        patient_id = request.query_params.get('patient_id')
+        if not patient_id:
+            return Response(
+                {'error': 'patient_id parameter is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(int(request.query_params.get('limit', 5)), 50)
+        except ValueError:
+            limit = 5
+
+        surgeries = self.queryset.filter(paciente_id=patient_id).order_by('-fecha')[:limit]
+        serializer = Cirugia2BasicSerializer(surgeries, many=True)
+        return Response({'results': serializer.data})
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Get surgeries for several patients at once, grouped by patient"""
+        patient_ids = _patient_ids(request.data.get('patient_ids') if isinstance(request.data, dict) else None)
+        if patient_ids is None:
+            return Response(
+                {'error': f'patient_ids must be a list of at most {BATCH_MAX_PATIENTS} IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        surgeries = self.queryset.filter(paciente_id__in=patient_ids)
+        grouped = {str(patient_id): [] for patient_id in patient_ids}
+        for item in self.get_serializer(surgeries, many=True).data:
+            grouped[str(item['paciente_id'])].append(item)
+        return Response({'results': grouped})
+
+    @action(detail=False, methods=['get'])
+    def counts(self, request):
+        """Count surgeries for several patients (?patient_ids=1,2,3) with one GROUP BY"""
+        raw = request.query_params.get('patient_ids', '')
+        patient_ids = _patient_ids([value for value in raw.split(',') if value.strip()])
+        if patient_ids is None:
+            return Response(
+                {'error': f'patient_ids must be a comma-separated list of at most {BATCH_MAX_PATIENTS} IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        counts = dict.fromkeys(map(str, patient_ids), 0)
+        rows = (
+            Cirugia2.objects.filter(paciente_id__in=patient_ids).order_by()
+            .values('paciente_id').annotate(total=Count('id'))
+        )
+        for row in rows:
+            counts[str(row['paciente_id'])] = row['total']
+        return Response({'results': counts})
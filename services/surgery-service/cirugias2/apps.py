@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class Cirugias2Config(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'cirugias2'
+
+    def ready(self):
+        # Connect statistics rollup and core notification handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,52 @@
+"""
+Tells core that a patient's surgeries changed, so it drops its cached dossier
+sections and refreshes the critical-info projection
+(POST /health/api/patient/<id>/dossier/invalidate/).
+
+Notifications go out after the transaction commits, from a daemon thread:
+core reads this service back while handling one, so a save must not wait
+for it. A lost notification is logged; core's section TTLs bound how long
+it serves the old records.
+"""
+
+import logging
+import threading
+
+import requests
+from django.conf import settings
+from django.db import transaction
+
+from core.authentication import service_tokens
+
+logger = logging.getLogger(__name__)
+
+# Dossier section owned by this service
+SECTION = 'cirugias'
+
+
+def _config():
+    return getattr(settings, 'DOSSIER_NOTIFY', {})
+
+
+def _send(paciente_id):
+    url = (f"{getattr(settings, 'CORE_SERVICE_URL', 'http://localhost:8000')}"
+           f"/health/api/patient/{paciente_id}/dossier/invalidate/")
+    try:
+        response = requests.post(
+            url,
+            json={'sections': [SECTION]},
+            headers={'Authorization': f"Bearer {service_tokens.get()}"},
+            timeout=_config().get('timeout', 3),
+        )
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Could not notify core of changes for patient {paciente_id}: {e}")
+
+
+def notify_patient_changed(paciente_id):
+    """Notify core once the current transaction commits"""
+    if paciente_id is None or not _config().get('enabled', True):
+        return
+    transaction.on_commit(
+        lambda: threading.Thread(target=_send, args=(paciente_id,), daemon=True).start()
+    )
@@ -0,0 +1,66 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cirugias2.models import Cirugia2
+from cirugias2.rollup import live_statistics, rebuild_rollup, surgery_statistics
+
+
+def legacy_statistics():
+    """What the endpoint used to do: count, then tally every surgery in Python"""
+    total = Cirugia2.objects.count()
+    by_type, by_status = {}, {}
+    for surgery in Cirugia2.objects.all():
+        tipo_display = surgery.get_tipo_display()
+        by_type[tipo_display] = by_type.get(tipo_display, 0) + 1
+        status_display = surgery.get_estado_postoperatorio_display()
+        by_status[status_display] = by_status.get(status_display, 0) + 1
+    return {'total_surgeries': total, 'by_type': by_type, 'by_status': by_status}
+
+
+class Command(BaseCommand):
+    help = 'Compare the legacy statistics loop with GROUP BY and rollup statistics on generated surgeries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500_000, help='Surgeries to generate')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per variant')
+
+    def timed(self, fn, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = fn()
+        return (time.perf_counter() - start) * 1000 / repeat, result
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        tipos = [value for value, _ in Cirugia2.TIPO_CIRUGIA_EPILEPSIA]
+        estados = [value for value, _ in Cirugia2.ESTADO_POSTERIOR]
+        first_day = date.today() - timedelta(days=3650)
+
+        with transaction.atomic():
+            for start in range(0, options['rows'], 10000):
+                Cirugia2.objects.bulk_create([
+                    Cirugia2(
+                        nombre=f"Cirugía {i}", paciente_id=rng.randint(1, 50000), tipo=rng.choice(tipos),
+                        fecha=first_day + timedelta(days=rng.randrange(3650)), resultado='',
+                        estado_postoperatorio=rng.choice(estados),
+                    )
+                    for i in range(start, min(start + 10000, options['rows']))
+                ])
+            rebuild_rollup()
+
+            repeat = options['repeat']
+            last_year = date.today() - timedelta(days=365)
+            variants = [
+                ('Legacy Python tally', legacy_statistics),
+                ('GROUP BY on surgeries', lambda: live_statistics(Cirugia2.objects.all())),
+                ('Rollup, all time', surgery_statistics),
+                ('Rollup, last year, one type', lambda: surgery_statistics(desde=last_year, tipo=tipos[0])),
+            ]
+            for label, fn in variants:
+                elapsed_ms, result = self.timed(fn, repeat)
+                self.stdout.write(f"{label:<30} {elapsed_ms:10.1f} ms  (total {result['total_surgeries']})")
+            transaction.set_rollback(True)
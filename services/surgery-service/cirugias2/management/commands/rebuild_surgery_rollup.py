@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from cirugias2.models import EstadisticaCirugia
+from cirugias2.rollup import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute the surgery statistics rollup from all surgeries (after bulk imports or to verify drift)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--if-empty', action='store_true',
+                            help='Only build the rollup when it has no buckets yet (safe to run on every deploy)')
+
+    def handle(self, *args, **options):
+        if options['if_empty'] and EstadisticaCirugia.objects.exists():
+            self.stdout.write('Surgery rollup already built; nothing to do')
+            return
+        buckets = rebuild_rollup()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt surgery rollup: {buckets} buckets"))
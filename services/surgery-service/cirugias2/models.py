@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, transaction
+
+from .patient_resolver import patient_resolver
 
 class Cirugia2(models.Model):
     TIPO_CIRUGIA_EPILEPSIA = [
@@ -40,22 +42,53 @@ class Cirugia2(models.Model):
     def __str__(self):
         return f"{self.get_tipo_display()} - Paciente {self.paciente_id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored rollup bucket so a save can move the count
+        if {'fecha', 'tipo', 'estado_postoperatorio'} <= set(field_names):
+            instance._rollup_key = instance.rollup_key()
+        return instance
+
+    def rollup_key(self):
+        return (self.fecha, self.tipo, self.estado_postoperatorio)
+
+    def save(self, *args, **kwargs):
+        from .rollup import move_rollup_count
+        previous = getattr(self, '_rollup_key', None)
+        with transaction.atomic():
+            if previous is None and not self._state.adding:
+                # Loaded with deferred fields: read the stored bucket
+                previous = Cirugia2.objects.filter(pk=self.pk).values_list(
+                    'fecha', 'tipo', 'estado_postoperatorio'
+                ).first()
+            super().save(*args, **kwargs)
+            move_rollup_count(previous, self.rollup_key())
+        self._rollup_key = self.rollup_key()
+
     def get_patient_name(self):
-        """
-        Get patient name from core service
-        This will be implemented as a method that calls the core service
-        """
-        from django.conf import settings
-        import requests
-
-        try:
-            response = requests.get(
-                f"{settings.CORE_SERVICE_URL}/api/patient/{self.paciente_id}/basic/",
-                timeout=5
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('nombre', f'Paciente {self.paciente_id}')
-        except:
-            pass
-        return f'Paciente {self.paciente_id}'
+        """Get patient name from core service, through the shared patient resolver"""
+        patient_data = patient_resolver.get(self.paciente_id) or {}
+        return patient_data.get('nombre') or f'Paciente {self.paciente_id}'
+
+
+class EstadisticaCirugia(models.Model):
+    """
+    Rollup of surgeries per day, type and post-operative outcome, kept
+    current on every write so statistics never scan Cirugia2.
+    """
+    fecha = models.DateField()
+    tipo = models.CharField(max_length=50, choices=Cirugia2.TIPO_CIRUGIA_EPILEPSIA)
+    estado_postoperatorio = models.CharField(max_length=50, choices=Cirugia2.ESTADO_POSTERIOR)
+    total = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'tipo', 'estado_postoperatorio'], name='estadistica_cirugia_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['tipo', 'fecha'], name='estadistica_cirugia_tipo_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo} {self.estado_postoperatorio}: {self.total}"
@@ -0,0 +1,132 @@
+"""
+Patient data from the core service, from which surgeries take the name.
+
+Cirugia2.get_patient_name reads the name from here, and the list
+serializer of Cirugia2Serializer first primes the resolver with the page's
+paciente_ids: a page of surgeries costs one bulk_basic POST to core per
+BATCH_SIZE patients instead of one request per surgery.
+
+The class is kept identical to diagnosis-service's
+diagnosticos2.patient_resolver, where its caching rules (per-process
+TTL/LRU, negative_ttl, stale_ttl) are described; a change to them belongs
+in both.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+import requests
+from django.conf import settings
+
+from core.authentication import service_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class PatientResolver:
+    """TTL/LRU cache of core patient data with batched loading"""
+
+    # Must not exceed core's BATCH_MAX_PATIENTS
+    BATCH_SIZE = 500
+
+    def __init__(self):
+        config = getattr(settings, 'PATIENT_RESOLVER', {})
+        self.ttl = config.get('ttl', 300)
+        self.negative_ttl = config.get('negative_ttl', 60)
+        self.stale_ttl = config.get('stale_ttl', 3600)
+        self.timeout = config.get('timeout', 3)
+        self.max_entries = config.get('max_entries', 10000)
+        # paciente_id -> (data or None, fresh_until, stale_until)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Updated only with _lock held, like the entries
+        self.stats = {'hits': 0, 'misses': 0, 'requests': 0, 'errors': 0, 'stale': 0}
+
+    def _store(self, patient_id, data, ttl, stale_ttl):
+        now = time.monotonic()
+        self._entries[patient_id] = (data, now + ttl, now + stale_ttl)
+        self._entries.move_to_end(patient_id)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _is_fresh(self, patient_id):
+        entry = self._entries.get(patient_id)
+        if entry is None or entry[1] < time.monotonic():
+            return False
+        self._entries.move_to_end(patient_id)
+        return True
+
+    def _fetch(self, patient_ids) -> Optional[Dict[str, Dict]]:
+        """One batch request to core; None if core could not answer"""
+        url = f"{getattr(settings, 'CORE_SERVICE_URL', 'http://localhost:8000')}/api/patients/bulk_basic/"
+        with self._lock:
+            self.stats['requests'] += 1
+        try:
+            response = requests.post(
+                url,
+                json={'patient_ids': patient_ids},
+                headers={'Authorization': f"Bearer {service_tokens.get()}"},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            return response.json().get('results', {})
+        except (requests.exceptions.RequestException, ValueError) as e:
+            with self._lock:
+                self.stats['errors'] += 1
+            logger.warning(f"Error fetching patient data for {len(patient_ids)} patients: {e}")
+            return None
+
+    def prime(self, patient_ids: Iterable) -> None:
+        """Load every given patient whose data is not fresh in the cache"""
+        wanted = {int(pid) for pid in patient_ids if pid is not None}
+        with self._lock:
+            missing = sorted(pid for pid in wanted if not self._is_fresh(pid))
+            self.stats['hits'] += len(wanted) - len(missing)
+            self.stats['misses'] += len(missing)
+
+        for start in range(0, len(missing), self.BATCH_SIZE):
+            chunk = missing[start:start + self.BATCH_SIZE]
+            results = self._fetch(chunk)
+            now = time.monotonic()
+            with self._lock:
+                for pid in chunk:
+                    if results is not None:
+                        data = results.get(str(pid))
+                        if data:
+                            self._store(pid, data, self.ttl, self.stale_ttl)
+                        else:
+                            self._store(pid, None, self.negative_ttl, self.negative_ttl)
+                        continue
+                    entry = self._entries.get(pid)
+                    if entry is not None and entry[2] >= now:
+                        # Core is failing: keep serving the last known data for now
+                        self.stats['stale'] += 1
+                        self._entries[pid] = (entry[0], now + self.negative_ttl, entry[2])
+                    else:
+                        self._store(pid, None, self.negative_ttl, self.negative_ttl)
+
+    def get(self, patient_id) -> Optional[Dict]:
+        """Patient data for one ID, loading it if needed; None if unknown or unavailable"""
+        if patient_id is None:
+            return None
+        patient_id = int(patient_id)
+        with self._lock:
+            fresh = self._is_fresh(patient_id)
+            if fresh:
+                self.stats['hits'] += 1
+        if not fresh:
+            self.prime([patient_id])
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            return entry[0] if entry is not None else None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by every serializer and viewset in this process
+patient_resolver = PatientResolver()
@@ -0,0 +1,86 @@
+"""
+Surgery statistics from the EstadisticaCirugia rollup.
+
+Every Cirugia2 save moves one count between (fecha, tipo, estado) buckets
+and every delete removes one, inside the same transaction as the write.
+Statistics are then a GROUP BY over at most days x types x outcomes rows,
+independent of how many surgeries exist. Writes that bypass the model
+(bulk_create, queryset.update) need rebuild_rollup() afterwards.
+"""
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import Cirugia2, EstadisticaCirugia
+
+TIPO_LABELS = dict(Cirugia2.TIPO_CIRUGIA_EPILEPSIA)
+ESTADO_LABELS = dict(Cirugia2.ESTADO_POSTERIOR)
+
+
+def _add(key, delta):
+    fecha, tipo, estado = key
+    # Create the bucket if needed, then adjust it atomically in the database
+    EstadisticaCirugia.objects.bulk_create(
+        [EstadisticaCirugia(fecha=fecha, tipo=tipo, estado_postoperatorio=estado)],
+        ignore_conflicts=True,
+    )
+    EstadisticaCirugia.objects.filter(
+        fecha=fecha, tipo=tipo, estado_postoperatorio=estado
+    ).update(total=F('total') + delta)
+
+
+def move_rollup_count(previous, current):
+    """Count a surgery saved in bucket current, previously in bucket previous (None if new)"""
+    if previous == current:
+        return
+    if previous is not None:
+        _add(previous, -1)
+    if current is not None:
+        _add(current, 1)
+
+
+def rebuild_rollup():
+    """Recompute every bucket from Cirugia2 with one GROUP BY"""
+    buckets = Cirugia2.objects.order_by().values('fecha', 'tipo', 'estado_postoperatorio').annotate(total=Count('id'))
+    with transaction.atomic():
+        EstadisticaCirugia.objects.all().delete()
+        EstadisticaCirugia.objects.bulk_create(
+            (EstadisticaCirugia(**bucket) for bucket in buckets.iterator()), batch_size=5000
+        )
+    return EstadisticaCirugia.objects.count()
+
+
+def surgery_statistics(desde=None, hasta=None, tipo=None):
+    """Totals by type, by outcome and type x outcome, optionally filtered by date range and type"""
+    buckets = EstadisticaCirugia.objects.filter(total__gt=0)
+    if desde:
+        buckets = buckets.filter(fecha__gte=desde)
+    if hasta:
+        buckets = buckets.filter(fecha__lte=hasta)
+    if tipo:
+        buckets = buckets.filter(tipo=tipo)
+
+    return _summarize(buckets.order_by().values('tipo', 'estado_postoperatorio').annotate(count=Sum('total')))
+
+
+def live_statistics(queryset):
+    """Same figures with a GROUP BY over surgeries, for filters the rollup does not keep (patient, outcome)"""
+    return _summarize(queryset.order_by().values('tipo', 'estado_postoperatorio').annotate(count=Count('id')))
+
+
+def _summarize(rows):
+    total, by_type, by_status, cross_tab = 0, {}, {}, {}
+    for row in rows:
+        tipo_display = TIPO_LABELS.get(row['tipo'], row['tipo'])
+        estado_display = ESTADO_LABELS.get(row['estado_postoperatorio'], row['estado_postoperatorio'])
+        total += row['count']
+        by_type[tipo_display] = by_type.get(tipo_display, 0) + row['count']
+        by_status[estado_display] = by_status.get(estado_display, 0) + row['count']
+        cross_tab.setdefault(tipo_display, {})[estado_display] = row['count']
+
+    return {
+        'total_surgeries': total,
+        'by_type': by_type,
+        'by_status': by_status,
+        'by_type_and_status': cross_tab,
+    }
@@ -1,28 +1,29 @@
 from rest_framework import serializers
 from .models import Cirugia2
+from .patient_resolver import patient_resolver
 from django.conf import settings
 import requests
 
+class PatientNameListSerializer(serializers.ListSerializer):
+    """Loads the patients of the whole page in one batch before serializing"""
+
+    def to_representation(self, data):
+        items = list(data.all() if hasattr(data, 'all') else data)
+        patient_resolver.prime(item.paciente_id for item in items)
+        return super().to_representation(items)
+
+
 class Cirugia2Serializer(serializers.ModelSerializer):
     patient_name = serializers.SerializerMethodField()
 
     class Meta:
         model = Cirugia2
         fields = '__all__'
+        list_serializer_class = PatientNameListSerializer
 
     def get_patient_name(self, obj):
-        """Get patient name from core service"""
-        try:
-            response = requests.get(
-                f"{settings.CORE_SERVICE_URL}/api/patient/{obj.paciente_id}/basic/",
-                timeout=5
-            )
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('nombre', f'Paciente {obj.paciente_id}')
-        except:
-            pass
-        return f'Paciente {obj.paciente_id}'
+        """Get patient name from core service (cached)"""
+        return obj.get_patient_name()
 
     def validate_paciente_id(self, value):
         """Validate that patient exists in core service"""
@@ -0,0 +1,24 @@
+"""
+Signal handlers that keep the surgery statistics rollup coherent with deletes
+(saves adjust the rollup in Cirugia2.save) and tell core when a patient's
+surgeries change.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .dossier_notify import notify_patient_changed
+from .models import Cirugia2
+from .rollup import move_rollup_count
+
+
+@receiver(post_delete, sender=Cirugia2)
+def remove_from_rollup(sender, instance, **kwargs):
+    # Queryset deletes also send post_delete for every row
+    move_rollup_count(instance.rollup_key(), None)
+
+
+@receiver(post_save, sender=Cirugia2)
+@receiver(post_delete, sender=Cirugia2)
+def notify_core(sender, instance, **kwargs):
+    notify_patient_changed(instance.paciente_id)
@@ -1,3 +1,157 @@
-from django.test import TestCase
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.test import TestCase, override_settings
+
+from .models import Cirugia2, EstadisticaCirugia
+from .patient_resolver import patient_resolver
+from .rollup import rebuild_rollup, surgery_statistics
+from .serializers import Cirugia2Serializer
+
+
+@override_settings(DOSSIER_NOTIFY={'enabled': False})
+class SurgeryRollupTests(TestCase):
+    """The rollup follows every save and delete, and matches a full rebuild"""
+
+    def crear(self, **campos):
+        datos = {
+            'nombre': 'Cirugía', 'paciente_id': 1, 'tipo': 'lobectomia',
+            'fecha': date(2024, 5, 1), 'resultado': 'OK', 'estado_postoperatorio': 'libre',
+        }
+        datos.update(campos)
+        return Cirugia2.objects.create(**datos)
+
+    def totales(self):
+        return {
+            (b.fecha, b.tipo, b.estado_postoperatorio): b.total
+            for b in EstadisticaCirugia.objects.filter(total__gt=0)
+        }
+
+    def test_create_counts_in_its_bucket(self):
+        self.crear()
+        self.crear()
+        self.crear(tipo='resectiva')
+
+        self.assertEqual(self.totales(), {
+            (date(2024, 5, 1), 'lobectomia', 'libre'): 2,
+            (date(2024, 5, 1), 'resectiva', 'libre'): 1,
+        })
+
+    def test_update_moves_the_count_between_buckets(self):
+        cirugia = self.crear()
+        cirugia.estado_postoperatorio = 'mejoria'
+        cirugia.save()
+
+        self.assertEqual(self.totales(), {(date(2024, 5, 1), 'lobectomia', 'mejoria'): 1})
+
+    def test_update_of_a_reloaded_row_moves_the_count(self):
+        cirugia = self.crear()
+        recargada = Cirugia2.objects.get(pk=cirugia.pk)
+        recargada.fecha = date(2024, 6, 1)
+        recargada.save()
+
+        self.assertEqual(self.totales(), {(date(2024, 6, 1), 'lobectomia', 'libre'): 1})
+
+    def test_update_of_a_deferred_row_reads_the_stored_bucket(self):
+        cirugia = self.crear()
+        parcial = Cirugia2.objects.only('id', 'tipo').get(pk=cirugia.pk)
+        parcial.tipo = 'callosotomia'
+        parcial.save()
+
+        self.assertEqual(self.totales(), {(date(2024, 5, 1), 'callosotomia', 'libre'): 1})
+
+    def test_update_outside_the_bucket_fields_keeps_the_count(self):
+        cirugia = self.crear()
+        cirugia.resultado = 'Sin complicaciones'
+        cirugia.save()
+
+        self.assertEqual(self.totales(), {(date(2024, 5, 1), 'lobectomia', 'libre'): 1})
+
+    def test_delete_removes_the_count(self):
+        cirugia = self.crear()
+        self.crear(paciente_id=2)
+        self.crear(paciente_id=3)
+        cirugia.delete()
+        Cirugia2.objects.filter(paciente_id=2).delete()
+
+        self.assertEqual(self.totales(), {(date(2024, 5, 1), 'lobectomia', 'libre'): 1})
+
+    def test_rebuild_matches_the_incremental_rollup(self):
+        self.crear()
+        cambiada = self.crear(paciente_id=2, tipo='resectiva')
+        cambiada.estado_postoperatorio = 'leve'
+        cambiada.save()
+        self.crear(fecha=date(2024, 7, 1)).delete()
+        incremental = self.totales()
+
+        rebuild_rollup()
+
+        self.assertEqual(self.totales(), incremental)
+
+    def test_statistics_read_the_rollup(self):
+        self.crear()
+        self.crear(estado_postoperatorio='mejoria')
+        self.crear(tipo='resectiva', fecha=date(2023, 1, 1))
+
+        stats = surgery_statistics(desde=date(2024, 1, 1))
+
+        self.assertEqual(stats['total_surgeries'], 2)
+        self.assertEqual(stats['by_type'], {'Lobectomía Temporal': 2})
+        self.assertEqual(stats['by_status'], {'Libre de crisis': 1, 'Mejoría significativa': 1})
+
+
+def core_answers(names):
+    """A bulk_basic response from core knowing only the given patients"""
+    def post(url, json, headers, timeout):
+        response = mock.Mock()
+        response.json.return_value = {'results': {
+            str(pid): {'id': pid, 'nombre': names[pid]} for pid in json['patient_ids'] if pid in names
+        }}
+        return response
+    return post
+
+
+@override_settings(DOSSIER_NOTIFY={'enabled': False})
+class PatientNameTests(TestCase):
+    """A page of surgeries takes its patient names from one request to core"""
+
+    def setUp(self):
+        patient_resolver.clear()
+        self.addCleanup(patient_resolver.clear)
+        for paciente_id in (1, 2, 2, 3):
+            Cirugia2.objects.create(
+                nombre='Cirugía', paciente_id=paciente_id, tipo='lobectomia', fecha=date(2024, 5, 1),
+                resultado='OK', estado_postoperatorio='libre',
+            )
+
+    def names(self):
+        rows = Cirugia2Serializer(Cirugia2.objects.order_by('id'), many=True).data
+        return [row['patient_name'] for row in rows]
+
+    def test_one_request_for_the_page(self):
+        with mock.patch('cirugias2.patient_resolver.requests.post',
+                        side_effect=core_answers({1: 'Ana', 2: 'Luis'})) as post:
+            names = self.names()
+
+        post.assert_called_once()
+        self.assertEqual(post.call_args.kwargs['json'], {'patient_ids': [1, 2, 3]})
+        # Patients core does not know fall back to their ID
+        self.assertEqual(names, ['Ana', 'Luis', 'Luis', 'Paciente 3'])
+
+    def test_later_pages_are_served_from_the_cache(self):
+        with mock.patch('cirugias2.patient_resolver.requests.post',
+                        side_effect=core_answers({1: 'Ana', 2: 'Luis'})) as post:
+            self.names()
+            self.assertEqual(Cirugia2.objects.filter(paciente_id=1).get().get_patient_name(), 'Ana')
+            self.names()
+
+        post.assert_called_once()
+
+    def test_core_outage_keeps_the_page_to_one_request(self):
+        with mock.patch('cirugias2.patient_resolver.requests.post',
+                        side_effect=requests.exceptions.ConnectionError('core down')) as post:
+            names = self.names()
+
+        post.assert_called_once()
+        self.assertEqual(names, ['Paciente 1', 'Paciente 2', 'Paciente 2', 'Paciente 3'])
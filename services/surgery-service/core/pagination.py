@@ -0,0 +1,17 @@
+"""
+Keyset pagination shared by the service's list endpoints.
+"""
+
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination on the primary key. Each page is a single indexed
+    range scan, so deep pages cost the same as the first and rows inserted
+    while a client is paging are neither skipped nor repeated.
+    """
+    ordering = '-id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 500